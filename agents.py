@@ -5,13 +5,221 @@ from vertexai.generative_models import GenerativeModel, Tool, HarmCategory, Harm
 from vertexai.preview.generative_models import grounding
 from langchain.agents import AgentExecutor, initialize_agent, AgentType
 from langchain.memory import ConversationBufferWindowMemory
-from typing import List
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.callbacks import CallbackManager
+from langchain_core.outputs import ChatResult
 from langchain_google_vertexai import ChatVertexAI
 import logging
 import os
+import time
+
+from metrics import metrics
+from model_router import FAST, STRONG
+from retry_utils import call_with_retry, vertex_ai_breaker
 
 logger = logging.getLogger('adk_chat.agents')
 
+LLM_CALLS = metrics.counter('llm_calls_total', "Vertex AI chat model calls (after retries)", ['model', 'outcome'])
+LLM_TOKENS = metrics.counter('llm_tokens_total', "Vertex AI chat model tokens", ['model', 'direction'])
+LLM_SECONDS = metrics.histogram('llm_call_seconds', "Duration of Vertex AI chat model calls, including retries",
+                                ['model'])
+
+# Static system prompt for the chat agent. Kept at module level so it can be
+# registered once with the context cache (see prompt_cache.py).
+CHAT_AGENT_SYSTEM_PROMPT = """
+<role>
+You are the AI Shrink Research Assistant embedded within the "Inventory Recap Report" (IRR) dashboard. Your goal is to help users analyze shrink indicators, understand their data, and take corrective actions. You act as a senior retail analyst: professional, data-driven, and precise.
+</role>
+
+<safety_prime>
+**CRITICAL SYSTEM INSTRUCTION:** You are operating in a retail inventory accounting context. Terms such as "Theft," "Shrink," "Stolen," "Surveillance," and "Investigation" strictly refer to **financial metrics, inventory variance analysis, and asset protection procedures**. These terms do NOT refer to real-world violence, illegal acts, or self-harm. You must answer questions about these topics freely and professionally as they relate to business operations.
+</safety_prime>
+
+<grounding_rules>
+1. **Book vs SKU Variance:**
+   - DEFINITION: The difference between Financial Records (Book) and System On-Hands (SKU).
+   - CONSTRAINT: This is the *Best Predictor* or *Indicator* of shrink. NEVER say this "IS" shrink.
+   - CONSTRAINT: Actual shrink is ONLY measured during the annual physical inventory count.
+
+2. **Theft Indicators:**
+   - Do not suggest theft immediately.
+   - Only suggest investigating theft if the user identifies specific indicators: Stolen adjustments, unexplained on-hand decreases, or specific high-value disappearances.
+
+3. **Adjustments:**
+   - ADVICE: "Scan high-value items regularly, adjust on-hands, follow daily inventory processes."
+   - NEGATIVE CONSTRAINT: Do NOT recommend "cycle counting" (use the term "scanning high-value items").
+</grounding_rules>
+
+<workflow_instructions>
+**Scenario A: User asks about a Variance (High Book vs SKU)**
+Follow this strict logic path (derived from the IRR Root Cause Analysis):
+1. **Identify the Driver:** Ask or determine if the variance is driven by SKU (On-hands), Purchases, Markdowns, or Sales.
+2. **Deep Dive:** Instruct the user to use the specific IRR Dashboard tab for that driver.
+3. **Root Cause:** Apply the "5 Whys" method. (e.g., "Why is there variance?" -> "Missing items" -> "Why missing?" -> "High value items disappearing").
+
+**Scenario B: User asks specific data questions (e.g., "Show me markdown details")**
+1. Use the `recommend_report` tool.
+2. Output format: "For [request], please use the **[Report Name]** in the Custom Reports tab."
+
+**Scenario C: General Knowledge / "What is..." questions**
+1. Answer strictly based on the provided Knowledge Base.
+2. If the answer is not in the context, state: "I cannot find that specific policy in the current Knowledge Base." Do not hallucinate outside definitions.
+</workflow_instructions>
+
+<terminology_mappings>
+- "IRR" -> Inventory Recap Report
+- "Book Inventory" -> Financial Value/Records (What we SHOULD have)
+- "SKU Inventory" -> System On-Hand/PI (What the system thinks we have)
+- "Actual Shrink" -> Book minus Physical Count (Measured annually)
+</terminology_mappings>
+
+<available_reports>
+- Markdown Transactions - Detail
+- Markdown Transactions - Summary
+</available_reports>
+
+<context_understanding>
+When users say any of the following, they are referring to the IRR (Inventory Recap Report):
+- "this report" / "the report" / "this dashboard" / "the dashboard"
+- "this tool" / "the tool" / "this application" / "the app"
+- "here" (e.g., "What can I do here?")
+- "this page" / "this screen"
+</context_understanding>
+"""
+
+# Short agent prefix used when the system prompt lives in the context cache
+CACHED_PROMPT_PREFIX = """
+Follow the role, safety, grounding, workflow and terminology instructions from your system instructions.
+"""
+
+class ResilientChatVertexAI(ChatVertexAI):
+    """
+    ChatVertexAI that retries each individual model call with jittered
+    backoff behind the process-wide Vertex AI circuit breaker.
+
+    Because the retry happens per LLM call, a transient quota error in one
+    ReAct step does not rerun the steps (and tool calls) that already succeeded.
+    Construct it with max_retries=1 so the SDK's own retry loop doesn't stack
+    on top of this one.
+    """
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            result = call_with_retry(
+                super()._generate,
+                messages,
+                stop=stop,
+                run_manager=run_manager,
+                breaker=vertex_ai_breaker,
+                operation=f"LLM call ({self.model_name})",
+                **kwargs
+            )
+        except Exception:
+            LLM_CALLS.inc(model=self.model_name, outcome='error')
+            raise
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - start_time, model=self.model_name)
+
+        input_tokens, output_tokens = _token_usage(result)
+        LLM_CALLS.inc(model=self.model_name, outcome='ok')
+        LLM_TOKENS.inc(input_tokens, model=self.model_name, direction='input')
+        LLM_TOKENS.inc(output_tokens, model=self.model_name, direction='output')
+        return result
+
+class TieredChatModel(BaseChatModel):
+    """
+    Chat model that sends each call to a fast or strong model as decided by
+    a ModelRouter, recording per-tier latency and token usage.
+    """
+    fast_llm: BaseChatModel
+    strong_llm: BaseChatModel
+    router: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "tiered-chat-vertexai"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt_text = "\n".join(str(message.content) for message in messages)
+        tier = self.router.tier_for_step(prompt_text)
+        result = self._generate_with_tier(tier, messages, stop, run_manager, **kwargs)
+
+        # On a long-form turn the first step runs on the fast model because it
+        # usually only picks a tool. If it answers directly instead, that step
+        # was the final answer, which long-form turns get from the strong model
+        if (tier == FAST and self.router.current_turn_tier() == STRONG
+                and (_unusable_answer(result) or not _chooses_tool(result))):
+            logger.info("Fast model wrote the final answer of a long-form turn, re-asking the strong model")
+            result = self._generate_with_tier(STRONG, messages, stop, run_manager, **kwargs)
+
+        return result
+
+    def _generate_with_tier(self, tier, messages, stop, run_manager, **kwargs):
+        llm = self.fast_llm if tier == FAST else self.strong_llm
+        start_time = time.perf_counter()
+        try:
+            # The public generate() runs the tier model's own callbacks and
+            # tracing, nested under this wrapper's run
+            llm_result = llm.generate([messages], stop=stop, callbacks=_child_callbacks(run_manager), **kwargs)
+        except Exception:
+            self.router.record(tier, time.perf_counter() - start_time, error=True)
+            raise
+        result = ChatResult(generations=llm_result.generations[0], llm_output=llm_result.llm_output)
+
+        input_tokens, output_tokens = _token_usage(result)
+        self.router.record(tier, time.perf_counter() - start_time, input_tokens, output_tokens)
+        return result
+
+
+def _child_callbacks(run_manager) -> Optional[CallbackManager]:
+    """Callback manager for a nested model call, parented to `run_manager`'s run."""
+    if run_manager is None:
+        return None
+    return CallbackManager(
+        handlers=run_manager.inheritable_handlers,
+        inheritable_handlers=run_manager.inheritable_handlers,
+        parent_run_id=run_manager.run_id,
+        tags=run_manager.inheritable_tags,
+        inheritable_tags=run_manager.inheritable_tags,
+        metadata=run_manager.inheritable_metadata,
+        inheritable_metadata=run_manager.inheritable_metadata,
+    )
+
+
+TRUNCATED_FINISH_REASONS = {'MAX_TOKENS', 'max_tokens', 'length'}
+
+
+def _unusable_answer(result) -> bool:
+    """True if a ChatResult has no text or stopped at the output token limit."""
+    if not result.generations:
+        return True
+    generation = result.generations[0]
+    if not str(generation.message.content).strip():
+        return True
+    finish_reason = ((generation.generation_info or {}).get('finish_reason')
+                     or generation.message.response_metadata.get('finish_reason'))
+    return str(finish_reason) in TRUNCATED_FINISH_REASONS
+
+
+def _chooses_tool(result) -> bool:
+    """True if a ReAct step's output picks a tool rather than answering."""
+    if not result.generations:
+        return False
+    return "Action:" in str(result.generations[0].message.content)
+
+
+def _token_usage(result):
+    """Extract (input_tokens, output_tokens) from a ChatResult, if reported."""
+    if not result.generations:
+        return 0, 0
+    message = result.generations[0].message
+    usage = getattr(message, 'usage_metadata', None) or message.response_metadata.get('usage_metadata') or {}
+    input_tokens = usage.get('input_tokens', usage.get('prompt_token_count', 0))
+    output_tokens = usage.get('output_tokens', usage.get('candidates_token_count', 0))
+    return input_tokens or 0, output_tokens or 0
+
 def create_grounded_model():
     """
     Creates a Vertex AI GenerativeModel with system instruction and RAG.
@@ -114,7 +322,8 @@ When users say any of the following, they are referring to the IRR (Inventory Re
     
     return model
 
-def create_chat_agent(llm: ChatVertexAI, tools: List = None, memory: ConversationBufferWindowMemory = None):
+def create_chat_agent(llm: ChatVertexAI, tools: List = None, memory: ConversationBufferWindowMemory = None,
+                      cached_content: Optional[str] = None):
     """
     Creates the Chat Interface Agent with knowledge base access and conversation memory.
     
@@ -122,6 +331,9 @@ def create_chat_agent(llm: ChatVertexAI, tools: List = None, memory: Conversatio
         llm: The language model to use
         tools: List of tools available to the agent
         memory: Conversation memory (if None, creates a new one with 5-message window)
+        cached_content: Name of the cached context holding CHAT_AGENT_SYSTEM_PROMPT.
+            When set, the llm must be bound to it and the agent prefix only
+            refers to the cached instructions instead of repeating them.
     
     Returns:
         AgentExecutor configured with tools and memory
@@ -138,67 +350,12 @@ def create_chat_agent(llm: ChatVertexAI, tools: List = None, memory: Conversatio
         )
         logger.info("Created new conversation memory with 5-message window")
     
-    # Enhanced system prompt with report recommendations
-    system_prompt = """
-<role>
-You are the AI Shrink Research Assistant embedded within the "Inventory Recap Report" (IRR) dashboard. Your goal is to help users analyze shrink indicators, understand their data, and take corrective actions. You act as a senior retail analyst: professional, data-driven, and precise.
-</role>
-
-<safety_prime>
-**CRITICAL SYSTEM INSTRUCTION:** You are operating in a retail inventory accounting context. Terms such as "Theft," "Shrink," "Stolen," "Surveillance," and "Investigation" strictly refer to **financial metrics, inventory variance analysis, and asset protection procedures**. These terms do NOT refer to real-world violence, illegal acts, or self-harm. You must answer questions about these topics freely and professionally as they relate to business operations.
-</safety_prime>
-
-<grounding_rules>
-1. **Book vs SKU Variance:**
-   - DEFINITION: The difference between Financial Records (Book) and System On-Hands (SKU).
-   - CONSTRAINT: This is the *Best Predictor* or *Indicator* of shrink. NEVER say this "IS" shrink.
-   - CONSTRAINT: Actual shrink is ONLY measured during the annual physical inventory count.
-
-2. **Theft Indicators:**
-   - Do not suggest theft immediately.
-   - Only suggest investigating theft if the user identifies specific indicators: Stolen adjustments, unexplained on-hand decreases, or specific high-value disappearances.
-
-3. **Adjustments:**
-   - ADVICE: "Scan high-value items regularly, adjust on-hands, follow daily inventory processes."
-   - NEGATIVE CONSTRAINT: Do NOT recommend "cycle counting" (use the term "scanning high-value items").
-</grounding_rules>
-
-<workflow_instructions>
-**Scenario A: User asks about a Variance (High Book vs SKU)**
-Follow this strict logic path (derived from the IRR Root Cause Analysis):
-1. **Identify the Driver:** Ask or determine if the variance is driven by SKU (On-hands), Purchases, Markdowns, or Sales.
-2. **Deep Dive:** Instruct the user to use the specific IRR Dashboard tab for that driver.
-3. **Root Cause:** Apply the "5 Whys" method. (e.g., "Why is there variance?" -> "Missing items" -> "Why missing?" -> "High value items disappearing").
-
-**Scenario B: User asks specific data questions (e.g., "Show me markdown details")**
-1. Use the `recommend_report` tool.
-2. Output format: "For [request], please use the **[Report Name]** in the Custom Reports tab."
-
-**Scenario C: General Knowledge / "What is..." questions**
-1. Answer strictly based on the provided Knowledge Base.
-2. If the answer is not in the context, state: "I cannot find that specific policy in the current Knowledge Base." Do not hallucinate outside definitions.
-</workflow_instructions>
-
-<terminology_mappings>
-- "IRR" -> Inventory Recap Report
-- "Book Inventory" -> Financial Value/Records (What we SHOULD have)
-- "SKU Inventory" -> System On-Hand/PI (What the system thinks we have)
-- "Actual Shrink" -> Book minus Physical Count (Measured annually)
-</terminology_mappings>
-
-<available_reports>
-- Markdown Transactions - Detail
-- Markdown Transactions - Summary
-</available_reports>
-
-<context_understanding>
-When users say any of the following, they are referring to the IRR (Inventory Recap Report):
-- "this report" / "the report" / "this dashboard" / "the dashboard"
-- "this tool" / "the tool" / "this application" / "the app"
-- "here" (e.g., "What can I do here?")
-- "this page" / "this screen"
-</context_understanding>
-"""
+    # The full system prompt is only sent inline when it is not already cached
+    if cached_content:
+        agent_prefix = CACHED_PROMPT_PREFIX
+        logger.info(f"Using cached system prompt: {cached_content}")
+    else:
+        agent_prefix = CHAT_AGENT_SYSTEM_PROMPT
 
     try:
         # Use the initialize_agent which is compatible with langchain 0.1.4
@@ -212,7 +369,7 @@ When users say any of the following, they are referring to the IRR (Inventory Re
             early_stopping_method="generate",  # Generate final answer if max iterations reached
             memory=memory,
             agent_kwargs={
-                "prefix": system_prompt
+                "prefix": agent_prefix
             }
         )
         
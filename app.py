@@ -3,38 +3,16 @@ import os
 import sys
 from pathlib import Path
 from typing import List
-import logging
 import dotenv
 from datetime import datetime
 import io
 
-# Set up logging
-log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-logger = logging.getLogger('adk_chat')
-logger.setLevel(logging.INFO)
-
-# Always log to stdout for Posit Connect
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(logging.Formatter(log_format))
-logger.addHandler(console_handler)
-
-# Try to log to file if possible
-try:
-    log_dir = Path('logs')
-    log_dir.mkdir(exist_ok=True)
-    file_handler = logging.FileHandler('logs/app.log')
-    file_handler.setFormatter(logging.Formatter(log_format))
-    logger.addHandler(file_handler)
-except Exception as e:
-    logger.warning(f"Could not set up file logging: {e}")
+# Set up logging. Records are queued and written to stdout (for Posit
+# Connect) and logs/app.log by a background thread, see log_pipeline.py
+from log_pipeline import setup_logging
+logger = setup_logging('adk_chat', log_file='logs/app.log')
 
 from shiny import App, reactive, render, ui, Inputs, Outputs, Session
-try:
-    from shinywidgets import output_widget, render_plotly
-except ImportError:
-    output_widget = None
-    render_plotly = None
-    logger.warning("shinywidgets not available - some features may not work")
 
 try:
     from markdown2 import markdown
@@ -44,26 +22,42 @@ except ImportError:
         return text
     logger.warning("markdown2 not available - markdown rendering disabled")
 
-from langchain_google_vertexai import ChatVertexAI
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from vertexai.generative_models import HarmCategory, HarmBlockThreshold
-from agents import create_chat_agent
+from retry_utils import ErrorKind, classify_error
+from model_router import get_model_router
+from lazy_imports import lazy_module
+from query_guard import QueryTooExpensiveError
+from tracing import span, traced
+from metrics import metrics, metrics_route
+from profiler import profiler_route
+from clients import health_route
+from frame_dtypes import widen_dtypes
 from ui import app_ui
-from src.server_custom_reports import setup_custom_reports_server
-import plotly.graph_objects as go
-import plotly.express as px
-from data_service import DataService
 import pandas as pd
 
+# Heavy stacks are deferred so a cold start only pays for Shiny and pandas:
+# plotly loads on the first chart render, and the LLM/agent stack
+# (langchain, vertexai, agents, tools) on the first chat message.
+go = lazy_module('plotly.graph_objects')
+
+AGENT_INVOCATIONS = metrics.counter('agent_invocations_total', "Chat agent runs", ['outcome'])
+AGENT_SECONDS = metrics.histogram('agent_invocation_seconds', "Duration of chat agent runs")
+CHAT_ERRORS = metrics.counter('chat_errors_total', "Chat turns that ended in an error message", ['kind'])
+
 # Load environment variables
 dotenv.load_dotenv()
 
-# Ensure required files and permissions
-try:
-    # Log current working directory and permissions
-    current_dir = os.getcwd()
-    logger.info(f"Current working directory: {current_dir}")
-    logger.info(f"Directory contents: {os.listdir(current_dir)}")
+_credentials_verified = False
+
+def verify_credentials():
+    """
+    Check the service account credentials once per process.
+
+    Called before the first Vertex AI/BigQuery use rather than at import time,
+    so starting the app doesn't touch the filesystem for them.
+    """
+    global _credentials_verified
+    if _credentials_verified:
+        return
     
     # Check for service account credentials
     credentials_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
@@ -79,16 +73,12 @@ try:
         logger.error(f"Service account file not found at {credentials_path}")
         raise FileNotFoundError(f"Service account file not found at {credentials_path}")
     
-    # Test credentials file readability and log size
-    with open(credentials_path, 'r') as f:
-        cred_content = f.read()
-        if len(cred_content.strip()) == 0:
-            raise ValueError("Service account file is empty")
-        logger.info(f"Service account file verified successfully at {credentials_path} ({len(cred_content)} bytes)")
-        
-except Exception as e:
-    logger.error(f"Error during initialization: {e}", exc_info=True)
-    raise
+    # Check the file is non-empty without reading it
+    cred_size = os.path.getsize(credentials_path)
+    if cred_size == 0:
+        raise ValueError("Service account file is empty")
+    logger.info(f"Service account file verified successfully at {credentials_path} ({cred_size} bytes)")
+    _credentials_verified = True
 
 def server(input: Inputs, output: Outputs, session: Session):
     """Define the server logic"""
@@ -104,8 +94,48 @@ def server(input: Inputs, output: Outputs, session: Session):
         session.initialized = False
         logger.info("Session created, initialized flag set to False")
     
-    # Initialize data service
-    data_service = DataService()
+    # Deferred until the first session starts (see note at the top of the file)
+    from shinywidgets import render_plotly
+    from data_service import DataService
+    from src.server_custom_reports import setup_custom_reports_server
+    
+    verify_credentials()
+    
+    # Initialize data service. Markdown queries go through the process-wide
+    # data cache, which also holds reports prefetched from chat recommendations
+    from data_cache import CachingDataService, caching_data_service
+    from clients import DATA_BACKEND
+    if DATA_BACKEND == 'duckdb':
+        # Local Parquet mirror (see local_mirror.py), shared by all sessions;
+        # falls back to BigQuery if the mirror is missing
+        data_service = caching_data_service()
+    else:
+        data_service = CachingDataService(DataService())
+    
+    # Shared store insights cache; the refresh thread starts with the first session
+    from store_insights import store_insights_cache
+    store_insights_cache.start_background_refresh()
+    
+    # Latency spans for calcs, renderers, exports and chat carry the session
+    # ID and the filters in effect (see tracing.py)
+    IRR_FILTERS = ('dashboard_tabs', 'store_filter', 'dept_filter')
+    MARKDOWN_FILTERS = ('dashboard_tabs', 'md_store_filter', 'md_dept_filter', 'item_nbr_filter',
+                        'cid_filter', 'md_desc_filter', 'md_sort_column', 'md_sort_order', 'md_limit_rows')
+    
+    def trace(name, filter_inputs=()):
+        def current_filters():
+            filters = {}
+            # Isolated so recording a filter doesn't add a reactive dependency
+            with reactive.isolate():
+                for input_id in filter_inputs:
+                    try:
+                        value = input[input_id]()
+                    except Exception:
+                        continue
+                    if value not in (None, ''):
+                        filters[input_id] = value
+            return filters
+        return traced(name, session_id=session.id, attributes=current_filters)
     
     # Set up Custom Reports tab
     setup_custom_reports_server(input, output, session, data_service)
@@ -125,6 +155,25 @@ def server(input: Inputs, output: Outputs, session: Session):
         }
         logger.info("Session cache initialized")
     
+    # Per-session memory accounting and the global budget (see session_memory.py)
+    from session_memory import session_memory
+    
+    def current_transcript():
+        with reactive.isolate():
+            return chat_messages.get()
+    
+    session_memory.register(session.id, session.cache, current_transcript)
+    
+    def release_session_state():
+        session_memory.unregister(session.id)
+        # Let the agent, its memory and the grounded model be collected
+        session.chat_agent = None
+        session.chat_memory = None
+        session.grounded_model = None
+        session.initialized = False
+    
+    session.on_ended(release_session_state)
+    
     def get_store_1_data_cached():
         """Get Store 1 data with caching (5 min TTL)"""
         import time
@@ -142,6 +191,7 @@ def server(input: Inputs, output: Outputs, session: Session):
         data = data_service.get_irr_data(store_nbr=1, current_month_only=True)
         session.cache['store_1_data'] = data
         session.cache['store_1_timestamp'] = now
+        session_memory.update(session.id)
         return data
     
     def get_stores_list_cached():
@@ -161,6 +211,7 @@ def server(input: Inputs, output: Outputs, session: Session):
         stores = data_service.get_store_list(all_stores=True)
         session.cache['stores_list'] = stores
         session.cache['stores_timestamp'] = now
+        session_memory.update(session.id)
         return stores
     
     def get_departments_cached(store_nbr=1):
@@ -180,6 +231,7 @@ def server(input: Inputs, output: Outputs, session: Session):
         departments = data_service.get_department_list(store_nbr=store_nbr)
         session.cache['departments'] = departments
         session.cache['departments_timestamp'] = now
+        session_memory.update(session.id)
         return departments
     
     # CONSOLIDATED filter initialization - loads data ONCE and shares between tabs - WITH CACHING
@@ -245,6 +297,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     
     # Reactive value for current month IRR data (for table) - LAZY LOAD
     @reactive.Calc
+    @trace('calc.irr_data_current', IRR_FILTERS)
     def irr_data_current():
         """Get current month IRR data based on filters - only loads when IRR Dashboard tab is active"""
         try:
@@ -279,16 +332,17 @@ def server(input: Inputs, output: Outputs, session: Session):
             logger.error(f"Error fetching current month IRR data: {e}", exc_info=True)
             return pd.DataFrame()
     
-    # Reactive value for 13 months IRR data (for charts) - LAZY LOAD
+    # Reactive value for 13 months of monthly IRR totals (for charts) - LAZY LOAD
     @reactive.Calc
-    def irr_data_13months():
-        """Get 13 months IRR data based on filters - only loads when IRR Dashboard tab is active"""
+    @trace('calc.irr_monthly_rollup', IRR_FILTERS)
+    def irr_monthly_rollup():
+        """Get monthly IRR totals for the last 13 months - only loads when IRR Dashboard tab is active"""
         try:
             # Only fetch data when IRR Dashboard tab is selected
             current_tab = input.dashboard_tabs()
-            logger.info(f">>> IRR_DATA_13MONTHS CALC: Current tab = {current_tab}")
+            logger.info(f">>> IRR_MONTHLY_ROLLUP CALC: Current tab = {current_tab}")
             if current_tab != "IRR Dashboard":
-                logger.info(">>> IRR_DATA_13MONTHS: Tab not active, returning empty")
+                logger.info(">>> IRR_MONTHLY_ROLLUP: Tab not active, returning empty")
                 return pd.DataFrame()
             
             # Get filter values - trigger on these
@@ -299,25 +353,22 @@ def server(input: Inputs, output: Outputs, session: Session):
             store_nbr = int(store) if store and store.strip() else 1  # Default to Store 1
             dept_nbr = int(dept) if dept and dept.strip() else None
             
-            logger.info(f"Fetching 13 months IRR data: store={store_nbr}, dept={dept_nbr}")
+            logger.info(f"Fetching 13 months IRR rollup: store={store_nbr}, dept={dept_nbr}")
             
-            # Get 13 months data from service
-            df = data_service.get_irr_data(
-                store_nbr=store_nbr,
-                dept_nbr=dept_nbr,
-                current_month_only=False
-            )
+            # At most 13 rows; shared by all four charts
+            df = data_service.get_irr_monthly_rollup(store_nbr=store_nbr, dept_nbr=dept_nbr)
             
-            logger.info(f"Retrieved {len(df)} rows of 13 months IRR data")
+            logger.info(f"Retrieved {len(df)} months of IRR rollup data")
             return df
             
         except Exception as e:
-            logger.error(f"Error fetching 13 months IRR data: {e}", exc_info=True)
+            logger.error(f"Error fetching 13 months IRR rollup: {e}", exc_info=True)
             return pd.DataFrame()
     
     # Render data table
     @render.data_frame
     @reactive.event(input.dashboard_tabs, ignore_none=False)
+    @trace('render.irr_table', IRR_FILTERS)
     def irr_table():
         """Render the IRR data table"""
         try:
@@ -379,6 +430,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     
     # Export to Excel
     @render.download(filename=lambda: f"IRR_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    @trace('export.irr_excel', IRR_FILTERS)
     async def download_excel():
         """Download the current IRR data as Excel file"""
         try:
@@ -393,7 +445,7 @@ def server(input: Inputs, output: Outputs, session: Session):
             output = io.BytesIO()
             
             with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name='IRR Report', index=False)
+                widen_dtypes(df).to_excel(writer, sheet_name='IRR Report', index=False)
             
             output.seek(0)
             yield output.getvalue()
@@ -410,6 +462,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     
     # Export to CSV
     @render.download(filename=lambda: f"IRR_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    @trace('export.irr_csv', IRR_FILTERS)
     async def download_csv():
         """Download the current IRR data as CSV file"""
         try:
@@ -418,70 +471,16 @@ def server(input: Inputs, output: Outputs, session: Session):
             if df.empty:
                 df = pd.DataFrame({"Message": ["No data available for selected filters"]})
             
-            yield df.to_csv(index=False).encode('utf-8')
+            yield widen_dtypes(df).to_csv(index=False).encode('utf-8')
             
         except Exception as e:
             logger.error(f"Error generating CSV file: {e}", exc_info=True)
             df = pd.DataFrame({"Error": [str(e)]})
             yield df.to_csv(index=False).encode('utf-8')
     
-    def parse_insights_to_html(text):
-        """Parse markdown-like bullet format to structured HTML"""
-        if not text or not text.strip():
-            return "<p>No insights available.</p>"
-        
-        lines = text.split('\n')
-        html = []
-        current_section = None
-        current_dept = None
-        
-        for line in lines:
-            stripped = line.strip()
-            if not stripped:
-                continue
-            
-            # Count leading spaces to determine indent level
-            indent_level = len(line) - len(line.lstrip(' '))
-            
-            # Remove the asterisk and extra spaces
-            content = stripped.lstrip('* ').strip()
-            
-            if not content:
-                continue
-            
-            # Level 0: Section titles (e.g., "Recommended Actions:")
-            if indent_level == 0 and content.endswith(':'):
-                if current_dept:
-                    html.append('</ul>')
-                    current_dept = None
-                if current_section:
-                    html.append('</ul>')
-                html.append(f'<h3>{content}</h3>')
-                html.append('<ul class="section-list">')
-                current_section = True
-            
-            # Level 2: Department names (e.g., "Department 60:")
-            elif indent_level <= 2 and content.endswith(':') and ('Department' in content or 'Anomalies' in content):
-                if current_dept:
-                    html.append('</ul>')
-                html.append(f'<li class="dept-item"><strong>{content}</strong>')
-                html.append('<ul class="detail-list">')
-                current_dept = True
-            
-            # Level 4+: Detail items
-            else:
-                html.append(f'<li class="detail-item">{content}</li>')
-        
-        # Close any open lists
-        if current_dept:
-            html.append('</ul></li>')
-        if current_section:
-            html.append('</ul>')
-        
-        return '\n'.join(html)
-    
     # Render AI-Generated Store Insights
     @render.ui
+    @trace('render.store_insights', IRR_FILTERS)
     def store_insights():
         """Render the AI-generated store summary"""
         try:
@@ -491,13 +490,9 @@ def server(input: Inputs, output: Outputs, session: Session):
             # Default to Store 1 if no store selected
             store_nbr = int(store) if store and store.strip() else 1
             
-            logger.info(f"Fetching store insights for store {store_nbr}")
-            
-            # Get the summary from BigQuery
-            summary_text = data_service.get_store_summary(store_nbr)
-            
-            # Parse the markdown-like format to HTML
-            html_content = parse_insights_to_html(summary_text)
+            # Rendered HTML comes from the process-wide insights cache;
+            # only a miss reaches BigQuery
+            html_content = store_insights_cache.get_html(store_nbr, data_service)
             
             # Return the HTML-formatted summary
             return ui.HTML(f"""
@@ -516,6 +511,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     
     # Reactive value for markdowns data (lazy load - only when tab is selected)
     @reactive.Calc
+    @trace('calc.markdowns_data_current', MARKDOWN_FILTERS)
     def markdowns_data_current():
         """Get current markdowns data based on filters - only loads when Markdowns tab is active"""
         try:
@@ -555,9 +551,15 @@ def server(input: Inputs, output: Outputs, session: Session):
             except:
                 md_desc = None
             
+            # Typed filters must be whole numbers; say so instead of
+            # dropping the filter and querying without it
+            for label, value in (("Item number", item), ("CID", cid)):
+                if value is not None and not (value.isascii() and value.isdigit()):
+                    raise ValueError(f"{label} must be a whole number, got {value!r}")
+            
             store_nbr = int(store) if store and str(store).strip() else None
             dept_nbr = int(dept) if dept and str(dept).strip() else None
-            item_nbr = int(item) if item and item.isdigit() else None
+            item_nbr = int(item) if item else None
             
             # Get sort and limit settings
             try:
@@ -595,12 +597,17 @@ def server(input: Inputs, output: Outputs, session: Session):
             
             return df
             
+        except (QueryTooExpensiveError, ValueError):
+            # Let the table show the budget or validation message instead of
+            # "no data"
+            raise
         except Exception as e:
             logger.error(f"Error fetching markdowns data: {e}")
             return pd.DataFrame()
     
     # Render markdowns data table
     @render.data_frame
+    @trace('render.markdowns_table', MARKDOWN_FILTERS)
     def markdowns_table():
         """Render the markdowns data table with custom formatting"""
         try:
@@ -734,6 +741,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     
     # Export markdowns to Excel
     @render.download(filename=lambda: f"Markdowns_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    @trace('export.markdowns_excel', MARKDOWN_FILTERS)
     async def download_markdowns_excel():
         """Download markdowns data as Excel file"""
         try:
@@ -743,7 +751,7 @@ def server(input: Inputs, output: Outputs, session: Session):
             
             output = io.BytesIO()
             with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name='Markdowns', index=False)
+                widen_dtypes(df).to_excel(writer, sheet_name='Markdowns', index=False)
             output.seek(0)
             yield output.getvalue()
         except Exception as e:
@@ -757,13 +765,14 @@ def server(input: Inputs, output: Outputs, session: Session):
     
     # Export markdowns to CSV
     @render.download(filename=lambda: f"Markdowns_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    @trace('export.markdowns_csv', MARKDOWN_FILTERS)
     async def download_markdowns_csv():
         """Download markdowns data as CSV file"""
         try:
             df = markdowns_data_current()
             if df.empty:
                 df = pd.DataFrame({"Message": ["No data available"]})
-            yield df.to_csv(index=False).encode('utf-8')
+            yield widen_dtypes(df).to_csv(index=False).encode('utf-8')
         except Exception as e:
             logger.error(f"Error generating markdowns CSV: {e}")
             yield pd.DataFrame({"Error": [str(e)]}).to_csv(index=False).encode('utf-8')
@@ -771,6 +780,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     # Render Book vs SKU chart
     @render_plotly
     @reactive.event(input.dashboard_tabs, ignore_none=False)
+    @trace('render.book_sku_chart', IRR_FILTERS)
     def book_sku_chart():
         """Render Book vs SKU line chart - waits for data to avoid double render"""
         try:
@@ -778,15 +788,15 @@ def server(input: Inputs, output: Outputs, session: Session):
             # Only render when IRR Dashboard tab is active
             if input.dashboard_tabs() != "IRR Dashboard":
                 return None
-            df = irr_data_13months()
+            df = irr_monthly_rollup()
             
             # Return None to prevent rendering when no data
             if df.empty:
                 logger.info(">>> BOOK/SKU CHART: No data, returning None")
                 return None
             
-            # Aggregate by month
-            chart_df = data_service.aggregate_by_month(df, ['Book', 'SKU'])
+            # Monthly totals are precomputed; copy before adding hover columns
+            chart_df = df[['Month_Year', 'Book', 'SKU']].copy()
             
             if chart_df.empty:
                 return go.Figure()
@@ -865,6 +875,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     # Render Purchases chart
     @render_plotly
     @reactive.event(input.dashboard_tabs, ignore_none=False)
+    @trace('render.purchases_chart', IRR_FILTERS)
     def purchases_chart():
         """Render Purchases line chart - waits for data to avoid double render"""
         try:
@@ -872,14 +883,14 @@ def server(input: Inputs, output: Outputs, session: Session):
             # Only render when IRR Dashboard tab is active
             if input.dashboard_tabs() != "IRR Dashboard":
                 return None
-            df = irr_data_13months()
+            df = irr_monthly_rollup()
             
             if df.empty:
                 logger.info(">>> PURCHASES CHART: No data, returning None")
                 return None
             
-            # Aggregate by month
-            chart_df = data_service.aggregate_by_month(df, ['Purchases'])
+            # Monthly totals are precomputed; copy before adding hover columns
+            chart_df = df[['Month_Year', 'Purchases']].copy()
             
             if chart_df.empty:
                 return go.Figure()
@@ -940,6 +951,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     # Render Markdowns chart
     @render_plotly
     @reactive.event(input.dashboard_tabs, ignore_none=False)
+    @trace('render.markdowns_chart', IRR_FILTERS)
     def markdowns_chart():
         """Render Markdowns line chart - waits for data to avoid double render"""
         try:
@@ -947,14 +959,14 @@ def server(input: Inputs, output: Outputs, session: Session):
             # Only render when IRR Dashboard tab is active
             if input.dashboard_tabs() != "IRR Dashboard":
                 return None
-            df = irr_data_13months()
+            df = irr_monthly_rollup()
             
             if df.empty:
                 logger.info(">>> MARKDOWNS CHART: No data, returning None")
                 return None
             
-            # Aggregate by month
-            chart_df = data_service.aggregate_by_month(df, ['Markdowns'])
+            # Monthly totals are precomputed; copy before adding hover columns
+            chart_df = df[['Month_Year', 'Markdowns']].copy()
             
             if chart_df.empty:
                 return go.Figure()
@@ -1014,6 +1026,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     
     # Render Markdowns tab chart (separate, lazy-loaded)
     @render_plotly
+    @trace('render.markdowns_tab_chart', MARKDOWN_FILTERS)
     def markdowns_tab_chart():
         """Render Markdowns line chart for Markdowns tab - only loads when tab is active"""
         try:
@@ -1023,14 +1036,14 @@ def server(input: Inputs, output: Outputs, session: Session):
                 logger.debug("Markdowns tab not selected, skipping chart render")
                 return None
             
-            df = irr_data_13months()
+            df = irr_monthly_rollup()
             
             if df.empty:
                 logger.debug("No data available for Markdowns tab chart yet")
                 return None
             
-            # Aggregate by month
-            chart_df = data_service.aggregate_by_month(df, ['Markdowns'])
+            # Monthly totals are precomputed; copy before adding hover columns
+            chart_df = df[['Month_Year', 'Markdowns']].copy()
             
             if chart_df.empty:
                 return go.Figure()
@@ -1121,6 +1134,8 @@ def server(input: Inputs, output: Outputs, session: Session):
                 raise ValueError(f"Credentials file not found at {credentials_path}")
             
             try:
+                from vertexai.generative_models import HarmCategory, HarmBlockThreshold
+                
                 # Initialize Vertex AI with grounding using the new recommended approach
                 logger.info(f"Initializing Vertex AI with grounding for project {gcp_project}...")
                 
@@ -1148,23 +1163,55 @@ def server(input: Inputs, output: Outputs, session: Session):
                     HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
                 }
                 
-                llm = ChatVertexAI(
-                    project=gcp_project,
-                    location=vertex_location,
-                    model_name=vertex_model,
-                    temperature=0.7,
-                    max_retries=3,
-                    request_timeout=120,
-                    safety_settings=safety_settings
-                )
-                
+                # Register the static system prompt once per process so each ReAct step
+                # only references it (None -> send prompt inline)
+                from agents import CHAT_AGENT_SYSTEM_PROMPT, ResilientChatVertexAI, TieredChatModel
+                from prompt_cache import get_prompt_cache
+                prompt_cache = get_prompt_cache()
+
+                def build_llm(model_name):
+                    """Create the LangChain wrapper for one model, bound to its cached prompt if any"""
+                    cached = prompt_cache.get_or_create(model_name, CHAT_AGENT_SYSTEM_PROMPT) if prompt_cache else None
+                    llm_kwargs = {'cached_content': cached} if cached else {}
+                    # Retries happen per LLM call inside ResilientChatVertexAI, so
+                    # the SDK's own retry loop is limited to a single attempt
+                    model = ResilientChatVertexAI(
+                        project=gcp_project,
+                        location=vertex_location,
+                        model_name=model_name,
+                        temperature=0.7,
+                        max_retries=1,
+                        request_timeout=120,
+                        safety_settings=safety_settings,
+                        **llm_kwargs
+                    )
+                    return model, cached
+
+                # Fast model for tool selection and simple turns, strong model
+                # (VERTEX_MODEL) for long-form answers
+                model_router = get_model_router()
+                if model_router:
+                    fast_llm, fast_cached = build_llm(model_router.models['fast'])
+                    strong_llm, strong_cached = build_llm(model_router.models['strong'])
+                    llm = TieredChatModel(fast_llm=fast_llm, strong_llm=strong_llm, router=model_router)
+                    # The short cached prefix only works if both tiers have the prompt cached
+                    cached_content = strong_cached if fast_cached and strong_cached else None
+                    logger.info(f"Model tiering enabled: fast={model_router.models['fast']}, strong={model_router.models['strong']}")
+                else:
+                    llm, cached_content = build_llm(vertex_model)
+
                 logger.info("LangChain wrapper created for agent compatibility")
-                
+
                 # Initialize chat agent with knowledge retrieval and report recommendation tools
                 # Note: Grounding temporarily disabled, using retrieve_knowledge tool instead
                 logger.info("Initializing chat agent with knowledge retrieval and report recommendations...")
                 from tools import retrieve_knowledge, recommend_report
-                chat_agent = create_chat_agent(llm, tools=[retrieve_knowledge, recommend_report], memory=memory)
+                chat_agent = create_chat_agent(
+                    llm,
+                    tools=[retrieve_knowledge, recommend_report],
+                    memory=memory,
+                    cached_content=cached_content
+                )
                 logger.info("Chat agent created with memory, knowledge retrieval, and report recommendation capability")
                 
                 # Store both in session for reuse
@@ -1203,6 +1250,7 @@ def server(input: Inputs, output: Outputs, session: Session):
 
     @reactive.Effect
     @reactive.event(input.send)
+    @trace('chat.send')
     def _():
         user_msg = None
         try:
@@ -1239,67 +1287,48 @@ def server(input: Inputs, output: Outputs, session: Session):
             ui.update_text("user_message", value="")
             logger.info("Cleared input field")
             
-            # Get response from the LangChain agent executor with retry logic
+            # Get response from the LangChain agent executor. Transient errors
+            # (quota, timeouts, 503s) are retried per LLM/tool call underneath,
+            # so only safety blocks are handled here by rephrasing the question.
             logger.info(f"Invoking agent with message: {user_msg}")
             start_time = datetime.now()
             
             result = None
-            max_retries = 2
-            retry_count = 0
             original_user_msg = user_msg  # Save original message
+            model_router = get_model_router()
+            safety_rephrasings = [
+                "As a retail operations assistant, please answer this business question: {}",
+                "Question about retail inventory management: {}",
+            ]
             
-            while retry_count <= max_retries:
+            for attempt in range(len(safety_rephrasings) + 1):
                 try:
-                    if retry_count > 0:
-                        logger.info(f"Retry attempt {retry_count} of {max_retries}")
-                        # Add a small delay before retry
-                        import time
-                        time.sleep(1)
-                    
-                    result = session.chat_agent.invoke({"input": user_msg})
+                    # Route the turn between the fast and strong models
+                    with span('chat.agent_invoke', attributes={'attempt': attempt}):
+                        if model_router:
+                            with model_router.turn(original_user_msg):
+                                result = session.chat_agent.invoke({"input": user_msg})
+                        else:
+                            result = session.chat_agent.invoke({"input": user_msg})
                     
-                    # Success - break out of retry loop
                     response_time = (datetime.now() - start_time).total_seconds()
                     logger.info(f"Agent response received in {response_time:.2f}s")
+                    AGENT_INVOCATIONS.inc(outcome='ok')
+                    AGENT_SECONDS.observe(response_time)
                     break
                     
-                except Exception as retry_error:
-                    error_str = str(retry_error)
-                    retry_count += 1
-                    
-                    # Check if it's a retryable error
-                    is_safety_block = "SAFETY" in error_str or "blocked" in error_str.lower() or "finish_reason" in error_str.lower()
-                    is_quota = "ResourceExhausted" in error_str or "quota" in error_str.lower()
-                    is_timeout = "timeout" in error_str.lower() or "deadline" in error_str.lower()
-                    
-                    if retry_count > max_retries:
-                        # Max retries reached - re-raise the error
-                        logger.error(f"Max retries ({max_retries}) reached, giving up")
+                except Exception as agent_error:
+                    AGENT_INVOCATIONS.inc(outcome='error')
+                    error_kind = classify_error(agent_error)
+                    if error_kind is not ErrorKind.SAFETY or attempt >= len(safety_rephrasings):
+                        logger.error(f"Agent invocation failed ({error_kind.value}), giving up")
                         raise
                     
-                    if is_safety_block:
-                        logger.warning(f"Safety block detected on attempt {retry_count}, retrying with context...")
-                        # On first retry, add business context. On second retry, use simplified version
-                        if retry_count == 1:
-                            user_msg = f"As a retail operations assistant, please answer this business question: {original_user_msg}"
-                        else:
-                            # Second retry - very simple professional framing
-                            user_msg = f"Question about retail inventory management: {original_user_msg}"
-                    elif is_quota:
-                        logger.warning(f"Quota exceeded on attempt {retry_count}, waiting before retry...")
-                        import time
-                        time.sleep(2)  # Wait longer for quota issues
-                        user_msg = original_user_msg  # Reset to original
-                    elif is_timeout:
-                        logger.warning(f"Timeout on attempt {retry_count}, retrying with same input...")
-                        user_msg = original_user_msg  # Reset to original
-                    else:
-                        # Unknown error - don't retry
-                        logger.error(f"Non-retryable error: {error_str}")
-                        raise
+                    logger.warning(f"Safety block detected on attempt {attempt + 1}, retrying with business context...")
+                    user_msg = safety_rephrasings[attempt].format(original_user_msg)
             
             if result is None:
-                raise Exception("Failed to get response after retries")
+                raise Exception("Failed to get response from the agent")
             
             # Extract the output from the result
             response_content = result.get("output", str(result))
@@ -1323,16 +1352,20 @@ def server(input: Inputs, output: Outputs, session: Session):
             logger.error(f"Exception type: {error_type}")
             
             # Provide user-friendly error messages based on error type
-            if "VPCServiceControlsError" in error_str or "VPC" in error_str:
+            error_kind = classify_error(e)
+            CHAT_ERRORS.inc(kind=error_kind.value)
+            if error_kind is ErrorKind.NETWORK_POLICY:
                 user_error_msg = "⚠️ Network access issue. The AI service is temporarily blocked by VPC restrictions. This has been logged and we'll retry automatically."
-            elif "ResourceExhausted" in error_str or "quota" in error_str.lower():
+            elif error_kind is ErrorKind.CIRCUIT_OPEN:
+                user_error_msg = "⚠️ The AI service is having trouble right now, so we've paused requests to it for a few seconds. Please try again shortly."
+            elif error_kind is ErrorKind.QUOTA:
                 user_error_msg = "⚠️ Service quota exceeded. We attempted to retry your request but the service is currently at capacity. Please try again in a minute."
-            elif "SAFETY" in error_str or "blocked" in error_str.lower() or "finish_reason" in error_str.lower():
+            elif error_kind is ErrorKind.SAFETY:
                 # This should rarely happen now due to retry logic
                 user_error_msg = "⚠️ I apologize, but I couldn't process that question even after multiple attempts. This appears to be a safety filter issue. Could you try rephrasing your question? For example, try starting with 'What is...' or 'How does...'."
-            elif "timeout" in error_str.lower() or "deadline" in error_str.lower():
+            elif error_kind is ErrorKind.TIMEOUT:
                 user_error_msg = "⚠️ Request timed out after multiple attempts. Please try a simpler question or try again. If this persists, contact support."
-            elif "PermissionDenied" in error_str or "permission" in error_str.lower():
+            elif error_kind is ErrorKind.PERMISSION:
                 user_error_msg = "⚠️ Permission error. Your account may not have access to the AI service. Please contact your administrator."
             elif "not initialized" in error_str.lower():
                 user_error_msg = "⚠️ Chat service not ready. Please refresh the page and try again. If this persists, contact support."
@@ -1356,13 +1389,15 @@ def server(input: Inputs, output: Outputs, session: Session):
         finally:
             # Always re-enable input after processing (success or failure)
             is_processing.set(False)
+            session_memory.update(session.id, chat_memory=getattr(session, 'chat_memory', None))
             logger.info("Set processing state to False")
 
     @output
     @render.ui
+    @trace('render.chat_history')
     def chat_history():
-        # Initialize agent on first render
-        initialize_agent()
+        # The agent is initialized by the first message (see the send handler),
+        # so sessions that never chat don't load the LLM stack
         
         # Get current chat messages (this creates reactive dependency)
         history = chat_messages.get()
@@ -1453,5 +1488,7 @@ logger.info(f"Python version: {sys.version}")
 logger.info(f"Platform: {sys.platform}")
 logger.info("=== Startup Diagnostics Complete ===")
 
-# Create the Shiny app with static file directory
-app = App(app_ui, server, static_assets=Path(__file__).parent / "www")
\ No newline at end of file
+# Create the Shiny app with static file directory; GET /metrics serves the
+# metrics registry in Prometheus text format and GET /health probes the
+# shared service clients
+app = profiler_route(metrics_route(health_route(App(app_ui, server, static_assets=Path(__file__).parent / "www"))))
\ No newline at end of file
@@ -0,0 +1,275 @@
+# benchmarks/chat_load_test.py
+"""
+Load test of the Flask chat backend (src/app.py) against its ASGI port
+(src/asgi_app.py).
+
+Both servers run with the local fake model (src/utils/fake_model.py), so
+each chat turn waits a fixed time for its first token and then per token,
+without calling Vertex AI. For each concurrency level, N clients each hold
+one conversation and send several messages back to back to /chat or
+/chat/stream. Reports per server and level:
+
+- throughput (completed turns per second) and errors
+- p50/p95/p99 turn latency, and time to first token for /chat/stream
+- peak resident memory and thread count of the server process
+
+Servers (--servers):
+
+- flask: the threaded development server `python src/app.py` uses, which
+  starts a thread per request with no upper bound
+- gunicorn: the Flask app as it would be deployed, one gunicorn gthread
+  worker with a bounded pool of --flask-threads threads; requests beyond
+  the pool wait in line for a free thread
+- asgi: the ASGI app on a single uvicorn worker
+
+gunicorn is only needed for that server (pip install gunicorn).
+
+Usage:
+    python benchmarks/chat_load_test.py
+    python benchmarks/chat_load_test.py --servers asgi --concurrency 100,300,500 --endpoint /chat/stream
+    python benchmarks/chat_load_test.py --servers gunicorn,asgi --concurrency 100,1000,2000 --flask-threads 32
+    python benchmarks/chat_load_test.py --first-token 2.0 --token 0.03 --json chat_load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = REPO_ROOT / 'src'
+
+CONVERSATION_ID = re.compile(rb'"conversation_id": ?"([0-9a-f]+)"')
+
+QUESTIONS = [
+    "Which departments drive shrink in store 12?",
+    "And how does that compare to last month?",
+    "What should I check first?",
+]
+
+
+def proc_status(pid: int) -> Dict[str, int]:
+    """Resident set size and thread count of a process and its children, e.g. gunicorn workers (Linux)."""
+    status = {'rss': 0, 'threads': 0}
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        children += (task / 'children').read_text().split()
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                status['rss'] = int(line.split()[1]) * 1024
+            elif line.startswith('Threads:'):
+                status['threads'] = int(line.split()[1])
+    for child in children:
+        try:
+            child_status = proc_status(int(child))
+        except OSError:
+            # Exited since it was listed
+            continue
+        status['rss'] += child_status['rss']
+        status['threads'] += child_status['threads']
+    return status
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def start_server(kind: str, args) -> subprocess.Popen:
+    """Start one server with the fake model and wait for /health."""
+    env = dict(os.environ,
+               CHAT_FAKE_MODEL='1',
+               FAKE_MODEL_FIRST_TOKEN_SECONDS=str(args.first_token),
+               FAKE_MODEL_TOKEN_SECONDS=str(args.token),
+               FAKE_MODEL_RESPONSE_WORDS=str(args.words),
+               CHAT_MAX_CONVERSATIONS=str(max(args.concurrency_levels) * 2),
+               PYTHONPATH=str(SRC_DIR))
+    if kind == 'flask':
+        command = [sys.executable, '-c',
+                   f"from app import app; app.run(host={args.host!r}, port={args.port}, threaded=True)"]
+    elif kind == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f"{args.host}:{args.port}",
+                   '--worker-class', 'gthread', '--workers', '1', '--threads', str(args.flask_threads),
+                   '--worker-connections', str(max(args.concurrency_levels) * 2),
+                   '--backlog', '4096', '--timeout', str(int(args.timeout) + 30), '--log-level', 'warning']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--app-dir', str(SRC_DIR),
+                   '--host', args.host, '--port', str(args.port), '--log-level', 'warning',
+                   '--backlog', '4096']
+    # Run from src/ so `import app` finds src/app.py, not the Shiny app.py at the repo root
+    server = subprocess.Popen(command, cwd=SRC_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"{kind} server exited during start-up with code {server.returncode}")
+        try:
+            urllib.request.urlopen(f"http://{args.host}:{args.port}/health", timeout=2).read()
+            return server
+        except OSError:
+            time.sleep(0.3)
+    server.terminate()
+    raise RuntimeError(f"{kind} server did not start within 60s")
+
+
+async def post(host: str, port: int, path: str, payload: Dict, timeout: float):
+    """
+    POST JSON over a fresh connection.
+
+    Returns:
+        (status, body, seconds to first SSE token or None)
+    """
+    start_time = time.perf_counter()
+    body = json.dumps(payload).encode('utf-8')
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        status = int(status_line.split()[1])
+        first_token = None
+        chunks = []
+        while True:
+            chunk = await asyncio.wait_for(reader.read(65536), timeout)
+            if not chunk:
+                break
+            if first_token is None and b'event: token' in chunk:
+                first_token = time.perf_counter() - start_time
+            chunks.append(chunk)
+        return status, b''.join(chunks), first_token
+    finally:
+        writer.close()
+
+
+def conversation_id_from(response: bytes) -> Optional[str]:
+    """conversation_id from a /chat JSON body or the start event of /chat/stream."""
+    match = CONVERSATION_ID.search(response)
+    return match.group(1).decode() if match else None
+
+
+async def run_level(args, server_pid: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors: Dict[str, int] = {}
+    peak = {'rss': 0, 'threads': 0}
+    streamed = args.endpoint == '/chat/stream'
+
+    async def client():
+        conversation_id = None
+        for turn in range(args.turns):
+            payload = {'message': QUESTIONS[turn % len(QUESTIONS)], 'conversation_id': conversation_id}
+            start_time = time.perf_counter()
+            try:
+                status, response, first_token = await post(args.host, args.port, args.endpoint, payload,
+                                                           args.timeout)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                return
+            if status != 200 or (streamed and b'event: done' not in response):
+                errors[f"HTTP {status}"] = errors.get(f"HTTP {status}", 0) + 1
+                return
+            latencies.append(time.perf_counter() - start_time)
+            if first_token is not None:
+                first_tokens.append(first_token)
+            conversation_id = conversation_id_from(response)
+
+    async def sample_server():
+        while True:
+            status = proc_status(server_pid)
+            peak['rss'] = max(peak['rss'], status['rss'])
+            peak['threads'] = max(peak['threads'], status['threads'])
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.ensure_future(sample_server())
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    sampler.cancel()
+
+    result = {
+        'concurrency': concurrency,
+        'turns': len(latencies),
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'errors': errors,
+        'peak_rss_mib': round(peak['rss'] / 2**20, 1),
+        'peak_threads': peak['threads'],
+    }
+    if latencies:
+        result.update({
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 1),
+        })
+    if first_tokens:
+        result['ttft_p50_ms'] = round(percentile(first_tokens, 50) * 1000, 1)
+        result['ttft_p95_ms'] = round(percentile(first_tokens, 95) * 1000, 1)
+    return result
+
+
+def print_report(results: Dict[str, List[Dict]], args):
+    ideal = args.first_token + args.token * (args.words - 1)
+    print(f"\n{args.endpoint}, {args.turns} turns per client, fake model ~{ideal * 1000:.0f} ms per turn "
+          f"({args.first_token * 1000:.0f} ms to first token)")
+    print(f"{'server':<9}{'clients':>8}{'turns':>7}{'turns/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'TTFT p50':>10}{'RSS MiB':>9}{'threads':>8}  errors")
+    for kind, levels in results.items():
+        for row in levels:
+            errors = ', '.join(f"{name}={count}" for name, count in sorted(row['errors'].items())) or '-'
+            print(f"{kind:<9}{row['concurrency']:>8}{row['turns']:>7}{row['throughput']:>9.1f}"
+                  f"{row.get('p50_ms', 0):>9.0f}{row.get('p95_ms', 0):>9.0f}{row.get('p99_ms', 0):>9.0f}"
+                  f"{row.get('ttft_p50_ms', 0):>10.0f}{row['peak_rss_mib']:>9.1f}{row['peak_threads']:>8}  {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', default='flask,asgi', help="Any of flask, gunicorn, asgi")
+    parser.add_argument('--concurrency', default='10,100,300', help="Concurrent clients per level")
+    parser.add_argument('--turns', type=int, default=3, help="Messages per client conversation")
+    parser.add_argument('--endpoint', default='/chat', choices=['/chat', '/chat/stream'])
+    parser.add_argument('--first-token', type=float, default=1.0, help="Fake model seconds to first token")
+    parser.add_argument('--token', type=float, default=0.02, help="Fake model seconds per further token")
+    parser.add_argument('--words', type=int, default=60, help="Fake model tokens per reply")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Seconds before a turn fails")
+    parser.add_argument('--flask-threads', type=int, default=32, help="Thread pool size of the gunicorn server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+    args.concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+
+    results = {}
+    for kind in args.servers.split(','):
+        print(f"Starting {kind} server...")
+        server = start_server(kind, args)
+        try:
+            results[kind] = []
+            for concurrency in args.concurrency_levels:
+                print(f"  {concurrency} clients...")
+                results[kind].append(asyncio.run(run_level(args, server.pid, concurrency)))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print_report(results, args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'endpoint': args.endpoint, 'turns': args.turns, 'results': results}, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+# benchmarks/fake_services.py
+"""
+Local stand-ins for BigQuery and Vertex AI, and a launcher for app.py on top
+of them.
+
+- FakeDataService returns synthetic IRR, markdown and store-summary data
+  after a set latency, in the shapes app.py expects from DataService
+- ScriptedChatModel is a LangChain chat model that answers the ReAct agent
+  with scripted tool calls and answers after a set latency
+- FakeRetriever stands in for Vertex AI Search
+
+Running this module starts the Shiny app with all of them patched in, so it
+needs the app's Python dependencies but no cloud access or credentials.
+benchmarks/load_test.py starts it this way and drives sessions against it.
+
+Usage:
+    python benchmarks/fake_services.py --port 8765 --data-latency 0.2 --llm-latency 0.8
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+from typing import Any, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+STORES = list(range(1, 51))
+DEPARTMENTS = {
+    1: 'CANDY & TOBACCO', 2: 'HEALTH & BEAUTY', 5: 'ELECTRONICS', 7: 'TOYS', 13: 'HOUSEHOLD CHEMICALS',
+    40: 'PHARMACY', 46: 'COSMETICS', 60: 'FROZEN', 90: 'DAIRY', 94: 'PRODUCE',
+}
+MD_DESCRIPTIONS = ['CLEARANCE', 'DAMAGED', 'PRICE CHANGE', 'SEASONAL', 'RECALL']
+MONTHS = 13
+
+
+class FakeDataService:
+    """Synthetic DataService with a fixed latency per call."""
+
+    def __init__(self, latency: float = 0.2, seed: int = 7):
+        import numpy as np
+        import pandas as pd
+
+        self.latency = latency
+        rng = np.random.default_rng(seed)
+
+        today = pd.Timestamp.today().normalize().replace(day=1)
+        months = [today - pd.DateOffset(months=offset) for offset in range(MONTHS - 1, -1, -1)]
+        rows = []
+        for store in STORES:
+            for month in months:
+                for dept, desc in DEPARTMENTS.items():
+                    book = rng.uniform(50_000, 2_000_000)
+                    rows.append({
+                        'Store_Nbr': store, 'City_State': f"City {store}, AR",
+                        'Dept_Nbr': dept, 'DEPT_DESC': desc,
+                        'Calendar_Year': month.year, 'Calendar_Month': month.month,
+                        'Purchases': rng.uniform(10_000, 500_000), 'Markdowns': rng.uniform(500, 50_000),
+                        'Sales': rng.uniform(20_000, 900_000), 'Book': book,
+                        'SKU': book * rng.uniform(0.95, 1.02),
+                    })
+        self.irr = pd.DataFrame(rows)
+        self.irr['Book_vs_SKU'] = self.irr['Book'] - self.irr['SKU']
+        self.current_month = (months[-1].year, months[-1].month)
+
+        n = 200_000
+        prev_retail = rng.uniform(1, 200, n).round(2)
+        new_retail = (prev_retail * rng.uniform(0.3, 0.95, n)).round(2)
+        qty = rng.integers(1, 40, n).astype(float)
+        dates = today - pd.to_timedelta(rng.integers(0, 390, n), unit='D')
+        self.markdowns = pd.DataFrame({
+            'Store_Nbr': rng.choice(STORES, n), 'Dept_Nbr': rng.choice(list(DEPARTMENTS), n),
+            'item_nbr': rng.integers(100_000, 999_999_999, n), 'Description': 'SYNTHETIC ITEM',
+            'MD_Desc': rng.choice(MD_DESCRIPTIONS, n), 'CID': rng.integers(1_000, 99_999, n).astype(float),
+            'MUMD_DT': dates, 'prev_retail': prev_retail, 'new_retail': new_retail, 'MD_QTY': qty,
+            'MUMD_AMT': ((new_retail - prev_retail) * qty).round(2),
+            'Markdown_Percent': ((1 - new_retail / prev_retail) * 100).round(1),
+            'Calendar_Year': dates.year, 'Calendar_Month': dates.month,
+        })
+
+    def _wait(self):
+        time.sleep(self.latency)
+
+    def get_irr_data(self, store_nbr=1, dept_nbr=None, current_month_only=False):
+        self._wait()
+        df = self.irr[self.irr['Store_Nbr'] == store_nbr]
+        if dept_nbr is not None:
+            df = df[df['Dept_Nbr'] == dept_nbr]
+        if current_month_only:
+            year, month = self.current_month
+            df = df[(df['Calendar_Year'] == year) & (df['Calendar_Month'] == month)]
+        return df.reset_index(drop=True)
+
+    def get_markdowns_data(self, store_nbr=None, dept_nbr=None, item_nbr=None, cid=None, md_desc=None,
+                           sort_column='MUMD_AMT', sort_order='ASC', limit_rows=True):
+        self._wait()
+        df = self.markdowns
+        for column, value in (('Store_Nbr', store_nbr), ('Dept_Nbr', dept_nbr), ('item_nbr', item_nbr),
+                              ('CID', cid), ('MD_Desc', md_desc)):
+            if value is not None:
+                df = df[df[column] == (value if column == 'MD_Desc' else float(value))]
+        df = df.sort_values(sort_column or 'MUMD_AMT', ascending=(sort_order or 'ASC').upper() == 'ASC')
+        if limit_rows:
+            df = df.head(1000 if limit_rows is True else int(limit_rows))
+        return df.reset_index(drop=True)
+
+    def get_store_list(self, all_stores=True):
+        self._wait()
+        return [{'value': store, 'label': f"{store} - City {store}, AR"} for store in STORES]
+
+    def get_department_list(self, store_nbr=1):
+        self._wait()
+        return [{'value': dept, 'label': f"{dept} - {desc}"} for dept, desc in DEPARTMENTS.items()]
+
+    def get_markdown_filter_options(self):
+        self._wait()
+        return {'md_desc': list(MD_DESCRIPTIONS)}
+
+    def get_store_summary(self, store_nbr):
+        self._wait()
+        lines = ['Key Findings:']
+        for dept, desc in list(DEPARTMENTS.items())[:4]:
+            lines.append(f"  * Department {dept}:")
+            lines.append(f"    * {desc} markdowns are up {store_nbr % 40 + 5}% versus last year")
+            lines.append("    * Book vs SKU variance widened over the last **3** months")
+        lines.append('Recommended Actions:')
+        lines.append('  * Review clearance markdowns with the department managers')
+        return '\n'.join(lines)
+
+    def aggregate_by_month(self, df, measures):
+        import pandas as pd
+        monthly = (df.groupby(['Calendar_Year', 'Calendar_Month'], as_index=False, observed=True)[measures]
+                   .sum()
+                   .sort_values(['Calendar_Year', 'Calendar_Month']))
+        monthly['Month_Year'] = pd.to_datetime(
+            dict(year=monthly['Calendar_Year'], month=monthly['Calendar_Month'], day=1)).dt.strftime('%b %Y')
+        return monthly.reset_index(drop=True)
+
+
+def _scripted_chat_model_class():
+    # Built lazily so importing this module doesn't need langchain
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class ScriptedChatModel(BaseChatModel):
+        """
+        Answers the conversational ReAct agent without a model.
+
+        Questions mentioning a report get a recommend_report call first,
+        "why"/"what"/"how" questions a retrieve_knowledge call; once an
+        Observation is in the prompt the model gives a final answer.
+        """
+        latency: float = 0.8
+        model_name: str = 'scripted'
+
+        @property
+        def _llm_type(self) -> str:
+            return 'scripted-chat'
+
+        def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+            time.sleep(self.latency * random.uniform(0.7, 1.3))
+            prompt = '\n'.join(str(message.content) for message in messages)
+            turn = prompt.rsplit('New input:', 1)[-1]
+            question = turn.split('\n', 1)[0].strip()
+
+            if 'Observation:' in turn:
+                text = ("Thought: Do I need to use a tool? No\n"
+                        f"AI: Based on what I found, here is a summary for \"{question}\". "
+                        "Book vs SKU variance is the best early signal of shrink; review markdowns "
+                        "and receiving for the departments with the largest gaps.")
+            elif 'report' in question.lower():
+                text = ("Thought: Do I need to use a tool? Yes\n"
+                        "Action: recommend_report\n"
+                        f"Action Input: {question}")
+            elif question.lower().startswith(('why', 'what', 'how')):
+                text = ("Thought: Do I need to use a tool? Yes\n"
+                        "Action: retrieve_knowledge\n"
+                        f"Action Input: {question}")
+            else:
+                text = "Thought: Do I need to use a tool? No\nAI: Happy to help with your IRR questions."
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    return ScriptedChatModel
+
+
+class FakeRetriever:
+    """Vertex AI Search stand-in returning canned documents."""
+
+    def __init__(self, latency: float = 0.3):
+        self.latency = latency
+
+    def invoke(self, query, **kwargs):
+        from langchain_core.documents import Document
+        time.sleep(self.latency)
+        return [
+            Document(page_content="Book vs SKU variance is the best predictor of shrink.",
+                     metadata={'source': 'gs://kb/book_vs_sku.md'}),
+            Document(page_content="High markdowns often come from damaged or clearance goods.",
+                     metadata={'source': 'gs://kb/markup_markdown_automation.md'}),
+        ]
+
+
+def install_fakes(data_latency: float, llm_latency: float, search_latency: float):
+    """Patch the app's cloud dependencies with local stand-ins."""
+    # Placeholder credentials so the app's file checks pass; nothing reads them
+    credentials = Path(tempfile.mkdtemp()) / 'key.json'
+    credentials.write_text('{}')
+    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = str(credentials)
+    os.environ['PROMPT_CACHE_BACKEND'] = 'off'
+    os.environ.setdefault('DATA_BACKEND', 'bigquery')
+    for name in ('STORE_INSIGHTS_TABLE', 'IRR_TABLE', 'IRR_MONTHLY_ROLLUP_TABLE', 'MARKDOWNS_TABLE'):
+        os.environ.pop(name, None)
+
+    data_service = FakeDataService(latency=data_latency)
+    data_service_module = types.ModuleType('data_service')
+    data_service_module.DataService = lambda: data_service
+    sys.modules['data_service'] = data_service_module
+
+    # The Custom Reports server isn't part of this tree
+    custom_reports_module = types.ModuleType('src.server_custom_reports')
+    custom_reports_module.setup_custom_reports_server = lambda input, output, session, data_service: None
+    sys.modules.setdefault('src.server_custom_reports', custom_reports_module)
+
+    from clients import registry
+
+    def load_report_recommender():
+        # By path, so src/__init__ (the Flask app) isn't imported
+        spec = importlib.util.spec_from_file_location('report_recommender', REPO_ROOT / 'src' / 'report_recommender.py')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.ReportRecommender()
+
+    registry.register('data_service', lambda: data_service)
+    registry.register('search_retriever', lambda: FakeRetriever(latency=search_latency))
+    registry.register('report_recommender', load_report_recommender)
+
+    import agents
+    scripted_model = _scripted_chat_model_class()
+    agents.ResilientChatVertexAI = lambda model_name, **kwargs: scripted_model(latency=llm_latency, model_name=model_name)
+    agents.create_grounded_model = lambda: None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--data-latency', type=float, default=0.2, help="Seconds per DataService call")
+    parser.add_argument('--llm-latency', type=float, default=0.8, help="Seconds per LLM call")
+    parser.add_argument('--search-latency', type=float, default=0.3, help="Seconds per knowledge search")
+    args = parser.parse_args()
+
+    install_fakes(args.data_latency, args.llm_latency, args.search_latency)
+
+    import uvicorn
+    from app import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
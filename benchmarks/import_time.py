@@ -0,0 +1,131 @@
+# benchmarks/import_time.py
+"""
+Cold-start import benchmark for the Shiny app.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter and
+attributes each module's own (self) import time to its top-level package, so
+`pandas` is charged for pandas.core even when `app` triggered it. Reports the
+slowest packages. Use --baseline to compare against a previous run, per
+package as well as in total, and --max-ms to fail on regressions.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --save baseline.json
+    python benchmarks/import_time.py --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that must not be imported at start-up anymore
+DEFERRED_MODULES = [
+    'langchain_google_vertexai',
+    'vertexai',
+    'langchain.agents',
+    'agents',
+    'tools',
+    'plotly',
+    'shinywidgets',
+    'data_service',
+]
+
+
+def measure(module: str = 'app', runs: int = 3):
+    """
+    Import `module` in `runs` fresh interpreters and keep the fastest run.
+
+    Returns:
+        Tuple of (total_ms, per-package self ms, set of imported modules)
+    """
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1'),
+        )
+        if proc.returncode != 0:
+            print(proc.stderr[-2000:], file=sys.stderr)
+            raise SystemExit(f"Importing {module} failed")
+
+        total_us = 0
+        packages = defaultdict(int)
+        imported = set()
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, _, name = line[len('import time:'):].split('|')
+            module_name = name.strip()
+            imported.add(module_name)
+            # Self time already excludes the module's nested imports, so every
+            # microsecond is counted once, against the package that spent it
+            total_us += int(self_us)
+            packages[module_name.split('.')[0]] += int(self_us)
+
+        if best is None or total_us < best[0]:
+            best = (total_us, packages, imported)
+
+    total_us, packages, imported = best
+    return total_us / 1000, {k: v / 1000 for k, v in packages.items()}, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app', help='Module to import (default: app)')
+    parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters to try; fastest wins')
+    parser.add_argument('--top', type=int, default=15, help='Number of packages to list')
+    parser.add_argument('--baseline', help='JSON file from a previous --save to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown vs baseline (fraction)')
+    parser.add_argument('--max-ms', type=float, help='Fail if total import time exceeds this')
+    parser.add_argument('--save', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    total_ms, packages, imported = measure(args.module, args.runs)
+
+    print(f"Cold import of '{args.module}': {total_ms:.1f} ms")
+    print(f"\n{'package':<40}{'self ms':>15}")
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<40}{ms:>15.1f}")
+
+    failed = False
+    eager = [name for name in DEFERRED_MODULES if name in imported]
+    if eager:
+        print(f"\nFAIL: deferred modules imported at start-up: {', '.join(eager)}")
+        failed = True
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        limit = baseline['total_ms'] * (1 + args.tolerance)
+        print(f"\nBaseline: {baseline['total_ms']:.1f} ms (limit {limit:.1f} ms)")
+        deltas = {name: ms - baseline['packages'].get(name, 0.0)
+                  for name, ms in packages.items()}
+        print(f"{'package':<40}{'baseline ms':>15}{'now ms':>10}{'delta ms':>10}")
+        for name, delta in sorted(deltas.items(), key=lambda item: -item[1])[:args.top]:
+            if delta <= 0:
+                break
+            print(f"{name:<40}{baseline['packages'].get(name, 0.0):>15.1f}{packages[name]:>10.1f}{delta:>+10.1f}")
+        if total_ms > limit:
+            print("FAIL: import time regressed beyond tolerance")
+            failed = True
+
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"\nFAIL: import time {total_ms:.1f} ms exceeds budget of {args.max_ms:.1f} ms")
+        failed = True
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({'total_ms': total_ms, 'packages': packages}, indent=2))
+        print(f"\nSaved results to {args.save}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/insights_parser_bench.py
+"""
+Benchmark for the store insights parser.
+
+Times parse_insights_to_html against the previous line-by-line parser on
+large synthetic summaries. Correctness (balanced tags, no lost text) is
+covered by the fuzz tests in tests/test_store_insights.py.
+
+Usage:
+    python benchmarks/insights_parser_bench.py --lines 20000 --runs 20
+    python benchmarks/insights_parser_bench.py --profile
+"""
+import argparse
+import cProfile
+import pstats
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from store_insights import parse_insights_to_html  # noqa: E402
+
+
+def legacy_parse_insights_to_html(text):
+    """Baseline: the parser store_insights() used before."""
+    if not text or not text.strip():
+        return "<p>No insights available.</p>"
+    lines = text.split('\n')
+    out = []
+    current_section = None
+    current_dept = None
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+        indent_level = len(line) - len(line.lstrip(' '))
+        content = stripped.lstrip('* ').strip()
+        if not content:
+            continue
+        if indent_level == 0 and content.endswith(':'):
+            if current_dept:
+                out.append('</ul>')
+                current_dept = None
+            if current_section:
+                out.append('</ul>')
+            out.append(f'<h3>{content}</h3>')
+            out.append('<ul class="section-list">')
+            current_section = True
+        elif indent_level <= 2 and content.endswith(':') and ('Department' in content or 'Anomalies' in content):
+            if current_dept:
+                out.append('</ul>')
+            out.append(f'<li class="dept-item"><strong>{content}</strong>')
+            out.append('<ul class="detail-list">')
+            current_dept = True
+        else:
+            out.append(f'<li class="detail-item">{content}</li>')
+    if current_dept:
+        out.append('</ul></li>')
+    if current_section:
+        out.append('</ul>')
+    return '\n'.join(out)
+
+
+def synthetic_summary(n_lines: int, rng: random.Random) -> str:
+    """A realistic-looking summary: sections, departments, detail bullets."""
+    sections = ['Key Findings:', 'Anomalies:', 'Recommended Actions:', 'Watch List:']
+    lines = []
+    while len(lines) < n_lines:
+        lines.append(rng.choice(sections))
+        for _ in range(rng.randint(2, 6)):
+            lines.append(f"  * Department {rng.randint(1, 99)}:")
+            for _ in range(rng.randint(2, 8)):
+                lines.append(f"    * Markdowns up {rng.randint(1, 300)}% vs LY on **{rng.randint(10**5, 10**9)}**"
+                             f" (Book vs SKU ${rng.uniform(-5000, 5000):,.2f})")
+    return '\n'.join(lines[:n_lines])
+
+
+def time_parser(parser, text: str, runs: int):
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        parser(text)
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return timings
+
+
+def time_parsers(parsers: dict, text: str, runs: int):
+    """Time each parser once per round, so drift in machine load hits all of them alike."""
+    timings = {name: [] for name in parsers}
+    for _ in range(runs):
+        for name, parser in parsers.items():
+            timings[name].extend(time_parser(parser, text, 1))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=20000, help="Lines per synthetic summary")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--profile', action='store_true', help="Also print a cProfile of the current parser")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    text = synthetic_summary(args.lines, rng)
+    print(f"Synthetic summary: {args.lines} lines, {len(text) / 1024:.0f} KiB")
+
+    print(f"\n{'parser':<10}{'min ms':>10}{'p50 ms':>10}{'mean ms':>10}")
+    results = time_parsers({
+        'legacy': legacy_parse_insights_to_html,
+        'current': parse_insights_to_html,
+    }, text, args.runs)
+    for name, values in results.items():
+        print(f"{name:<10}{min(values):>10.2f}{statistics.median(values):>10.2f}{statistics.mean(values):>10.2f}")
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(time_parser, parse_insights_to_html, text, args.runs)
+        print()
+        pstats.Stats(profiler).sort_stats('tottime').print_stats(10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test for the Shiny app against local stand-ins.
+
+Starts app.py with the fake DataService, LLM and retriever from
+benchmarks/fake_services.py, then opens N simulated browser sessions over
+Shiny's websocket protocol. Each session loads the IRR dashboard, changes
+store and department filters, switches to the Markdowns tab, filters
+markdowns, exports CSV and Excel, and asks the chat agent a question.
+
+An interaction is timed from sending the input change until the server
+flushes the outputs for that change (the `values` message that follows
+busy/idle); exports are timed until the download body is read. Reports p50/p95/p99 per interaction
+and the server's resident memory per session.
+
+Usage:
+    python benchmarks/load_test.py --sessions 20 --iterations 3
+    python benchmarks/load_test.py --sessions 50 --ramp 10 --llm-latency 1.5 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'benchmarks'))
+
+from fake_services import DEPARTMENTS, MD_DESCRIPTIONS, STORES  # noqa: E402
+
+# Outputs a real browser would have visible on each tab
+IRR_OUTPUTS = ['irr_table', 'store_insights', 'book_sku_chart', 'purchases_chart', 'markdowns_chart']
+MARKDOWN_OUTPUTS = ['markdowns_table', 'markdowns_tab_chart']
+CHAT_OUTPUTS = ['chat_history']
+
+DOWNLOADS = {
+    'export_irr_csv': 'download_csv',
+    'export_irr_excel': 'download_excel',
+    'export_markdowns_csv': 'download_markdowns_csv',
+    'export_markdowns_excel': 'download_markdowns_excel',
+}
+
+CHAT_QUESTIONS = [
+    "Why is Book vs SKU a good predictor of shrink?",
+    "What should I do about high clearance markdowns?",
+    "Show me a report of markdowns for store 12",
+    "How do I read the purchases chart?",
+    "Thanks!",
+]
+
+
+def initial_inputs(store: int) -> Dict:
+    """Input values a freshly loaded page sends with the init message."""
+    inputs = {
+        'dashboard_tabs': 'IRR Dashboard',
+        'store_filter': str(store),
+        'dept_filter': '',
+        'md_store_filter': '',
+        'md_dept_filter': '',
+        'item_nbr_filter': '',
+        'cid_filter': '',
+        'md_desc_filter': '',
+        'md_sort_column': 'MUMD_AMT',
+        'md_sort_order': 'ASC',
+        'md_limit_rows': True,
+        'user_message': '',
+        'send:shiny.action': 0,
+    }
+    for name in IRR_OUTPUTS + MARKDOWN_OUTPUTS + CHAT_OUTPUTS:
+        inputs[f".clientdata_output_{name}_hidden"] = False
+    return inputs
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident set size of a process (Linux)."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class SimulatedSession:
+    """One browser tab talking to the app over the Shiny websocket."""
+
+    def __init__(self, base_url: str, timings: Dict[str, List[float]], errors: Dict[str, int],
+                 timeout: float):
+        self.base_url = base_url
+        self.timings = timings
+        self.errors = errors
+        self.timeout = timeout
+        self.session_id: Optional[str] = None
+        self.send_count = 0
+        self._ws = None
+
+    async def _until_idle(self, name: str, start_time: float):
+        """
+        Read messages until the server has flushed the outputs for a change.
+
+        Shiny sends `busy` while invalidated outputs recompute, `idle` when
+        they are done, and then one flush message (`values`, `inputMessages`,
+        `errors`) with the results. A change that invalidates nothing gets
+        only the flush, without busy/idle.
+        """
+        busy = False
+        deadline = start_time + self.timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.errors[f"{name}: timeout"] += 1
+                return
+            message = json.loads(await asyncio.wait_for(self._ws.recv(), remaining))
+            if 'config' in message:
+                self.session_id = message['config'].get('sessionId')
+            if message.get('errors'):
+                for output in message['errors']:
+                    self.errors[f"{name}: {output}"] += 1
+            if message.get('busy') == 'busy':
+                busy = True
+            elif message.get('busy') == 'idle':
+                busy = False
+            elif 'values' in message and not busy:
+                self.timings[name].append(time.perf_counter() - start_time)
+                return
+
+    async def _drain(self, quiet: float = 0.05):
+        """Discard messages left over from the last change (e.g. a second, empty flush)."""
+        while True:
+            try:
+                message = json.loads(await asyncio.wait_for(self._ws.recv(), quiet))
+            except asyncio.TimeoutError:
+                return
+            if 'config' in message:
+                self.session_id = message['config'].get('sessionId')
+
+    async def connect(self, store: int):
+        import websockets
+
+        ws_url = self.base_url.replace('http', 'ws', 1) + '/websocket/'
+        start_time = time.perf_counter()
+        self._ws = await websockets.connect(ws_url, max_size=None)
+        await self._ws.send(json.dumps({'method': 'init', 'data': initial_inputs(store)}))
+        await self._until_idle('initial_load', start_time)
+
+    async def update(self, name: str, **values):
+        await self._drain()
+        start_time = time.perf_counter()
+        await self._ws.send(json.dumps({'method': 'update', 'data': values}))
+        await self._until_idle(name, start_time)
+
+    async def download(self, name: str, output: str):
+        url = f"{self.base_url}/session/{self.session_id}/download/{output}?w="
+
+        def fetch():
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                return len(response.read())
+
+        start_time = time.perf_counter()
+        try:
+            await asyncio.to_thread(fetch)
+        except Exception:
+            self.errors[f"{name}: download failed"] += 1
+            return
+        self.timings[name].append(time.perf_counter() - start_time)
+
+    async def chat(self, question: str):
+        self.send_count += 1
+        await self.update('chat', user_message=question, **{'send:shiny.action': self.send_count})
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+
+async def run_session(session: SimulatedSession, iterations: int, think_time: float, rng: random.Random):
+    async def think():
+        await asyncio.sleep(rng.uniform(0, think_time))
+
+    await session.connect(rng.choice(STORES))
+    for _ in range(iterations):
+        await think()
+        await session.update('irr_store_filter', store_filter=str(rng.choice(STORES)))
+        await think()
+        await session.update('irr_dept_filter', dept_filter=str(rng.choice(list(DEPARTMENTS))))
+        await think()
+        await session.download('export_irr_csv', DOWNLOADS['export_irr_csv'])
+        await session.download('export_irr_excel', DOWNLOADS['export_irr_excel'])
+        await think()
+        await session.update('tab_switch', dashboard_tabs='Markdowns')
+        await think()
+        await session.update('md_filter', md_store_filter=str(rng.choice(STORES)),
+                             md_desc_filter=rng.choice(MD_DESCRIPTIONS))
+        await think()
+        await session.download('export_markdowns_csv', DOWNLOADS['export_markdowns_csv'])
+        await session.download('export_markdowns_excel', DOWNLOADS['export_markdowns_excel'])
+        await think()
+        await session.chat(rng.choice(CHAT_QUESTIONS))
+        await think()
+        await session.update('tab_switch', dashboard_tabs='IRR Dashboard')
+
+
+def start_server(args) -> subprocess.Popen:
+    command = [
+        sys.executable, str(REPO_ROOT / 'benchmarks' / 'fake_services.py'),
+        '--host', args.host, '--port', str(args.port),
+        '--data-latency', str(args.data_latency),
+        '--llm-latency', str(args.llm_latency),
+        '--search-latency', str(args.search_latency),
+    ]
+    server = subprocess.Popen(command, cwd=REPO_ROOT, env=os.environ.copy())
+    base_url = f"http://{args.host}:{args.port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"App exited during start-up with code {server.returncode}")
+        try:
+            urllib.request.urlopen(base_url, timeout=2).read()
+            return server
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("App did not start within 120s")
+
+
+async def run_load(args, server_pid: int):
+    base_url = f"http://{args.host}:{args.port}"
+    timings: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    rng = random.Random(args.seed)
+
+    # One throwaway session first, so lazy imports and caches don't count as per-session memory
+    warmup = SimulatedSession(base_url, defaultdict(list), defaultdict(int), args.timeout)
+    await run_session(warmup, 1, 0, random.Random(args.seed))
+    await warmup.close()
+    baseline_rss = rss_bytes(server_pid)
+
+    sessions = [SimulatedSession(base_url, timings, errors, args.timeout) for _ in range(args.sessions)]
+
+    async def start(index: int, session: SimulatedSession):
+        await asyncio.sleep(args.ramp * index / max(1, args.sessions))
+        try:
+            await run_session(session, args.iterations, args.think_time, random.Random(rng.random()))
+        except Exception as e:
+            errors[f"session: {type(e).__name__}"] += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(start(index, session) for index, session in enumerate(sessions)))
+    elapsed = time.perf_counter() - start_time
+
+    # Measured with every session still open, so their state is resident
+    loaded_rss = rss_bytes(server_pid)
+    for session in sessions:
+        await session.close()
+
+    return {
+        'sessions': args.sessions,
+        'iterations': args.iterations,
+        'elapsed_seconds': round(elapsed, 2),
+        'rss_baseline_mib': round(baseline_rss / 2**20, 1),
+        'rss_loaded_mib': round(loaded_rss / 2**20, 1),
+        'rss_per_session_mib': round((loaded_rss - baseline_rss) / 2**20 / args.sessions, 2),
+        'interactions': {
+            name: {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 50) * 1000, 1),
+                'p95_ms': round(percentile(values, 95) * 1000, 1),
+                'p99_ms': round(percentile(values, 99) * 1000, 1),
+                'mean_ms': round(statistics.mean(values) * 1000, 1),
+            }
+            for name, values in sorted(timings.items())
+        },
+        'errors': dict(errors),
+    }
+
+
+def print_report(results: Dict):
+    print(f"\n{results['sessions']} sessions x {results['iterations']} iterations "
+          f"in {results['elapsed_seconds']}s")
+    print(f"{'interaction':<24} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, row in results['interactions'].items():
+        print(f"{name:<24} {row['count']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    print(f"\nServer RSS: {results['rss_baseline_mib']} MiB after warm-up, "
+          f"{results['rss_loaded_mib']} MiB under load "
+          f"({results['rss_per_session_mib']} MiB per session)")
+    if results['errors']:
+        print("\nErrors:")
+        for name, count in sorted(results['errors'].items()):
+            print(f"  {name}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=20, help="Concurrent simulated sessions")
+    parser.add_argument('--iterations', type=int, default=3, help="Script repetitions per session")
+    parser.add_argument('--ramp', type=float, default=5.0, help="Seconds over which sessions start")
+    parser.add_argument('--think-time', type=float, default=1.0, help="Max seconds between interactions")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Seconds before an interaction fails")
+    parser.add_argument('--data-latency', type=float, default=0.2, help="Seconds per DataService call")
+    parser.add_argument('--llm-latency', type=float, default=0.8, help="Seconds per LLM call")
+    parser.add_argument('--search-latency', type=float, default=0.3, help="Seconds per knowledge search")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    server = start_server(args)
+    try:
+        results = asyncio.run(run_load(args, server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# benchmarks/report_recommender_bench.py
+"""
+Benchmark for the inverted-index ReportRecommender.
+
+Builds a synthetic catalog of thousands of reports and queries, then compares
+the indexed recommender against a linear keyword scan over every report. Also
+checks both agree on the top recommendation.
+
+Then runs labeled questions through analyze_query() on the real catalog:
+questions that should get a report, and negatives that share one keyword
+with a report but must not get one (a recommendation also starts a
+prefetch).
+
+Usage:
+    python benchmarks/report_recommender_bench.py --reports 5000 --queries 2000
+"""
+import argparse
+import importlib.util
+import random
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+DETAIL = 'Markdown Transactions - Detail'
+SUMMARY = 'Markdown Transactions - Summary'
+
+# (question, expected report or None)
+LABELED_QUERIES = [
+    ("Show me markdown details for store 12", DETAIL),
+    ("Show me a report of markdowns for store 12", DETAIL),
+    ("List the markdown transactions for item 123456 in store 12", DETAIL),
+    ("Which items had price changes in dept 7?", DETAIL),
+    ("What should I do about high clearance markdowns?", DETAIL),
+    ("Give me a markdown summary by department for store 5", SUMMARY),
+    ("markdown totals for store 3", SUMMARY),
+    ("How much did we mark down in store 40?", SUMMARY),
+    # One keyword only, or only filler keywords
+    ("Why are high value items disappearing in store 100?", None),
+    ("What is the detail of the IRR process?", None),
+    ("Show me the list of stores", None),
+    ("What is shrink?", None),
+    ("What is the IRR report?", None),
+    ("How do I read the purchases chart?", None),
+]
+
+
+def load_recommender_module():
+    # Load the module by path so src/__init__ (which imports the Flask app)
+    # isn't pulled into the benchmark
+    spec = importlib.util.spec_from_file_location(
+        'report_recommender', REPO_ROOT / 'src' / 'report_recommender.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_catalog(n_reports: int, vocab_size: int, rng: random.Random):
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    reports = []
+    for i in range(n_reports):
+        keywords = {word: round(rng.uniform(0.2, 1.5), 2) for word in rng.sample(vocab, rng.randint(5, 15))}
+        # A few phrase keywords per report
+        for _ in range(2):
+            keywords[f"{rng.choice(vocab)} {rng.choice(vocab)}"] = round(rng.uniform(0.5, 1.5), 2)
+        reports.append({
+            'report_name': f"Synthetic Report {i}",
+            'keywords': keywords,
+            'use_cases': [f"Use case for report {i}"],
+        })
+    return reports, vocab
+
+
+def synthetic_queries(n_queries: int, vocab, rng: random.Random):
+    fillers = ['show', 'me', 'the', 'for', 'please', 'what', 'are', 'in', 'last', 'week']
+    queries = []
+    for _ in range(n_queries):
+        words = rng.sample(vocab, 3) + rng.sample(fillers, 4)
+        rng.shuffle(words)
+        words += [f"store {rng.randint(1, 5000)}", f"dept {rng.randint(1, 99)}", "2025-01-01"]
+        queries.append(' '.join(words))
+    return queries
+
+
+def normalize_catalog(module, reports):
+    """Pre-tokenize keywords so the linear baseline only pays for the scan."""
+    return [[(' '.join(module.tokenize(keyword)), weight) for keyword, weight in report['keywords'].items()]
+            for report in reports]
+
+
+def linear_scan(module, normalized, query):
+    """Baseline: score every report by scanning all its keywords."""
+    terms = module._terms(module.tokenize(query))
+    best_id, best_score = None, 0.0
+    for report_id, keywords in enumerate(normalized):
+        score = 0.0
+        for keyword, weight in keywords:
+            if keyword in terms:
+                score += weight
+        if score > best_score:
+            best_id, best_score = report_id, score
+    return best_id, best_score
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--vocab', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    module = load_recommender_module()
+    reports, vocab = synthetic_catalog(args.reports, args.vocab, rng)
+    queries = synthetic_queries(args.queries, vocab, rng)
+
+    start_time = time.perf_counter()
+    recommender = module.ReportRecommender(reports)
+    build_ms = (time.perf_counter() - start_time) * 1000
+    print(f"Catalog: {args.reports} reports, {len(recommender.index)} indexed terms, built in {build_ms:.1f} ms")
+
+    normalized = normalize_catalog(module, reports)
+    timings = defaultdict(list)
+    mismatches = 0
+    for query in queries:
+        start_time = time.perf_counter()
+        result = recommender.recommend(query, top_k=5)
+        timings['indexed'].append((time.perf_counter() - start_time) * 1000)
+
+        start_time = time.perf_counter()
+        best_id, best_score = linear_scan(module, normalized, query)
+        timings['linear'].append((time.perf_counter() - start_time) * 1000)
+
+        indexed_score = result[0]['score'] if result else 0.0
+        if abs(indexed_score - best_score) > 1e-9:
+            mismatches += 1
+
+    print(f"\n{'matcher':<10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for name, values in timings.items():
+        print(f"{name:<10}{percentile(values, 50):>10.3f}{percentile(values, 95):>10.3f}{statistics.mean(values):>10.3f}")
+
+    speedup = statistics.mean(timings['linear']) / statistics.mean(timings['indexed'])
+    print(f"\nSpeedup (mean): {speedup:.1f}x")
+    print(f"Top-1 score mismatches vs linear scan: {mismatches}")
+
+    catalog_recommender = module.ReportRecommender()
+    wrong = []
+    for question, expected in LABELED_QUERIES:
+        recommendation = catalog_recommender.analyze_query(question)
+        got = recommendation['report_name'] if recommendation else None
+        if got != expected:
+            wrong.append((question, expected, got))
+    print(f"\nLabeled questions: {len(LABELED_QUERIES) - len(wrong)}/{len(LABELED_QUERIES)} correct")
+    for question, expected, got in wrong:
+        print(f"  {question!r}: expected {expected}, got {got}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+# benchmarks/retrieval_bench.py
+"""
+Retrieval quality and latency benchmark for the shrink knowledge base.
+
+Indexes knowledge_base/markdown/shrink_docs once per retriever configuration
+(splitter x chunk size x chunk overlap) and runs the labeled questions in
+benchmarks/retrieval_questions.json through KnowledgeBaseService.search.
+For each configuration it reports:
+
+- recall@k: share of questions with a chunk from a labeled source in the top k
+- MRR@10: mean reciprocal rank of the first chunk from a labeled source
+- both again for the paraphrased questions alone (marked "paraphrased" in the
+  questions file), which avoid the documents' wording; the lexical embedder
+  finds the others almost every time, so these are what tell configurations
+  apart
+- p50/p95 search latency
+- chunk count, index size on disk and build time
+
+Embeddings come from a deterministic feature-hashing embedder instead of
+Vertex AI, so runs are offline and repeatable and only the chunking and
+search code vary between configurations. Absolute scores are lower than with
+text-embedding-005; use it to compare configurations against each other.
+
+Usage:
+    python benchmarks/retrieval_bench.py
+    python benchmarks/retrieval_bench.py --splitters recursive,markdown --chunk-sizes 500,1000,1500 --overlaps 100,200
+    python benchmarks/retrieval_bench.py --k 1,3,5 --repeats 5 --json retrieval.json
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import math
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+DOCS_DIR = REPO_ROOT / 'knowledge_base' / 'markdown' / 'shrink_docs'
+QUESTIONS_FILE = Path(__file__).resolve().parent / 'retrieval_questions.json'
+MRR_DEPTH = 10
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it my of on or should the to what when "
+    "where which why with you your this that".split()
+)
+
+
+def _hashing_embeddings_class():
+    # Built lazily so --help works without langchain installed
+    from langchain_core.embeddings import Embeddings
+
+    class HashingEmbeddings(Embeddings):
+        """
+        Deterministic bag-of-words embedder (unigrams + bigrams, feature hashing).
+
+        Vectors are L2-normalized with sublinear term frequency, so cosine
+        similarity behaves like a TF-weighted lexical match.
+        """
+
+        def __init__(self, dim: int = 1024):
+            self.dim = dim
+
+        def _embed(self, text: str) -> List[float]:
+            words = [w for w in _TOKEN_PATTERN.findall(text.lower()) if w not in _STOPWORDS]
+            features = Counter(words)
+            features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+            vector = [0.0] * self.dim
+            for feature, count in features.items():
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                index = int.from_bytes(digest[:4], 'little') % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vector[index] += sign * (1 + math.log(count))
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            return [v / norm for v in vector]
+
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            return [self._embed(text) for text in texts]
+
+        def embed_query(self, text: str) -> List[float]:
+            return self._embed(text)
+
+    return HashingEmbeddings
+
+
+def make_splitter(kind: str, chunk_size: int, chunk_overlap: int):
+    """The splitters process_docs.py (recursive) and KnowledgeBaseService (markdown) use."""
+    from langchain.text_splitter import MarkdownTextSplitter, RecursiveCharacterTextSplitter
+
+    if kind == 'recursive':
+        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len)
+    if kind == 'markdown':
+        return MarkdownTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    raise ValueError(f"Unknown splitter: {kind}")
+
+
+def load_documents():
+    from langchain_core.documents import Document
+
+    return [
+        Document(page_content=path.read_text(encoding='utf-8'),
+                 metadata={'source': path.relative_to(DOCS_DIR).as_posix()})
+        for path in sorted(DOCS_DIR.rglob('*.md'))
+    ]
+
+
+def directory_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def score(first_ranks: List, ks: List[int]) -> Dict:
+    """recall@k and MRR from the rank of each question's first relevant chunk (None if missing)."""
+    return {
+        'questions': len(first_ranks),
+        'recall': {f"@{k}": round(sum(first is not None and first <= k for first in first_ranks)
+                                  / len(first_ranks), 3) for k in ks},
+        'mrr': round(statistics.mean(1 / first if first is not None and first <= MRR_DEPTH else 0.0
+                                     for first in first_ranks), 3),
+    }
+
+
+def run_config(documents, questions, embeddings, splitter_kind: str, chunk_size: int, chunk_overlap: int,
+               ks: List[int], repeats: int, min_relevance: float) -> Dict:
+    from langchain_community.vectorstores import Chroma
+    from knowledge_base.service import KnowledgeBaseService
+
+    index_dir = Path(tempfile.mkdtemp(prefix='kb-bench-'))
+    try:
+        start_time = time.perf_counter()
+        chunks = make_splitter(splitter_kind, chunk_size, chunk_overlap).split_documents(documents)
+        store = Chroma.from_documents(
+            documents=chunks,
+            embedding=embeddings,
+            persist_directory=str(index_dir),
+            collection_name=f"bench_{splitter_kind}_{chunk_size}_{chunk_overlap}",
+        )
+        build_seconds = time.perf_counter() - start_time
+
+        # The real search code path, with the offline embedder and index
+        # swapped in for Vertex AI (so __init__ is skipped)
+        service = KnowledgeBaseService.__new__(KnowledgeBaseService)
+        service.embeddings = embeddings
+        service.vector_store = store
+
+        depth = max(max(ks), MRR_DEPTH)
+        service.search(questions[0]['question'], max_results=depth, min_relevance=min_relevance)  # warm-up
+
+        first_ranks = []
+        latencies = []
+        for item in questions:
+            relevant = set(item['sources'])
+            for _ in range(repeats):
+                query_start = time.perf_counter()
+                results = service.search(item['question'], max_results=depth, min_relevance=min_relevance)
+                latencies.append(time.perf_counter() - query_start)
+
+            sources = [result['metadata'].get('source') for result in results]
+            first_ranks.append(next((rank for rank, source in enumerate(sources, 1) if source in relevant), None))
+        paraphrased = [first for item, first in zip(questions, first_ranks) if item.get('paraphrased')]
+
+        return {
+            'splitter': splitter_kind,
+            'chunk_size': chunk_size,
+            'chunk_overlap': chunk_overlap,
+            'chunks': len(chunks),
+            'build_seconds': round(build_seconds, 3),
+            'index_kib': round(directory_bytes(index_dir) / 1024, 1),
+            **{key: value for key, value in score(first_ranks, ks).items() if key != 'questions'},
+            'paraphrased': score(paraphrased, ks) if paraphrased else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        }
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+def print_report(results: List[Dict], ks: List[int], n_questions: int):
+    print(f"\n{n_questions} labeled questions, {len(results)} configurations")
+    recall_headers = ''.join(f"{'R@' + str(k):>7}" for k in ks)
+    print(f"{'splitter':<10}{'size':>6}{'overlap':>8}{'chunks':>8}{recall_headers}{'MRR':>7}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'index KiB':>11}{'build s':>9}")
+    for row in results:
+        recalls = ''.join(f"{row['recall'][f'@{k}']:>7.3f}" for k in ks)
+        print(f"{row['splitter']:<10}{row['chunk_size']:>6}{row['chunk_overlap']:>8}{row['chunks']:>8}{recalls}"
+              f"{row['mrr']:>7.3f}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['index_kib']:>11.1f}"
+              f"{row['build_seconds']:>9.2f}")
+
+    n_paraphrased = results[0]['paraphrased']['questions'] if results and results[0]['paraphrased'] else 0
+    if not n_paraphrased:
+        return
+    print(f"\nParaphrased questions only ({n_paraphrased})")
+    print(f"{'splitter':<10}{'size':>6}{'overlap':>8}{recall_headers}{'MRR':>7}")
+    for row in results:
+        subset = row['paraphrased']
+        recalls = ''.join(f"{subset['recall'][f'@{k}']:>7.3f}" for k in ks)
+        print(f"{row['splitter']:<10}{row['chunk_size']:>6}{row['chunk_overlap']:>8}{recalls}{subset['mrr']:>7.3f}")
+
+
+def main():
+    # rag_config warns on stdout when its DOC_DIRECTORY is missing, which
+    # doesn't matter here; only its chunking defaults are used
+    with contextlib.redirect_stdout(io.StringIO()):
+        import rag_config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--splitters', default='recursive,markdown')
+    parser.add_argument('--chunk-sizes', default=f"500,{rag_config.CHUNK_SIZE},1500")
+    parser.add_argument('--overlaps', default=f"{rag_config.CHUNK_OVERLAP}")
+    parser.add_argument('--k', default='1,3,5', help="Cut-offs for recall@k")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed searches per question")
+    parser.add_argument('--min-relevance', type=float, default=float('-inf'),
+                        help="Passed to search(); by default nothing is filtered, since Chroma's L2 "
+                             "relevance scores can be negative")
+    parser.add_argument('--dim', type=int, default=1024, help="Hashing embedder dimensions")
+    parser.add_argument('--questions', default=str(QUESTIONS_FILE))
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # Chroma's L2 relevance scores fall outside [0, 1], and langchain warns
+    # about it on every search with the full result documents in the message
+    warnings.filterwarnings('ignore', message='Relevance scores must be between 0 and 1', category=UserWarning)
+
+    ks = sorted(int(k) for k in args.k.split(','))
+    questions = json.loads(Path(args.questions).read_text())
+    documents = load_documents()
+    known_sources = {doc.metadata['source'] for doc in documents}
+    unknown = {s for item in questions for s in item['sources']} - known_sources
+    if unknown:
+        parser.error(f"Questions reference sources not in {DOCS_DIR}: {sorted(unknown)}")
+
+    embeddings = _hashing_embeddings_class()(dim=args.dim)
+    configs = itertools.product(
+        args.splitters.split(','),
+        [int(size) for size in args.chunk_sizes.split(',')],
+        [int(overlap) for overlap in args.overlaps.split(',')],
+    )
+    results = []
+    for splitter_kind, chunk_size, chunk_overlap in configs:
+        if chunk_overlap >= chunk_size:
+            continue
+        print(f"Indexing {splitter_kind} size={chunk_size} overlap={chunk_overlap}...")
+        results.append(run_config(documents, questions, embeddings, splitter_kind, chunk_size, chunk_overlap,
+                                  ks, args.repeats, args.min_relevance))
+
+    print_report(results, ks, len(questions))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'questions': len(questions), 'results': results}, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# bq_arrow.py
+"""
+Columnar BigQuery reads for DataService.
+
+Query results are downloaded through the BigQuery Storage Read API as Arrow
+record batches instead of paged JSON rows, then converted to pandas with as
+few copies as possible. DataService reads go through query_to_dataframe();
+the local mirror snapshot streams record batches from iter_query_batches().
+
+If the Storage API client can't be built (missing package or permission),
+reads fall back to the regular REST download so the dashboard keeps working.
+
+Arrow reads are opt-in per table. Only reads whose source table is set in
+the environment run their own SQL through this module:
+
+- get_markdowns_data: MARKDOWNS_TABLE (query_builder.py)
+- get_irr_data: IRR_TABLE (query_builder.py)
+- get_irr_monthly_rollup: IRR_MONTHLY_ROLLUP_TABLE or IRR_TABLE (irr_rollup.py)
+
+Everything else stays row-oriented inside DataService: get_store_list and
+get_department_list (a few hundred rows, where starting a Storage API read
+session costs more than the JSON pages it replaces), get_store_summary, and
+the reads above when their table isn't set.
+"""
+import logging
+import time
+from typing import Dict, Iterator, Optional
+
+import pandas as pd
+
+from clients import ClientUnavailableError, registry
+from frame_dtypes import apply_dtype_plan
+
+logger = logging.getLogger('adk_chat.bq_arrow')
+
+# Arrow -> pandas options used for every conversion:
+# - split_blocks avoids consolidating columns into 2-D blocks, so numeric
+#   columns without nulls are wrapped zero-copy instead of copied
+# - date_as_object=False keeps DATE columns as datetime64 instead of one
+#   Python object per cell
+ARROW_TO_PANDAS_OPTIONS = {'split_blocks': True, 'date_as_object': False}
+
+
+def _storage_client():
+    """Shared BigQueryReadClient, or None to fall back to the REST download."""
+    try:
+        return registry.get('bigquery_storage')
+    except ClientUnavailableError as e:
+        logger.warning(f"BigQuery Storage API unavailable, using REST download: {e}")
+        return None
+
+
+def _run(sql: str, job_config=None, job_stats: Optional[Dict] = None):
+    job = registry.get('bigquery').query(sql, job_config=job_config)
+    rows = job.result()
+    if job_stats is not None:
+        job_stats.update({
+            'job_id': job.job_id,
+            'bytes_processed': job.total_bytes_processed,
+            'bytes_billed': job.total_bytes_billed,
+            'cache_hit': job.cache_hit,
+            'slot_millis': job.slot_millis,
+        })
+    return rows
+
+
+def query_to_arrow(sql: str, job_config=None, job_stats: Optional[Dict] = None):
+    """
+    Run a query and download the result as a pyarrow Table.
+
+    Args:
+        sql: Query text
+        job_config: Optional bigquery.QueryJobConfig (parameters, dry run, ...)
+        job_stats: Optional dict filled with the job's bytes processed/billed,
+            cache hit and slot time
+
+    Returns:
+        pyarrow.Table
+    """
+    start_time = time.perf_counter()
+    rows = _run(sql, job_config, job_stats)
+    query_seconds = time.perf_counter() - start_time
+
+    storage_client = _storage_client()
+    table = rows.to_arrow(bqstorage_client=storage_client, create_bqstorage_client=False)
+    transfer_seconds = time.perf_counter() - start_time - query_seconds
+
+    transport = "storage API" if storage_client is not None else "REST"
+    logger.info(f"Query returned {table.num_rows} rows ({table.nbytes / 1024 ** 2:.1f} MiB) "
+                f"in {query_seconds:.2f}s + {transfer_seconds:.2f}s transfer via {transport}")
+    return table
+
+
+def arrow_to_dataframe(table) -> pd.DataFrame:
+    """
+    Convert a pyarrow Table to pandas, releasing Arrow buffers as it goes.
+
+    self_destruct frees each Arrow column once it has been converted, so peak
+    memory stays close to the size of the DataFrame rather than twice it. The
+    table must not be used afterwards.
+    """
+    return table.to_pandas(self_destruct=True, **ARROW_TO_PANDAS_OPTIONS)
+
+
+def query_to_dataframe(sql: str, job_config=None, dtype_plan: Optional[Dict[str, str]] = None,
+                       job_stats: Optional[Dict] = None) -> pd.DataFrame:
+    """
+    Run a query and return the result as a DataFrame via Arrow.
+
+    Drop-in replacement for `client.query(sql).to_dataframe()`.
+
+    Args:
+        sql: Query text
+        job_config: Optional bigquery.QueryJobConfig
+        dtype_plan: Optional frame_dtypes plan applied to the result
+        job_stats: Optional dict filled with job statistics (see query_to_arrow)
+    """
+    df = arrow_to_dataframe(query_to_arrow(sql, job_config, job_stats))
+    if dtype_plan is not None:
+        df = apply_dtype_plan(df, dtype_plan)
+    return df
+
+
+def iter_query_batches(sql: str, job_config=None) -> Iterator:
+    """
+    Run a query and yield the result as Arrow record batches.
+
+    Only one batch is held in memory at once, so very large pulls can be
+    written out or aggregated without materializing the whole result.
+    """
+    rows = _run(sql, job_config)
+    storage_client = _storage_client()
+
+    total_rows = 0
+    start_time = time.perf_counter()
+    for batch in rows.to_arrow_iterable(bqstorage_client=storage_client):
+        total_rows += batch.num_rows
+        yield batch
+    logger.info(f"Streamed {total_rows} rows in {time.perf_counter() - start_time:.2f}s")
+
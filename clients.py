@@ -0,0 +1,227 @@
+# clients.py
+"""
+Process-wide registry of lazily constructed service clients.
+
+Clients (BigQuery, Vertex AI Search, the report recommender, ...) are built
+on first use instead of at import time and then shared by every session in
+the process. A failed construction is remembered only for a short cooldown,
+after which the next caller tries again, so one bad start-up doesn't leave a
+client missing for the life of the process.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger('adk_chat.clients')
+
+# Seconds to wait after a failed construction before trying again
+RETRY_COOLDOWN_SECONDS = 30
+
+
+class ClientUnavailableError(Exception):
+    """Raised when a client could not be constructed."""
+
+
+class _ClientSlot:
+    """Holds one registered client and its construction state."""
+
+    def __init__(self, factory: Callable[[], Any], probe: Optional[Callable[[Any], Any]]):
+        self.factory = factory
+        self.probe = probe
+        self.client = None
+        self.created_at = None
+        self.last_error = None
+        self.failed_at = None
+        self.lock = threading.Lock()
+
+
+class ClientRegistry:
+    """Thread-safe registry of lazily created, shared clients."""
+
+    def __init__(self, retry_cooldown: float = RETRY_COOLDOWN_SECONDS):
+        self.retry_cooldown = retry_cooldown
+        self._slots: Dict[str, _ClientSlot] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], probe: Optional[Callable[[Any], Any]] = None):
+        """
+        Register a client factory.
+
+        Args:
+            name: Registry key
+            factory: Zero-argument callable building the client
+            probe: Optional callable run against the client by check_health()
+        """
+        self._slots[name] = _ClientSlot(factory, probe)
+
+    def get(self, name: str) -> Any:
+        """
+        Get a client, constructing it on first use.
+
+        Raises:
+            ClientUnavailableError if construction failed (now or within the
+            retry cooldown)
+        """
+        slot = self._slots[name]
+        if slot.client is not None:
+            return slot.client
+
+        with slot.lock:
+            if slot.client is not None:
+                return slot.client
+
+            if slot.failed_at is not None and time.monotonic() - slot.failed_at < self.retry_cooldown:
+                raise ClientUnavailableError(f"{name} client unavailable: {slot.last_error}")
+
+            start_time = time.perf_counter()
+            try:
+                slot.client = slot.factory()
+            except Exception as e:
+                slot.last_error = str(e)
+                slot.failed_at = time.monotonic()
+                logger.error(f"Error initializing {name} client: {e}")
+                raise ClientUnavailableError(f"{name} client unavailable: {e}") from e
+
+            slot.created_at = time.time()
+            slot.last_error = None
+            slot.failed_at = None
+            logger.info(f"{name} client initialized in {time.perf_counter() - start_time:.2f}s")
+            return slot.client
+
+    def reset(self, name: str):
+        """Drop a client so the next get() builds a new one."""
+        slot = self._slots[name]
+        with slot.lock:
+            slot.client = None
+            slot.failed_at = None
+
+    def check_health(self, name: str) -> Dict:
+        """
+        Probe one client.
+
+        Returns:
+            Dict with 'status' ("ok", "error" or "not_initialized") and details
+        """
+        slot = self._slots[name]
+        if slot.client is None:
+            return {
+                'status': 'error' if slot.last_error else 'not_initialized',
+                'error': slot.last_error,
+            }
+        if slot.probe is None:
+            return {'status': 'ok', 'created_at': slot.created_at}
+
+        start_time = time.perf_counter()
+        try:
+            slot.probe(slot.client)
+        except Exception as e:
+            logger.warning(f"Health probe for {name} client failed: {e}")
+            return {'status': 'error', 'error': str(e), 'created_at': slot.created_at}
+        return {
+            'status': 'ok',
+            'created_at': slot.created_at,
+            'probe_seconds': round(time.perf_counter() - start_time, 3),
+        }
+
+    def health(self) -> Dict[str, Dict]:
+        """Probe every registered client."""
+        return {name: self.check_health(name) for name in self._slots}
+
+
+# Configuration - Pull from Env or use defaults
+PROJECT_ID = os.getenv('GCP_PROJECT', 'wmt-us-gg-shrnk-prod')
+SEARCH_LOCATION = "global"
+# *** REVERT TO DATA STORE ID (The raw ID, not the App ID) ***
+DATA_STORE_ID = "positirr_1764279062880"
+# "bigquery" (default) or "duckdb" for the local Parquet mirror (local_mirror.py)
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'bigquery').lower()
+
+
+def _create_bigquery_client():
+    from google.cloud import bigquery
+    return bigquery.Client()
+
+
+def _probe_bigquery(client):
+    # Dry runs are free and still exercise auth and the API
+    from google.cloud import bigquery
+    client.query("SELECT 1", job_config=bigquery.QueryJobConfig(dry_run=True))
+
+
+def _create_bigquery_storage_client():
+    # Storage Read API client for Arrow downloads (see bq_arrow.py)
+    from google.cloud import bigquery_storage
+    return bigquery_storage.BigQueryReadClient()
+
+
+def _create_search_retriever():
+    # We switch from Chroma (Local) to Vertex AI Search (Cloud)
+    from langchain_google_community import VertexAISearchRetriever
+    # We must use 'data_store_id' to satisfy the library validation
+    retriever = VertexAISearchRetriever(
+        project_id=PROJECT_ID,
+        location_id=SEARCH_LOCATION,
+        data_store_id=DATA_STORE_ID,
+        max_documents=3,
+        engine_data_type=0
+    )
+    logger.info(f"Vertex AI Search Retriever initialized for store: {DATA_STORE_ID}")
+    return retriever
+
+
+def _create_report_recommender():
+    from src.report_recommender import ReportRecommender
+    return ReportRecommender()
+
+
+def _create_data_service():
+    from data_service import DataService
+    if DATA_BACKEND == 'duckdb':
+        # Local Parquet mirror; store summaries still come from BigQuery
+        from local_mirror import DuckDBDataService
+        try:
+            return DuckDBDataService(fallback=DataService())
+        except (ImportError, FileNotFoundError) as e:
+            # Built once per process, so this is logged once rather than
+            # failing every session
+            logger.error(f"DATA_BACKEND=duckdb but the local mirror can't be used, reading from BigQuery "
+                         f"instead: {e}")
+    return DataService()
+
+
+registry = ClientRegistry()
+registry.register('bigquery', _create_bigquery_client, probe=_probe_bigquery)
+registry.register('bigquery_storage', _create_bigquery_storage_client)
+registry.register('search_retriever', _create_search_retriever)
+registry.register('report_recommender', _create_report_recommender)
+registry.register('data_service', _create_data_service)
+
+
+def health_route(asgi_app, path: str = '/health'):
+    """
+    Wrap an ASGI app so GET `path` returns registry.health() as JSON.
+
+    Only clients that have already been built are probed; the others are
+    reported as not_initialized, so a health check never constructs one.
+    The response is 503 if any client is in error, 200 otherwise.
+    Everything else goes to `asgi_app` untouched.
+    """
+    async def app(scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != path:
+            await asgi_app(scope, receive, send)
+            return
+        # Probes make blocking API calls, so keep them off the event loop
+        clients = await asyncio.to_thread(registry.health)
+        healthy = all(check['status'] != 'error' for check in clients.values())
+        body = json.dumps({'status': 'healthy' if healthy else 'unhealthy', 'clients': clients}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 200 if healthy else 503,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    return app
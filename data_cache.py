@@ -0,0 +1,292 @@
+# data_cache.py
+"""
+Process-wide cache for DataService query results.
+
+Unlike the per-session `session.cache`, entries here are shared by every
+session in the process, so a result fetched once (or prefetched in the
+background) is reused wherever the same query runs. Concurrent requests for
+the same key are deduplicated: only one caller runs the query and the others
+wait for its result.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import pandas as pd
+
+from clients import registry
+from frame_dtypes import DTYPE_PLANS, apply_dtype_plan, frame_memory_bytes, widen_dtypes
+from irr_rollup import ROLLUP_MEASURES, fetch_monthly_rollup, rollup_available
+from metrics import metrics
+from query_builder import QUERY_BUILDERS
+from query_guard import query_guard
+
+logger = logging.getLogger('adk_chat.data_cache')
+
+DEFAULT_TTL_SECONDS = 300  # 5 minutes, same as the session cache
+DEFAULT_MAX_ENTRIES = 64
+
+# How long a caller waits for another caller's in-flight query before
+# running it itself
+INFLIGHT_WAIT_SECONDS = 120
+
+CACHE_REQUESTS = metrics.counter('data_cache_requests_total', "Shared data cache lookups", ['result'])
+DATA_SERVICE_CALLS = metrics.counter(
+    'dataservice_calls_total', "DataService reads that missed the cache", ['method', 'source', 'outcome'])
+DATA_SERVICE_SECONDS = metrics.histogram(
+    'dataservice_call_seconds', "Duration of DataService reads that missed the cache", ['method', 'source'])
+
+
+def make_key(method: str, kwargs: Dict[str, Any]) -> Tuple:
+    """Build a cache key from a DataService method name and its keyword arguments."""
+    return (method,) + tuple(sorted(kwargs.items()))
+
+
+class SharedDataCache:
+    """Thread-safe TTL + LRU cache with in-flight request deduplication."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_fresh(self, key):
+        # Caller must hold the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at >= self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key):
+        """Return the cached value for `key`, or None."""
+        with self._lock:
+            value = self._get_fresh(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_REQUESTS.inc(result='miss' if value is None else 'hit')
+        return value
+
+    def set(self, key, value):
+        if isinstance(value, pd.DataFrame):
+            logger.info(f"Caching {key[0]} frame: {len(value)} rows, "
+                        f"{frame_memory_bytes(value) / 1024 ** 2:.2f} MiB")
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def memory_bytes(self) -> int:
+        """Total memory of the cached DataFrames."""
+        with self._lock:
+            values = [value for _, value in self._entries.values()]
+        return sum(frame_memory_bytes(value) for value in values if isinstance(value, pd.DataFrame))
+
+    def value_ids(self) -> set:
+        """id() of every cached value, so holders of the same objects can skip them."""
+        with self._lock:
+            return {id(value) for _, value in self._entries.values()}
+
+    def is_cached_or_loading(self, key) -> bool:
+        with self._lock:
+            return key in self._inflight or self._get_fresh(key) is not None
+
+    def get_or_load(self, key, loader: Callable[[], Any]):
+        """
+        Return the cached value for `key`, running `loader` on a miss.
+
+        If another thread is already loading the same key, wait for it
+        instead of running the query a second time.
+        """
+        with self._lock:
+            value = self._get_fresh(key)
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                event = self._inflight.get(key)
+                is_loader = event is None
+                if is_loader:
+                    event = self._inflight[key] = threading.Event()
+        if value is not None:
+            CACHE_REQUESTS.inc(result='hit')
+            return value
+        CACHE_REQUESTS.inc(result='miss' if is_loader else 'inflight_wait')
+
+        if not is_loader:
+            event.wait(INFLIGHT_WAIT_SECONDS)
+            with self._lock:
+                value = self._get_fresh(key)
+            if value is not None:
+                logger.info(f"Reused in-flight result for {key[0]}")
+                return value
+            # The other load failed or timed out; run it ourselves
+            return loader()
+
+        try:
+            value = loader()
+            self.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+
+def timed_load(method: str, source: str, loader: Callable[[], Any]):
+    """Run a DataService read, recording it in the dataservice_* metrics."""
+    start_time = time.perf_counter()
+    try:
+        result = loader()
+    except Exception:
+        DATA_SERVICE_CALLS.inc(method=method, source=source, outcome='error')
+        raise
+    finally:
+        DATA_SERVICE_SECONDS.observe(time.perf_counter() - start_time, method=method, source=source)
+    DATA_SERVICE_CALLS.inc(method=method, source=source, outcome='ok')
+    return result
+
+
+# Shared by every session in the process
+shared_data_cache = SharedDataCache()
+metrics.gauge_callback('data_cache_entries', "Entries in the shared data cache",
+                       lambda: len(shared_data_cache))
+metrics.gauge_callback('data_cache_bytes', "Memory of the DataFrames in the shared data cache",
+                       shared_data_cache.memory_bytes)
+
+
+_rollup_fallback_warned = False
+
+
+def _warn_no_rollup_source():
+    global _rollup_fallback_warned
+    if not _rollup_fallback_warned:
+        _rollup_fallback_warned = True
+        logger.warning("No IRR rollup source configured: 13-month charts pull department-level detail and "
+                       "aggregate it in pandas. Set IRR_TABLE to aggregate in BigQuery, or also "
+                       "IRR_MONTHLY_ROLLUP_TABLE and run `python irr_rollup.py refresh` on a schedule.")
+
+
+class CachingDataService:
+    """
+    Wraps a DataService so selected reads go through the shared data cache.
+
+    Reads with a query builder (see query_builder.py) are keyed on their
+    normalized arguments, so equivalent calls share one cache entry, and run
+    the builder's parameterized SQL when its source table is configured.
+    Frames returned by methods with a dtype plan (see frame_dtypes.py) are
+    compacted before they are cached or handed to the session. All other
+    attributes pass straight through to the wrapped service.
+
+    Cached frames are shared: callers must copy before modifying them.
+    """
+
+    CACHED_METHODS = ('get_markdowns_data', 'get_irr_data')
+
+    def __init__(self, data_service, cache: SharedDataCache = shared_data_cache, query_bigquery: bool = True):
+        """
+        Args:
+            data_service: The DataService to wrap
+            cache: Shared cache to read through
+            query_bigquery: Run built SQL directly against BigQuery when the
+                source table is configured; False always delegates to
+                `data_service` (e.g. the local DuckDB mirror)
+        """
+        self._data_service = data_service
+        self._cache = cache
+        self._query_bigquery = query_bigquery
+
+    @staticmethod
+    def cache_key(name: str, kwargs: Dict[str, Any]) -> Tuple:
+        """Shared-cache key for a keyword call to a DataService method."""
+        builder = QUERY_BUILDERS.get(name)
+        if builder is not None:
+            return builder(**kwargs).cache_key
+        return make_key(name, kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._data_service, name)
+        plan = DTYPE_PLANS.get(name)
+        if name not in self.CACHED_METHODS and plan is None:
+            return attr
+        builder = QUERY_BUILDERS.get(name)
+
+        def load(*args, **kwargs):
+            result = timed_load(name, 'dataservice', lambda: attr(*args, **kwargs))
+            if plan is not None and isinstance(result, pd.DataFrame):
+                result = apply_dtype_plan(result, plan, name)
+            return result
+
+        def load_built(query, kwargs):
+            if query.sql is None or not self._query_bigquery:
+                # Source table not configured; let DataService build the SQL
+                return load(**kwargs)
+            # Dry-run budget check, then the real query
+            return timed_load(name, 'bigquery', lambda: query_guard.run(query, dtype_plan=plan))
+
+        def cached_method(*args, **kwargs):
+            # Only keyword calls have a canonical key
+            if args or name not in self.CACHED_METHODS:
+                return load(*args, **kwargs)
+            if builder is None:
+                return self._cache.get_or_load(make_key(name, kwargs), lambda: load(**kwargs))
+            query = builder(**kwargs)
+            return self._cache.get_or_load(query.cache_key, lambda: load_built(query, kwargs))
+
+        return cached_method
+
+    def get_irr_monthly_rollup(self, store_nbr: int, dept_nbr=None) -> pd.DataFrame:
+        """
+        Monthly IRR totals (at most 13 rows) for the 13-month charts.
+
+        Uses the wrapped service's own rollup if it has one, else BigQuery
+        when a rollup source is configured (see irr_rollup.py), else
+        aggregates the 13-month detail rows.
+        Callers must copy the frame before modifying it.
+        """
+        def load():
+            if hasattr(self._data_service, 'get_irr_monthly_rollup'):
+                return timed_load('get_irr_monthly_rollup', 'dataservice',
+                                  lambda: self._data_service.get_irr_monthly_rollup(store_nbr, dept_nbr))
+            if self._query_bigquery and rollup_available():
+                return timed_load('get_irr_monthly_rollup', 'bigquery',
+                                  lambda: fetch_monthly_rollup(store_nbr, dept_nbr))
+            _warn_no_rollup_source()
+            detail = self.get_irr_data(store_nbr=store_nbr, dept_nbr=dept_nbr, current_month_only=False)
+            if detail.empty:
+                return detail
+            # DataService expects BigQuery's dtypes, not the compacted ones
+            return self._data_service.aggregate_by_month(widen_dtypes(detail), ROLLUP_MEASURES)
+
+        key = make_key('get_irr_monthly_rollup', {'store_nbr': store_nbr, 'dept_nbr': dept_nbr})
+        return self._cache.get_or_load(key, load)
+
+
+def caching_data_service(cache: SharedDataCache = shared_data_cache) -> CachingDataService:
+    """
+    The process's DataService (see clients.py) wrapped for the shared cache.
+
+    Built SQL runs against BigQuery unless the service is the local mirror,
+    which answers every read itself. That is decided by the service actually
+    built, so a DATA_BACKEND=duckdb process whose mirror is missing (and fell
+    back to DataService) still uses BigQuery.
+    """
+    service = registry.get('data_service')
+    return CachingDataService(service, cache, query_bigquery=not getattr(service, 'local_mirror', False))
@@ -0,0 +1,141 @@
+# frame_dtypes.py
+"""
+Compact dtype plans for DataService frames.
+
+BigQuery results arrive as object/int64/float64 columns. IRR and Markdown
+frames are cached per session and in the shared data cache, so their size
+decides how many sessions fit in one Posit Connect process. Each plan maps a
+column to a compact kind:
+
+- 'category': repeated descriptions (department, markdown type, city)
+- 'int': identifiers downcast to the smallest integer type that fits
+- 'float32': item-level quantities and percentages
+- 'float64': money. float32 keeps only ~7 significant digits, so 12.99
+  becomes 12.9899997711 in exports and totals drift by cents (Book_vs_SKU
+  is a difference of two totals)
+
+Columns missing from a frame are skipped, and integer columns with nulls are
+left as they are so NaN handling downstream doesn't change.
+
+Compacted frames stay inside this app. Before one goes to code that expects
+BigQuery's dtypes (exports, DataService helpers), widen_dtypes() turns it
+back into int64/object/float64 columns.
+"""
+import logging
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('adk_chat.frame_dtypes')
+
+IRR_DTYPE_PLAN = {
+    'Store_Nbr': 'int',
+    'Dept_Nbr': 'int',
+    'DEPT_DESC': 'category',
+    'City_State': 'category',
+    'Calendar_Year': 'int',
+    'Calendar_Month': 'int',
+    'Purchases': 'float64',
+    'Markdowns': 'float64',
+    'Sales': 'float64',
+    'Book': 'float64',
+    'SKU': 'float64',
+    'Book_vs_SKU': 'float64',
+}
+
+MARKDOWN_DTYPE_PLAN = {
+    'Store_Nbr': 'int',
+    'Dept_Nbr': 'int',
+    'item_nbr': 'int',
+    'CID': 'int',
+    'MD_Desc': 'category',
+    'Description': 'category',
+    'Calendar_Year': 'int',
+    'Calendar_Month': 'int',
+    'prev_retail': 'float64',
+    'new_retail': 'float64',
+    'MD_QTY': 'float32',
+    'MUMD_AMT': 'float64',
+    'Markdown_Percent': 'float32',
+}
+
+# DataService method -> dtype plan for the frame it returns
+DTYPE_PLANS = {
+    'get_irr_data': IRR_DTYPE_PLAN,
+    'get_markdowns_data': MARKDOWN_DTYPE_PLAN,
+}
+
+
+def frame_memory_bytes(df: pd.DataFrame) -> int:
+    """Deep memory usage of a frame, including object/string contents."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _convert(column: pd.Series, kind: str) -> pd.Series:
+    if kind == 'category':
+        return column.astype('category')
+    if kind == 'int':
+        if column.isna().any():
+            return column
+        return pd.to_numeric(column, downcast='integer')
+    if kind in ('float32', 'float64'):
+        return pd.to_numeric(column, errors='coerce').astype(kind)
+    raise ValueError(f"Unknown dtype kind: {kind}")
+
+
+def apply_dtype_plan(df: pd.DataFrame, plan: Dict[str, str], name: str = 'frame') -> pd.DataFrame:
+    """
+    Convert a frame's columns to the compact dtypes in `plan`.
+
+    Args:
+        df: Frame as returned by BigQuery
+        plan: Column name -> dtype kind (see module docstring)
+        name: Label used when logging the memory saved
+
+    Returns:
+        The converted frame (a new frame; `df` is not modified)
+    """
+    if df is None or df.empty:
+        return df
+
+    before = frame_memory_bytes(df)
+    converted = {}
+    for column, kind in plan.items():
+        if column not in df.columns:
+            continue
+        try:
+            converted[column] = _convert(df[column], kind)
+        except (TypeError, ValueError) as e:
+            # Unexpected values in one column shouldn't fail the whole read
+            logger.warning(f"Could not convert {name}.{column} to {kind}: {e}")
+
+    if not converted:
+        return df
+    df = df.assign(**converted)
+    after = frame_memory_bytes(df)
+    logger.info(f"Compacted {name}: {len(df)} rows, {before / 1024 ** 2:.2f} MiB -> {after / 1024 ** 2:.2f} MiB")
+    return df
+
+
+def widen_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Undo apply_dtype_plan: int64 integers, object categories, float64 floats.
+
+    float32 values are widened through their shortest decimal form, so a
+    stored 33.33 comes back as 33.33 rather than 33.33000183105469.
+
+    Returns:
+        A new frame, or `df` itself if nothing was compacted
+    """
+    if df is None or df.empty:
+        return df
+    widened = {}
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            widened[column] = df[column].astype(object)
+        elif dtype == 'float32':
+            widened[column] = df[column].astype(str).astype('float64')
+        elif isinstance(dtype, np.dtype) and dtype.kind in 'iu' and dtype != 'int64':
+            widened[column] = df[column].astype('int64')
+    return df.assign(**widened) if widened else df
@@ -0,0 +1,151 @@
+# irr_rollup.py
+"""
+Monthly IRR rollups for the 13-month charts.
+
+The Book/SKU, Purchases and Markdowns charts only need monthly totals per
+store (optionally per department). Instead of pulling department-level rows
+and aggregating them in pandas, the rollup is computed in BigQuery and at
+most 13 rows come back.
+
+Two sources are supported:
+- IRR_MONTHLY_ROLLUP_TABLE: a maintained rollup table (store x dept x month).
+  `python irr_rollup.py refresh` (run on a schedule, after the IRR table
+  loads) creates or replaces it from IRR_TABLE; `python irr_rollup.py sql`
+  prints the statement for use as a BigQuery scheduled query instead
+- IRR_TABLE: the detail table, aggregated on the fly
+
+If neither is configured, rollup_available() is False and callers fall back
+to pulling 13 months of detail rows and DataService.aggregate_by_month().
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Optional
+
+import pandas as pd
+
+from bq_arrow import query_to_dataframe
+from clients import registry
+
+logger = logging.getLogger('adk_chat.irr_rollup')
+
+ROLLUP_MEASURES = ['Book', 'SKU', 'Purchases', 'Markdowns']
+ROLLUP_MONTHS = 13
+
+# Fully qualified table names (project.dataset.table)
+IRR_TABLE = os.getenv('IRR_TABLE')
+ROLLUP_TABLE = os.getenv('IRR_MONTHLY_ROLLUP_TABLE')
+
+_SUMS = ',\n    '.join(f"SUM({measure}) AS {measure}" for measure in ROLLUP_MEASURES)
+
+# Scheduled query that (re)builds the maintained rollup table
+ROLLUP_TABLE_SQL = f"""
+CREATE OR REPLACE TABLE `{{rollup_table}}`
+CLUSTER BY Store_Nbr AS
+SELECT
+    Store_Nbr,
+    Dept_Nbr,
+    Calendar_Year,
+    Calendar_Month,
+    {_SUMS}
+FROM `{{irr_table}}`
+GROUP BY Store_Nbr, Dept_Nbr, Calendar_Year, Calendar_Month
+"""
+
+_ROLLUP_QUERY = f"""
+SELECT
+    Calendar_Year,
+    Calendar_Month,
+    FORMAT_DATE('%b %Y', DATE(Calendar_Year, Calendar_Month, 1)) AS Month_Year,
+    {_SUMS}
+FROM `{{table}}`
+WHERE Store_Nbr = @store_nbr
+    {{dept_filter}}
+    AND DATE(Calendar_Year, Calendar_Month, 1)
+        >= DATE_SUB(DATE_TRUNC(CURRENT_DATE(), MONTH), INTERVAL {ROLLUP_MONTHS - 1} MONTH)
+GROUP BY Calendar_Year, Calendar_Month
+ORDER BY Calendar_Year, Calendar_Month
+"""
+
+
+def rollup_available() -> bool:
+    return bool(ROLLUP_TABLE or IRR_TABLE)
+
+
+def build_rollup_table_sql(rollup_table: str = ROLLUP_TABLE, irr_table: str = IRR_TABLE) -> str:
+    """CREATE OR REPLACE statement for the maintained rollup table."""
+    if not rollup_table or not irr_table:
+        raise RuntimeError("Both IRR_MONTHLY_ROLLUP_TABLE and IRR_TABLE must be set to build the rollup table")
+    return ROLLUP_TABLE_SQL.format(rollup_table=rollup_table, irr_table=irr_table)
+
+
+def refresh_rollup_table(rollup_table: str = ROLLUP_TABLE, irr_table: str = IRR_TABLE):
+    """
+    Create or replace the maintained rollup table from the IRR detail table.
+
+    Args:
+        rollup_table: Fully qualified rollup table to (re)build
+        irr_table: Fully qualified IRR detail table to aggregate
+    """
+    sql = build_rollup_table_sql(rollup_table, irr_table)
+    start_time = time.perf_counter()
+    job = registry.get('bigquery').query(sql)
+    job.result()
+    logger.info(f"Rebuilt {rollup_table} from {irr_table} in {time.perf_counter() - start_time:.1f}s "
+                f"({(job.total_bytes_processed or 0) / 1024 ** 3:.2f} GiB processed)")
+
+
+def build_rollup_sql(table: str, by_dept: bool) -> str:
+    """Monthly rollup query for one store (and optionally one department)."""
+    dept_filter = "AND Dept_Nbr = @dept_nbr" if by_dept else ""
+    return _ROLLUP_QUERY.format(table=table, dept_filter=dept_filter)
+
+
+def fetch_monthly_rollup(store_nbr: int, dept_nbr: Optional[int] = None) -> pd.DataFrame:
+    """
+    Monthly Book, SKU, Purchases and Markdowns totals for the last 13 months.
+
+    Args:
+        store_nbr: Store number
+        dept_nbr: Optional department; None totals all departments
+
+    Returns:
+        DataFrame with Calendar_Year, Calendar_Month, Month_Year and one
+        column per measure, oldest month first (at most 13 rows)
+    """
+    from google.cloud import bigquery
+
+    if not rollup_available():
+        raise RuntimeError("Neither IRR_MONTHLY_ROLLUP_TABLE nor IRR_TABLE is configured")
+
+    table = ROLLUP_TABLE or IRR_TABLE
+    params = [bigquery.ScalarQueryParameter('store_nbr', 'INT64', store_nbr)]
+    if dept_nbr is not None:
+        params.append(bigquery.ScalarQueryParameter('dept_nbr', 'INT64', dept_nbr))
+
+    sql = build_rollup_sql(table, by_dept=dept_nbr is not None)
+    df = query_to_dataframe(sql, bigquery.QueryJobConfig(query_parameters=params))
+    logger.info(f"Monthly rollup for store={store_nbr}, dept={dept_nbr}: {len(df)} rows from {table}")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the maintained IRR monthly rollup table")
+    parser.add_argument('command', choices=['refresh', 'sql'],
+                        help="refresh: create or replace the table now; sql: print the statement")
+    parser.add_argument('--rollup-table', default=ROLLUP_TABLE)
+    parser.add_argument('--irr-table', default=IRR_TABLE)
+    args = parser.parse_args()
+    if not args.rollup_table or not args.irr_table:
+        parser.error("set IRR_MONTHLY_ROLLUP_TABLE and IRR_TABLE, or pass --rollup-table and --irr-table")
+
+    if args.command == 'sql':
+        print(build_rollup_table_sql(args.rollup_table, args.irr_table))
+        return
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    refresh_rollup_table(args.rollup_table, args.irr_table)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,16 @@ Knowledge Base API
 FastAPI service for accessing the knowledge base.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from knowledge_base.service import KnowledgeBaseService
 import uvicorn
 import logging
+import time
+
+from metrics import CONTENT_TYPE, metrics
+import profiler
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +21,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(title="Retail Knowledge Base API")
 kb_service = KnowledgeBaseService()
 
+SEARCH_REQUESTS = metrics.counter('kb_search_requests_total', "Knowledge base API searches", ['outcome'])
+SEARCH_SECONDS = metrics.histogram('kb_search_seconds', "Duration of knowledge base API searches")
+
 class SearchQuery(BaseModel):
     query: str
     category: Optional[str] = None
@@ -34,6 +41,27 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "service": "knowledge-base"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Metrics in Prometheus text format."""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+if profiler.ENABLED:
+    @app.get("/admin/profile/{path:path}")
+    async def get_profile(path: str, request: Request):
+        """Sampling and allocation profiles (see profiler.py)."""
+        status, content_type, body, headers = profiler.handle(
+            path.strip("/"), dict(request.query_params), {k.lower(): v for k, v in request.headers.items()})
+        return Response(content=body, status_code=status, media_type=content_type, headers=headers)
+
+    @app.middleware("http")
+    async def capture_allocations(request: Request, call_next):
+        """Lets an armed allocation capture profile the next API request."""
+        if request.url.path.startswith(profiler.PREFIX):
+            return await call_next(request)
+        with profiler.allocation_profiler.capture(f"{request.method} {request.url.path}"):
+            return await call_next(request)
+
 @app.get("/stats")
 async def get_stats():
     """Get knowledge base statistics."""
@@ -59,6 +87,7 @@ async def search(query: SearchQuery) -> SearchResponse:
     """
     Search the knowledge base.
     """
+    start_time = time.perf_counter()
     try:
         results = kb_service.search(
             query=query.query,
@@ -66,6 +95,8 @@ async def search(query: SearchQuery) -> SearchResponse:
             max_results=query.max_results,
             min_relevance=query.min_relevance
         )
+        SEARCH_REQUESTS.inc(outcome='ok' if results else 'empty')
+        SEARCH_SECONDS.observe(time.perf_counter() - start_time)
         
         return SearchResponse(
             results=results,
@@ -74,6 +105,8 @@ async def search(query: SearchQuery) -> SearchResponse:
             query=query.query
         )
     except Exception as e:
+        SEARCH_REQUESTS.inc(outcome='error')
+        SEARCH_SECONDS.observe(time.perf_counter() - start_time)
         logger.error(f"Error searching: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
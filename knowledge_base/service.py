@@ -9,13 +9,10 @@ from langchain.docstore.document import Document
 from langchain_google_vertexai import VertexAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.text_splitter import MarkdownTextSplitter
-import logging
 from datetime import datetime
 
 from rag_config import (
-    KNOWLEDGE_BASE_DIR,
     DOC_DIRECTORY,
-    RAG_DIRECTORY,
     VECTOR_DB_DIRECTORY,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
@@ -23,17 +20,10 @@ from rag_config import (
     GCP_LOCATION,
     EMBEDDING_MODEL_NAME
 )
+from log_pipeline import setup_logging
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join('logs', 'knowledge_base.log')),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+# Setup logging (queued; written by the log pipeline's background thread)
+logger = setup_logging(__name__, log_file=os.path.join('logs', 'knowledge_base.log'))
 
 class KnowledgeBaseService:
     """Service for managing and accessing the knowledge base."""
@@ -0,0 +1,44 @@
+# lazy_imports.py
+"""
+Deferred imports for heavy optional stacks.
+
+`lazy_module("plotly.graph_objects")` returns a stand-in that imports the
+real module on first attribute access, so the cost is paid by the first
+request that actually needs it instead of by app start-up.
+"""
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger('adk_chat.lazy_imports')
+
+
+class LazyModule:
+    """Module proxy that imports the target module on first use."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start_time = time.perf_counter()
+                    self._module = importlib.import_module(self._name)
+                    logger.info(f"Deferred import of {self._name} took {time.perf_counter() - start_time:.2f}s")
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    """Return a proxy for `name` that is imported on first attribute access."""
+    return LazyModule(name)
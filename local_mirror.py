@@ -0,0 +1,302 @@
+# local_mirror.py
+"""
+Local DuckDB/Parquet mirror of the IRR and markdown datasets.
+
+IRR data changes at most daily and a store's 13-month slice is small, so the
+dashboard can read from a local copy instead of BigQuery:
+
+- `python local_mirror.py sync` (run on a schedule) pulls the last 13
+  months of both tables and writes Parquet partitioned by store and month:
+  <root>/irr/Store_Nbr=1/Calendar_Year=2025/Calendar_Month=6/*.parquet
+  where <root>/irr is a symlink to the latest synced version, swapped
+  atomically so readers never see a half-written or missing mirror
+- DuckDBDataService answers the DataService methods the dashboard uses from
+  those files, with the same signatures and return shapes
+
+Set DATA_BACKEND=duckdb (and optionally DATA_MIRROR_ROOT) to use it. Since it
+needs no cloud access, write_fixture() plus DuckDBDataService also serve as
+an offline data fixture for benchmarks.
+
+duckdb is an optional dependency, only needed when the mirror is used.
+"""
+import argparse
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from query_builder import IRR_COLUMNS, MARKDOWN_COLUMNS, build_markdowns_query
+
+logger = logging.getLogger('adk_chat.local_mirror')
+
+MIRROR_ROOT = os.getenv('DATA_MIRROR_ROOT', 'data/mirror')
+MIRROR_MONTHS = 13
+PARTITION_COLUMNS = ['Store_Nbr', 'Calendar_Year', 'Calendar_Month']
+
+# Mirrored dataset name -> columns
+DATASETS = {
+    'irr': IRR_COLUMNS,
+    'markdowns': MARKDOWN_COLUMNS,
+}
+
+
+def _swap_in(version: Path, target: Path):
+    """
+    Point `target` at the `version` directory in one atomic rename.
+
+    `target` is a symlink to the current version (<name>.v<ns>). The new link
+    is made beside it and renamed over it, so the glob readers expand always
+    matches either every old file or every new one. The previous version is
+    kept for queries that already listed its files; older versions and
+    leftovers of failed syncs are removed.
+    """
+    if target.is_dir() and not target.is_symlink():
+        # Mirror written before versioned directories: move it aside once
+        legacy = target.with_name(f"{target.name}.v0")
+        target.rename(legacy)
+        target.symlink_to(legacy.name, target_is_directory=True)
+    previous = os.readlink(target) if target.is_symlink() else None
+
+    link = target.with_name(f"{target.name}.next")
+    if link.is_symlink():
+        link.unlink()
+    link.symlink_to(version.name, target_is_directory=True)
+    os.replace(link, target)
+
+    for path in target.parent.glob(f"{target.name}.v*"):
+        if path.name not in (version.name, previous):
+            shutil.rmtree(path)
+
+
+def _write_dataset(data, schema, target: Path):
+    import pyarrow.dataset as ds
+
+    staging = target.with_name(f"{target.name}.v{time.time_ns()}")
+    ds.write_dataset(
+        data,
+        staging,
+        schema=schema,
+        format='parquet',
+        partitioning=PARTITION_COLUMNS,
+        partitioning_flavor='hive',
+    )
+    _swap_in(staging, target)
+
+
+def sync_mirror(root: str = MIRROR_ROOT, stores: Optional[List[int]] = None):
+    """
+    Pull the last 13 months of IRR and markdown data into the Parquet mirror.
+
+    Args:
+        root: Mirror directory
+        stores: Optional store numbers to mirror (default: all stores)
+    """
+    from google.cloud import bigquery
+    from bq_arrow import iter_query_batches
+    from query_builder import MARKDOWNS_TABLE
+    from irr_rollup import IRR_TABLE
+
+    sources = {'irr': IRR_TABLE, 'markdowns': MARKDOWNS_TABLE}
+    root_path = Path(root)
+    root_path.mkdir(parents=True, exist_ok=True)
+
+    for name, columns in DATASETS.items():
+        table = sources[name]
+        if not table:
+            logger.warning(f"Skipping {name} mirror: source table not configured")
+            continue
+
+        sql = (f"SELECT {', '.join(columns)}\n"
+               f"FROM `{table}`\n"
+               f"WHERE DATE(Calendar_Year, Calendar_Month, 1) >= "
+               f"DATE_SUB(DATE_TRUNC(CURRENT_DATE(), MONTH), INTERVAL {MIRROR_MONTHS - 1} MONTH)")
+        params = []
+        if stores:
+            sql += "\n  AND Store_Nbr IN UNNEST(@stores)"
+            params.append(bigquery.ArrayQueryParameter('stores', 'INT64', stores))
+
+        start_time = time.perf_counter()
+        batches = iter_query_batches(sql, bigquery.QueryJobConfig(query_parameters=params))
+        first = next(batches, None)
+        if first is None:
+            logger.warning(f"Skipping {name} mirror: query returned no rows")
+            continue
+
+        def all_batches(first=first, batches=batches):
+            yield first
+            yield from batches
+
+        # Batches stream straight to Parquet; the full table is never in memory
+        _write_dataset(all_batches(), first.schema, root_path / name)
+        logger.info(f"Mirrored {name} to {root_path / name} in {time.perf_counter() - start_time:.1f}s")
+
+
+def write_fixture(root: str, irr: pd.DataFrame, markdowns: pd.DataFrame):
+    """Write in-memory frames in the mirror layout (offline fixtures, tests)."""
+    import pyarrow as pa
+
+    root_path = Path(root)
+    root_path.mkdir(parents=True, exist_ok=True)
+    for name, df in (('irr', irr), ('markdowns', markdowns)):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        _write_dataset(table, table.schema, root_path / name)
+
+
+class DuckDBDataService:
+    """
+    DataService backed by the local Parquet mirror.
+
+    Methods the mirror has no data for (e.g. get_store_summary) are
+    delegated to `fallback` when one is given.
+    """
+
+    # Read by data_cache.caching_data_service(): built SQL must not go to BigQuery
+    local_mirror = True
+
+    def __init__(self, root: str = MIRROR_ROOT, fallback=None):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("DATA_BACKEND=duckdb requires the duckdb package (pip install duckdb)") from e
+
+        self.root = Path(root)
+        self.fallback = fallback
+        self._conn = duckdb.connect(database=':memory:')
+        self._local = threading.local()
+        for name in DATASETS:
+            if not (self.root / name).is_dir():
+                raise FileNotFoundError(
+                    f"No {name} mirror at {self.root / name}; run `python local_mirror.py sync` first")
+            glob = (self.root / name / '**' / '*.parquet').as_posix()
+            # Views re-read the glob on every query, so a fresh sync is
+            # picked up without reconnecting
+            self._conn.execute(
+                f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{glob}', hive_partitioning = true)"
+            )
+        logger.info(f"DuckDB data service reading mirror at {self.root}")
+
+    def __getattr__(self, name):
+        if name.startswith('_') or self.__dict__.get('fallback') is None:
+            raise AttributeError(name)
+        return getattr(self.fallback, name)
+
+    def _query(self, sql: str, params: list) -> pd.DataFrame:
+        # DuckDB connections aren't safe to share across threads; cursors are
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self._conn.cursor()
+        start_time = time.perf_counter()
+        df = cursor.execute(sql, params).df()
+        logger.info(f"DuckDB query returned {len(df)} rows in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+        return df
+
+    def get_irr_data(self, store_nbr: int = 1, dept_nbr: Optional[int] = None,
+                     current_month_only: bool = False) -> pd.DataFrame:
+        where = "WHERE Store_Nbr = ?"
+        params = [store_nbr]
+        if dept_nbr is not None:
+            where += " AND Dept_Nbr = ?"
+            params.append(dept_nbr)
+
+        if current_month_only:
+            sql = (f"SELECT {', '.join(IRR_COLUMNS)} FROM irr {where} "
+                   f"AND make_date(Calendar_Year, Calendar_Month, 1) = "
+                   f"(SELECT max(make_date(Calendar_Year, Calendar_Month, 1)) FROM irr {where})")
+            params = params + params
+        else:
+            sql = f"SELECT {', '.join(IRR_COLUMNS)} FROM irr {where}"
+        return self._query(sql + " ORDER BY Calendar_Year, Calendar_Month, Dept_Nbr", params)
+
+    def get_markdowns_data(self, store_nbr=None, dept_nbr=None, item_nbr=None, cid=None, md_desc=None,
+                           sort_column='MUMD_AMT', sort_order='ASC', limit_rows=True) -> pd.DataFrame:
+        # Same normalization and sort allowlist as the BigQuery path
+        args = build_markdowns_query(store_nbr, dept_nbr, item_nbr, cid, md_desc,
+                                     sort_column, sort_order, limit_rows).args
+        columns = {'store_nbr': 'Store_Nbr', 'dept_nbr': 'Dept_Nbr', 'item_nbr': 'item_nbr',
+                   'cid': 'CID', 'md_desc': 'MD_Desc'}
+        clauses, params = [], []
+        for arg, column in columns.items():
+            if args[arg] is not None:
+                clauses.append(f"{column} = ?")
+                params.append(args[arg])
+
+        sql = f"SELECT {', '.join(MARKDOWN_COLUMNS)} FROM markdowns"
+        if clauses:
+            sql += f" WHERE {' AND '.join(clauses)}"
+        sql += f" ORDER BY {args['sort_column']} {args['sort_order']}"
+        if args['limit_rows'] is not None:
+            sql += " LIMIT ?"
+            params.append(args['limit_rows'])
+        return self._query(sql, params)
+
+    def get_store_list(self, all_stores: bool = True) -> List[Dict]:
+        # One row per store, with its most recent City_State
+        df = self._query(
+            "SELECT Store_Nbr, arg_max(City_State, make_date(Calendar_Year, Calendar_Month, 1)) AS City_State "
+            "FROM irr GROUP BY Store_Nbr ORDER BY Store_Nbr", [])
+        return [{'value': int(row.Store_Nbr), 'label': f"{int(row.Store_Nbr)} - {row.City_State}"}
+                for row in df.itertuples()]
+
+    def get_department_list(self, store_nbr: int = 1) -> List[Dict]:
+        df = self._query(
+            "SELECT Dept_Nbr, arg_max(DEPT_DESC, make_date(Calendar_Year, Calendar_Month, 1)) AS DEPT_DESC "
+            "FROM irr WHERE Store_Nbr = ? GROUP BY Dept_Nbr ORDER BY Dept_Nbr", [store_nbr])
+        return [{'value': int(row.Dept_Nbr), 'label': f"{int(row.Dept_Nbr)} - {row.DEPT_DESC}"}
+                for row in df.itertuples()]
+
+    def get_markdown_filter_options(self) -> Dict[str, List]:
+        df = self._query("SELECT DISTINCT MD_Desc FROM markdowns WHERE MD_Desc IS NOT NULL ORDER BY MD_Desc", [])
+        return {'md_desc': df['MD_Desc'].tolist()}
+
+    def get_irr_monthly_rollup(self, store_nbr: int, dept_nbr: Optional[int] = None) -> pd.DataFrame:
+        where = "WHERE Store_Nbr = ?"
+        params = [store_nbr]
+        if dept_nbr is not None:
+            where += " AND Dept_Nbr = ?"
+            params.append(dept_nbr)
+        # Latest 13 months, returned oldest first
+        sql = (
+            "SELECT * FROM ("
+            "SELECT Calendar_Year, Calendar_Month, "
+            "strftime(make_date(Calendar_Year, Calendar_Month, 1), '%b %Y') AS Month_Year, "
+            "sum(Book) AS Book, sum(SKU) AS SKU, sum(Purchases) AS Purchases, sum(Markdowns) AS Markdowns "
+            f"FROM irr {where} "
+            "GROUP BY Calendar_Year, Calendar_Month ORDER BY Calendar_Year DESC, Calendar_Month DESC "
+            f"LIMIT {MIRROR_MONTHS}"
+            ") ORDER BY Calendar_Year, Calendar_Month"
+        )
+        return self._query(sql, params)
+
+    def aggregate_by_month(self, df: pd.DataFrame, measures: List[str]) -> pd.DataFrame:
+        monthly = (df.groupby(['Calendar_Year', 'Calendar_Month'], as_index=False, observed=True)[measures]
+                   .sum()
+                   .sort_values(['Calendar_Year', 'Calendar_Month']))
+        monthly.insert(2, 'Month_Year', pd.to_datetime(
+            dict(year=monthly['Calendar_Year'], month=monthly['Calendar_Month'], day=1)).dt.strftime('%b %Y'))
+        return monthly.reset_index(drop=True)
+
+    def get_store_summary(self, store_nbr: int) -> str:
+        if self.fallback is not None:
+            return self.fallback.get_store_summary(store_nbr)
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the local IRR/markdown Parquet mirror from BigQuery")
+    parser.add_argument('command', choices=['sync'])
+    parser.add_argument('--root', default=MIRROR_ROOT)
+    parser.add_argument('--stores', help="Comma-separated store numbers (default: all)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    stores = [int(store) for store in args.stores.split(',')] if args.stores else None
+    sync_mirror(args.root, stores)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+# log_pipeline.py
+"""
+Queue-based logging so log I/O stays off the request path.
+
+Loggers set up with setup_logging() get a single QueueHandler. The calling
+thread only filters the record, renders its message (and traceback) and puts
+it on a queue. A QueueListener thread writes records to stdout and to
+JSON-lines log files.
+
+Two filters run before a record is queued:
+- DEBUG records are sampled per call site (LOG_DEBUG_SAMPLE_RATE, default
+  0.1, keeps every 10th record from each logging line)
+- INFO and DEBUG records are rate limited per logger (LOG_RATE_LIMIT records/s
+  with bursts up to LOG_RATE_BURST). The next record that gets through
+  carries a `suppressed` count
+
+WARNING and above are never sampled, rate limited or dropped. If the queue
+is full they wait for space, while lower levels are counted and dropped.
+LOG_LEVEL sets the level (default INFO) and LOG_FORMAT=json switches stdout
+from the usual text lines to JSON.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+from metrics import metrics
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+STDOUT_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0.1))
+RATE_LIMIT = float(os.getenv('LOG_RATE_LIMIT', 50))
+RATE_BURST = float(os.getenv('LOG_RATE_BURST', 200))
+QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+# Attributes every LogRecord has; anything else came in via `extra=`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, including `extra=` fields and tracebacks."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exception'] = record.exc_text
+        if record.stack_info:
+            payload['stack'] = record.stack_info
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in every 1/rate DEBUG records from each call site."""
+
+    def __init__(self, rate: float = DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self.sampled_out = 0
+        self._counts: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        if self.every == 0:
+            self.sampled_out += 1
+            return False
+        site = (record.name, record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(site, 0)
+            self._counts[site] = count + 1
+        if count % self.every:
+            self.sampled_out += 1
+            return False
+        record.sample_rate = 1 / self.every
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Per-logger token bucket for records below WARNING."""
+
+    def __init__(self, rate: float = RATE_LIMIT, burst: float = RATE_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.rate_limited = 0
+        self._buckets: Dict[str, list] = {}  # logger -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+            if record.levelno < logging.WARNING:
+                if bucket[0] < 1:
+                    bucket[2] += 1
+                    self.rate_limited += 1
+                    return False
+                bucket[0] -= 1
+
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+class _LoggerFilter(logging.Filter):
+    """Passes records from any of the given loggers and their children."""
+
+    def __init__(self):
+        super().__init__()
+        self.names = set()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return any(record.name == name or record.name.startswith(name + '.') for name in self.names)
+
+
+class _PipelineQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks on INFO/DEBUG and never drops WARNING+."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render here, while args and exc_info still refer to live objects,
+        # but keep the traceback separate from the message for JSON output
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = message
+        record.message = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+_lock = threading.Lock()
+_queue_handler: Optional[_PipelineQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_sampling_filter = SamplingFilter()
+_rate_limit_filter = RateLimitFilter()
+_file_filters: Dict[str, _LoggerFilter] = {}
+
+
+def _start_pipeline():
+    # Caller must hold _lock
+    global _queue_handler, _listener
+
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.setFormatter(JSONFormatter() if STDOUT_FORMAT == 'json' else logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    _queue_handler = _PipelineQueueHandler(log_queue)
+    _queue_handler.addFilter(_sampling_filter)
+    _queue_handler.addFilter(_rate_limit_filter)
+
+    _listener = logging.handlers.QueueListener(log_queue, stdout_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush what's still queued on a normal interpreter exit
+    atexit.register(_listener.stop)
+
+
+def _add_file(name: str, log_file: str):
+    # Caller must hold _lock
+    log_filter = _file_filters.get(log_file)
+    if log_filter is None:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024, backupCount=5)
+        handler.setFormatter(JSONFormatter())
+        log_filter = _file_filters[log_file] = _LoggerFilter()
+        handler.addFilter(log_filter)
+        _listener.handlers = _listener.handlers + (handler,)
+    log_filter.names.add(name)
+
+
+def setup_logging(name: str, log_file: Optional[str] = None, level: str = LOG_LEVEL) -> logging.Logger:
+    """
+    Route a logger through the queue pipeline.
+
+    Args:
+        name: Logger name; its children are included
+        log_file: Optional JSON-lines file (rotated at 10 MB) for this logger
+        level: Logger level
+
+    Returns:
+        The configured logger
+    """
+    logger = logging.getLogger(name)
+    with _lock:
+        if _listener is None:
+            _start_pipeline()
+        if _queue_handler not in logger.handlers:
+            logger.addHandler(_queue_handler)
+        # Records are written by the pipeline, not again by root handlers
+        logger.propagate = False
+        logger.setLevel(level)
+        if log_file:
+            try:
+                _add_file(name, log_file)
+            except OSError as e:
+                logger.warning(f"Could not set up file logging to {log_file}: {e}")
+    return logger
+
+
+def pipeline_stats() -> Dict[str, int]:
+    """Queue depth and counts of records dropped by each stage."""
+    return {
+        'queued': _queue_handler.queue.qsize() if _queue_handler else 0,
+        'dropped_queue_full': _queue_handler.dropped if _queue_handler else 0,
+        'sampled_out': _sampling_filter.sampled_out,
+        'rate_limited': _rate_limit_filter.rate_limited,
+    }
+
+
+metrics.gauge_callback('log_queue_depth', "Log records waiting to be written",
+                       lambda: pipeline_stats()['queued'])
+metrics.gauge_callback('log_records_dropped', "Log records dropped before being written, by stage",
+                       lambda: {stage: count for stage, count in pipeline_stats().items() if stage != 'queued'},
+                       ['stage'])
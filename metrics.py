@@ -0,0 +1,215 @@
+# metrics.py
+"""
+In-process metrics registry with Prometheus text export.
+
+Counters and histograms are created once at import time by the modules that
+record them, for example:
+
+    DATA_SERVICE_CALLS = metrics.counter('dataservice_calls_total', "DataService calls", ['method', 'source'])
+    DATA_SERVICE_CALLS.inc(method='get_irr_data', source='bigquery')
+
+An increment is a dict lookup and a locked add, cheap enough for every
+DataService call and LLM step. Values that already live elsewhere (cache
+size, log queue depth) are registered as gauge callbacks and read only when
+/metrics is scraped.
+
+The Shiny app serves the registry at /metrics through metrics_route() and
+knowledge_base/api.py has its own /metrics endpoint.
+"""
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers cache hits (ms) through slow BigQuery and LLM calls (tens of s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set."""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                                for key, value in values]
+
+
+class Histogram(_Metric):
+    """Bucketed observations (usually durations in seconds) per label set."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, list] = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        lines = self.header()
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _GaugeCallback(_Metric):
+    """Gauge whose value(s) are read from a callback at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        try:
+            result = self.callback()
+        except Exception:
+            # A broken callback shouldn't take the whole scrape down
+            return []
+        if not self.labelnames:
+            return self.header() + [f"{self.name} {_format_value(result)}"]
+        # Labelled callbacks return {label value(s): value}
+        lines = self.header()
+        for key, value in sorted(result.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of one process."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-imports (e.g. Shiny reloads) get the metric already recording
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+                if isinstance(existing, _GaugeCallback):
+                    existing.callback = metric.callback
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, tuple(labelnames)))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, tuple(labelnames), buckets))
+
+    def gauge_callback(self, name: str, documentation: str, callback: Callable,
+                       labelnames: Iterable[str] = ()):
+        self._register(_GaugeCallback(name, documentation, callback, tuple(labelnames)))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by every module in the process
+metrics = MetricsRegistry()
+
+
+def metrics_route(asgi_app, path: str = '/metrics'):
+    """
+    Wrap an ASGI app so GET `path` returns the registry.
+
+    Everything else, including lifespan and websocket traffic, goes to
+    `asgi_app` untouched.
+    """
+    async def app(scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != path:
+            await asgi_app(scope, receive, send)
+            return
+        body = metrics.render().encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', CONTENT_TYPE.encode()), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    return app
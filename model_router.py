@@ -0,0 +1,151 @@
+# model_router.py
+"""
+Routes chat model calls between a fast (flash-class) and a strong (pro-class)
+Gemini model.
+
+Short or simple questions are answered entirely by the fast model. For harder
+questions the fast model still handles ReAct tool-selection steps, and the
+strong model writes the long-form answer: after a tool has answered, or in
+place of the fast model when it answers a hard question without using a
+tool. Per-tier latency and token counts are recorded for monitoring.
+"""
+import logging
+import os
+import re
+import statistics
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+logger = logging.getLogger('adk_chat.model_router')
+
+FAST = "fast"
+STRONG = "strong"
+
+# Questions longer than this (in words) are treated as long-form
+LONG_QUESTION_WORDS = 25
+
+# Phrases that usually call for a reasoned, multi-paragraph answer
+LONG_FORM_PATTERN = re.compile(
+    r"\b(why|explain|analy[sz]e|analysis|compare|comparison|root cause|recommend|strateg\w*|"
+    r"plan|investigat\w*|summari[sz]e|walk me through|step[- ]by[- ]step|difference between|"
+    r"how (do|can|should) (i|we))\b",
+    re.IGNORECASE
+)
+
+# Tier chosen for the turn currently being processed
+_turn_tier: ContextVar[Optional[str]] = ContextVar('turn_tier', default=None)
+
+
+class TierStats:
+    """Latency and token counters for one model tier."""
+
+    def __init__(self, window: int = 500):
+        self.calls = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies = deque(maxlen=window)  # seconds, most recent calls
+
+    def snapshot(self) -> Dict:
+        latencies = list(self.latencies)
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'median_latency': statistics.median(latencies) if latencies else None,
+            'max_latency': max(latencies) if latencies else None,
+        }
+
+
+class ModelRouter:
+    """Chooses a model tier per turn and per ReAct step, and records usage."""
+
+    def __init__(self, fast_model: str, strong_model: str):
+        self.models = {FAST: fast_model, STRONG: strong_model}
+        self.stats = {FAST: TierStats(), STRONG: TierStats()}
+        self._lock = threading.Lock()
+
+    def classify_question(self, question: str) -> str:
+        """Pick the tier a user question needs for its final answer."""
+        text = (question or "").strip()
+        if len(text.split()) > LONG_QUESTION_WORDS or LONG_FORM_PATTERN.search(text):
+            return STRONG
+        return FAST
+
+    @contextmanager
+    def turn(self, question: str):
+        """Context manager marking the agent run for one user question."""
+        tier = self.classify_question(question)
+        logger.info(f"Routing turn to '{tier}' tier ({self.models[tier]})")
+        token = _turn_tier.set(tier)
+        try:
+            yield tier
+        finally:
+            _turn_tier.reset(token)
+
+    def current_turn_tier(self) -> Optional[str]:
+        """Tier chosen for the turn in progress (None outside a turn)."""
+        return _turn_tier.get()
+
+    def tier_for_step(self, prompt_text: str) -> str:
+        """
+        Pick the tier for a single LLM call within the current turn.
+
+        Steps that still have to choose a tool run on the fast model. Once a
+        tool observation is in the scratchpad the next call writes the answer,
+        which goes to the strong model for long-form turns.
+        """
+        turn_tier = _turn_tier.get() or STRONG
+        if turn_tier == FAST:
+            return FAST
+        # The format instructions also mention "Observation:", so only look at
+        # the scratchpad that follows the user's input
+        scratchpad = prompt_text.rsplit("New input:", 1)[-1]
+        return STRONG if "Observation:" in scratchpad else FAST
+
+    def record(self, tier: str, latency: float, input_tokens: int = 0, output_tokens: int = 0,
+               error: bool = False):
+        """Record one model call for a tier."""
+        with self._lock:
+            stats = self.stats[tier]
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.latencies.append(latency)
+        logger.info(f"[{tier}] {self.models[tier]} call took {latency:.2f}s "
+                    f"(tokens in={input_tokens}, out={output_tokens})")
+
+    def snapshot(self) -> Dict:
+        """Per-tier usage summary."""
+        with self._lock:
+            return {tier: dict(model=self.models[tier], **stats.snapshot())
+                    for tier, stats in self.stats.items()}
+
+
+_model_router = None
+_model_router_lock = threading.Lock()
+
+
+def get_model_router() -> Optional[ModelRouter]:
+    """
+    Get the shared model router for this process.
+
+    The strong model is VERTEX_MODEL and the fast model is VERTEX_FAST_MODEL.
+    Returns None when MODEL_TIERING=off.
+    """
+    global _model_router
+    if os.getenv('MODEL_TIERING', 'on').lower() == 'off':
+        return None
+
+    with _model_router_lock:
+        if _model_router is None:
+            _model_router = ModelRouter(
+                fast_model=os.getenv('VERTEX_FAST_MODEL', 'gemini-1.5-flash'),
+                strong_model=os.getenv('VERTEX_MODEL', 'gemini-1.5-pro'),
+            )
+        return _model_router
@@ -0,0 +1,359 @@
+# profiler.py
+"""
+Opt-in sampling and allocation profiler for a running worker.
+
+Disabled unless PROFILER_TOKEN is set. While disabled profiler_route()
+returns the app unchanged and no hooks are installed, so it costs nothing.
+When enabled, requests under /admin/profile must carry the token in an
+X-Profiler-Token header or a ?token= parameter:
+
+    GET /admin/profile/start?seconds=30&interval_ms=10
+        Sample every thread's stack for a fixed window. The result is in
+        collapsed-stack format (one "thread;outer;...;inner count" line per
+        stack), ready for flamegraph.pl, speedscope or inferno.
+    GET /admin/profile/allocations?session=<shiny session id>
+        Run tracemalloc for the next interaction, i.e. the next root tracing
+        span (a render, export or chat message), optionally only one from
+        the given session. In the knowledge base API this is the next request.
+    GET /admin/profile/list
+        Recent profiles and their status.
+    GET /admin/profile/<id>
+        Download a finished profile (202 while it is still running).
+    GET /admin/profile/traces?limit=100&session=<shiny session id>
+        Most recent finished tracing spans, newest first (tracing.py).
+    GET /admin/profile/traces/summary
+        Count, errors and p50/p95/max duration per span name.
+    GET /admin/profile/traces/<trace id>
+        Every buffered span of one trace.
+
+Only one sampling window and one allocation capture run at a time. The last
+PROFILER_KEEP (default 20) profiles are kept in memory.
+"""
+import itertools
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from tracing import Span, span, tracer
+
+logger = logging.getLogger('adk_chat.profiler')
+
+PROFILER_TOKEN = os.getenv('PROFILER_TOKEN')
+ENABLED = bool(PROFILER_TOKEN)
+MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', 300))
+KEEP = int(os.getenv('PROFILER_KEEP', 20))
+TRACEMALLOC_FRAMES = int(os.getenv('PROFILER_TRACEMALLOC_FRAMES', 25))
+PREFIX = '/admin/profile'
+
+
+@dataclass
+class Profile:
+    """One sampling window or allocation capture."""
+    id: str
+    kind: str  # 'stacks' or 'allocations'
+    status: str = 'running'  # 'armed', 'running', 'done' or 'failed'
+    created: float = field(default_factory=time.time)
+    description: str = ''
+    content: str = ''
+
+    def as_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'description': self.description,
+            'bytes': len(self.content),
+        }
+
+
+class ProfileStore:
+    """The last `keep` profiles, oldest evicted first."""
+
+    def __init__(self, keep: int = KEEP):
+        self.keep = keep
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new(self, kind: str, status: str, description: str) -> Profile:
+        with self._lock:
+            profile = Profile(f"{kind}-{next(self._ids)}", kind, status, description=description)
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+            return profile
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return [p.as_dict() for p in reversed(self._profiles.values())]
+
+
+store = ProfileStore()
+
+
+class StackSampler:
+    """Samples the stacks of all threads on a timer from a background thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running: Optional[Profile] = None
+        self._labels: Dict[object, str] = {}
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (f"{code.co_name} "
+                                          f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        return label
+
+    def start(self, seconds: float, interval: float) -> Optional[Profile]:
+        """Start a sampling window; returns None if one is already running."""
+        with self._lock:
+            if self._running is not None:
+                return None
+            profile = self._running = store.new(
+                'stacks', 'running', f"{seconds:g}s every {interval * 1000:g}ms")
+        threading.Thread(target=self._run, args=(profile, seconds, interval),
+                         name='stack-sampler', daemon=True).start()
+        return profile
+
+    def _run(self, profile: Profile, seconds: float, interval: float):
+        own_ident = threading.get_ident()
+        stacks: Counter = Counter()
+        ticks = 0
+        try:
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    labels.append(names.get(ident, f"thread-{ident}"))
+                    stacks[';'.join(reversed(labels))] += 1
+                ticks += 1
+                time.sleep(interval)
+            profile.content = ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+            profile.description += f", {ticks} samples"
+            profile.status = 'done'
+            logger.info(f"Stack profile {profile.id} done: {ticks} samples, {len(stacks)} distinct stacks")
+        except Exception as e:
+            profile.status = 'failed'
+            profile.content = f"{type(e).__name__}: {e}\n"
+            logger.error(f"Stack profile {profile.id} failed: {e}")
+        finally:
+            with self._lock:
+                self._running = None
+
+
+class AllocationProfiler:
+    """
+    Runs tracemalloc for one interaction.
+
+    arm() registers a tracing root hook; the next root span (from the given
+    session, if any) starts tracemalloc and its finish writes the report and
+    unregisters the hook. tracemalloc is process-wide, so allocations made
+    by concurrent requests during the interaction are included too.
+    """
+
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self._lock = threading.Lock()
+        self._profile: Optional[Profile] = None
+        self._session_id: Optional[str] = None
+        self._span_id: Optional[str] = None
+
+    def arm(self, session_id: Optional[str] = None) -> Optional[Profile]:
+        """Capture the next interaction; returns None if a capture is pending."""
+        with self._lock:
+            if self._profile is not None:
+                return None
+            if tracemalloc.is_tracing():
+                # Someone else is using tracemalloc; don't stop it under them
+                return None
+            self._session_id = session_id
+            self._span_id = None
+            self._profile = store.new('allocations', 'armed',
+                                      f"next interaction{f' of session {session_id}' if session_id else ''}")
+            tracer.root_hooks.append(self)
+            return self._profile
+
+    def on_root_start(self, root: Span):
+        with self._lock:
+            if self._span_id is not None or (self._session_id and root.session_id != self._session_id):
+                return
+            self._span_id = root.span_id
+            self._profile.status = 'running'
+            self._profile.description = f"{root.name} (session {root.session_id})"
+            tracemalloc.start(self.frames)
+
+    def on_root_finish(self, root: Span):
+        with self._lock:
+            if root.span_id != self._span_id:
+                return
+            profile = self._profile
+            self._profile = self._span_id = None
+            tracer.root_hooks.remove(self)
+        try:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            profile.content = self._report(root, snapshot, current, peak)
+            profile.status = 'done'
+            logger.info(f"Allocation profile {profile.id} done: {root.name}, peak {peak / 1024:.0f} KiB")
+        except Exception as e:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            profile.status = 'failed'
+            profile.content = f"{type(e).__name__}: {e}\n"
+            logger.error(f"Allocation profile {profile.id} failed: {e}")
+
+    def _report(self, root: Span, snapshot: tracemalloc.Snapshot, current: int, peak: int) -> str:
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        lines = [
+            f"Interaction: {root.name} (session {root.session_id}, {root.duration_ms:.0f}ms)",
+            f"Attributes: {root.attributes}",
+            f"Still allocated at the end: {current / 1024:.1f} KiB, peak: {peak / 1024:.1f} KiB",
+            "tracemalloc is process-wide; concurrent requests are included.",
+            "",
+            "Top 30 lines by allocated size:",
+        ]
+        for stat in snapshot.statistics('lineno')[:30]:
+            lines.append(f"  {stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {stat.traceback[0]}")
+        lines += ["", "Top 10 tracebacks by allocated size:"]
+        for stat in snapshot.statistics('traceback')[:10]:
+            lines.append(f"\n{stat.size / 1024:.1f} KiB in {stat.count} blocks")
+            lines.extend(f"  {line}" for line in stat.traceback.format(most_recent_first=True))
+        return '\n'.join(lines) + '\n'
+
+    @contextmanager
+    def capture(self, name: str):
+        """Make a block (e.g. one API request) a root span that can be captured."""
+        if self._profile is None:
+            yield
+            return
+        with span(name):
+            yield
+
+
+stack_sampler = StackSampler()
+allocation_profiler = AllocationProfiler()
+
+
+def _authorized(params: Dict[str, str], headers: Dict[str, str]) -> bool:
+    token = headers.get('x-profiler-token') or params.get('token') or ''
+    return ENABLED and secrets.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+
+def _json(status: int, payload) -> Tuple[int, str, bytes, Dict[str, str]]:
+    # default=str: span attributes hold whatever filter values were active
+    return status, 'application/json', json.dumps(payload, default=str).encode('utf-8'), {}
+
+
+def handle(path: str, params: Dict[str, str], headers: Dict[str, str]) -> Tuple[int, str, bytes, Dict[str, str]]:
+    """
+    Serve one /admin/profile request, independent of the web framework.
+
+    Args:
+        path: Part of the path after /admin/profile/, e.g. 'start'
+        params: Query parameters
+        headers: Request headers with lower-case names
+
+    Returns:
+        (status, content type, body, extra headers)
+    """
+    if not _authorized(params, headers):
+        return _json(403, {'error': 'forbidden'})
+
+    if path == 'start':
+        try:
+            seconds = min(float(params.get('seconds', 30)), MAX_SECONDS)
+            interval = max(float(params.get('interval_ms', 10)), 1.0) / 1000
+        except ValueError:
+            return _json(400, {'error': 'seconds and interval_ms must be numbers'})
+        profile = stack_sampler.start(seconds, interval)
+        if profile is None:
+            return _json(409, {'error': 'a sampling window is already running'})
+        return _json(202, profile.as_dict())
+
+    if path == 'allocations':
+        profile = allocation_profiler.arm(params.get('session') or None)
+        if profile is None:
+            return _json(409, {'error': 'an allocation capture is already pending or tracemalloc is in use'})
+        return _json(202, profile.as_dict())
+
+    if path in ('', 'list'):
+        return _json(200, {'profiles': store.list()})
+
+    if path == 'traces':
+        try:
+            limit = max(int(params.get('limit', 100)), 1)
+        except ValueError:
+            return _json(400, {'error': 'limit must be a whole number'})
+        return _json(200, {'spans': tracer.recent(limit, params.get('session') or None)})
+
+    if path == 'traces/summary':
+        return _json(200, {'summary': tracer.summary()})
+
+    if path.startswith('traces/'):
+        trace_id = path[len('traces/'):]
+        spans = tracer.trace(trace_id)
+        if not spans:
+            return _json(404, {'error': f"no buffered spans for trace {trace_id}"})
+        return _json(200, {'trace_id': trace_id, 'spans': [s.as_dict() for s in spans]})
+
+    profile = store.get(path)
+    if profile is None:
+        return _json(404, {'error': f"no profile {path}"})
+    if profile.status in ('armed', 'running'):
+        return _json(202, profile.as_dict())
+    extension = 'folded' if profile.kind == 'stacks' else 'txt'
+    return (200, 'text/plain; charset=utf-8', profile.content.encode('utf-8'),
+            {'content-disposition': f'attachment; filename="{profile.id}.{extension}"'})
+
+
+def profiler_route(asgi_app):
+    """
+    Wrap an ASGI app so /admin/profile requests go to handle().
+
+    Returns `asgi_app` itself when the profiler is disabled.
+    """
+    if not ENABLED:
+        return asgi_app
+
+    async def app(scope, receive, send):
+        path = scope.get('path', '')
+        if scope['type'] != 'http' or not (path == PREFIX or path.startswith(PREFIX + '/')):
+            await asgi_app(scope, receive, send)
+            return
+        params = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        status, content_type, body, extra_headers = handle(path[len(PREFIX):].strip('/'), params, headers)
+        response_headers = [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+        response_headers += [(name.encode(), value.encode()) for name, value in extra_headers.items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    logger.info(f"Profiler enabled at {PREFIX}")
+    return app
@@ -0,0 +1,184 @@
+# prompt_cache.py
+"""
+Prompt-prefix caching for the static agent system prompts.
+
+The chat agent's system prompt never changes between requests, so instead of
+resending it on every ReAct step we register it once per process with the
+Vertex AI context-caching API and hand the resulting cached content name to
+the model. Vertex only caches prefixes above a minimum size (4,096 tokens on
+Gemini 2.x, 32,768 on 1.5). A prompt below the minimum for its model is not
+padded to reach it: that would make every call carry, and pay for, far more
+context than the prompt itself. It is sent inline instead, and the reason is
+logged once per model.
+
+A local in-memory backend stands in for Vertex AI in tests. Its names are not
+real resources, so get_prompt_cache() never hands it to the app.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Optional
+
+logger = logging.getLogger('adk_chat.prompt_cache')
+
+# How long a cached prefix lives on the Vertex AI side
+DEFAULT_TTL_SECONDS = int(os.getenv('PROMPT_CACHE_TTL_SECONDS', '3600'))
+
+# Re-create the cache this many seconds before it expires so in-flight
+# requests never reference an expired entry
+REFRESH_MARGIN_SECONDS = 300
+
+# After a failed registration (e.g. prompt below the minimum cacheable size)
+# wait this long before trying again instead of failing on every session
+FAILURE_COOLDOWN_SECONDS = 600
+
+# Rough characters per token for English prose, used to check the minimum
+CHARS_PER_TOKEN = 4
+
+
+def min_cacheable_tokens(model_name: str) -> int:
+    """Smallest prefix Vertex AI context caching accepts for a model."""
+    configured = os.getenv('PROMPT_CACHE_MIN_TOKENS')
+    if configured:
+        return int(configured)
+    return 32768 if 'gemini-1.5' in model_name else 4096
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+class VertexContextCacheBackend:
+    """Registers cached content through the Vertex AI context-caching API."""
+
+    def create(self, model_name: str, system_instruction: str, ttl_seconds: int) -> str:
+        # Imported lazily so that importing this module stays cheap
+        from vertexai.preview import caching
+
+        cached_content = caching.CachedContent.create(
+            model_name=model_name,
+            system_instruction=system_instruction,
+            ttl=timedelta(seconds=ttl_seconds),
+            display_name=f"adk-chat-prefix-{_prompt_hash(system_instruction)}",
+        )
+        return cached_content.name
+
+
+class LocalContextCacheBackend:
+    """
+    In-memory stand-in for the Vertex AI context cache, for tests only.
+
+    The returned `local/cachedContents/...` names don't exist on Vertex AI,
+    so a PromptCache using this backend must never feed a real model.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Dict] = {}
+        self.create_calls = 0
+
+    def create(self, model_name: str, system_instruction: str, ttl_seconds: int) -> str:
+        self.create_calls += 1
+        name = f"local/cachedContents/{_prompt_hash(model_name + system_instruction)}"
+        self.entries[name] = {
+            'model_name': model_name,
+            'system_instruction': system_instruction,
+            'expire_time': time.time() + ttl_seconds,
+        }
+        return name
+
+
+class PromptCache:
+    """
+    Process-wide registry of cached prompt prefixes keyed by model and prompt.
+
+    Each (model, prompt) pair is registered once and reused by every session
+    until it is close to expiring.
+    """
+
+    def __init__(self, backend=None, ttl_seconds: int = DEFAULT_TTL_SECONDS, check_min_tokens: bool = True):
+        self.backend = backend if backend is not None else VertexContextCacheBackend()
+        self.ttl_seconds = ttl_seconds
+        self.check_min_tokens = check_min_tokens
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, model_name: str, system_instruction: str) -> Optional[str]:
+        """
+        Return the cached content name for a prompt, registering it if needed.
+
+        Args:
+            model_name: Model the cached content is bound to
+            system_instruction: The static system prompt to cache
+
+        Returns:
+            The cached content resource name, or None if caching is unavailable
+            (the caller should then send the prompt inline as before)
+        """
+        key = f"{model_name}:{_prompt_hash(system_instruction)}"
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry['name'] is None and now < entry['retry_after']:
+                    return None
+                if entry['name'] is not None and now < entry['expire_time'] - REFRESH_MARGIN_SECONDS:
+                    return entry['name']
+
+            tokens = estimate_tokens(system_instruction)
+            min_tokens = min_cacheable_tokens(model_name)
+            if self.check_min_tokens and tokens < min_tokens:
+                # The prompt is static, so this won't change until a redeploy
+                logger.info(f"Not caching the prompt prefix for {model_name}: ~{tokens} tokens is below the "
+                            f"{min_tokens} token context-caching minimum for this model; sending it inline")
+                self._entries[key] = {'name': None, 'retry_after': float('inf')}
+                return None
+
+            try:
+                name = self.backend.create(model_name, system_instruction, self.ttl_seconds)
+                self._entries[key] = {
+                    'name': name,
+                    'expire_time': now + self.ttl_seconds,
+                }
+                logger.info(f"Registered cached prompt prefix for {model_name}: {name}")
+                return name
+            except Exception as e:
+                logger.warning(f"Prompt prefix caching unavailable for {model_name}, sending prompt inline: {e}")
+                self._entries[key] = {
+                    'name': None,
+                    'retry_after': now + FAILURE_COOLDOWN_SECONDS,
+                }
+                return None
+
+
+def _prompt_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+_prompt_cache = None
+_prompt_cache_lock = threading.Lock()
+
+
+def get_prompt_cache() -> Optional[PromptCache]:
+    """
+    Get the shared prompt cache for this process.
+
+    PROMPT_CACHE_BACKEND is "vertex" (default) or "off" to disable caching.
+    The local backend is for tests only (construct a PromptCache with it
+    directly), since its names would be sent to the real model.
+    """
+    global _prompt_cache
+    backend_name = os.getenv('PROMPT_CACHE_BACKEND', 'vertex').lower()
+    if backend_name == 'off':
+        return None
+    if backend_name != 'vertex':
+        logger.warning(f"PROMPT_CACHE_BACKEND={backend_name} is not supported by the app, prompt caching is off")
+        return None
+
+    with _prompt_cache_lock:
+        if _prompt_cache is None:
+            _prompt_cache = PromptCache(backend=VertexContextCacheBackend())
+        return _prompt_cache
@@ -0,0 +1,237 @@
+# query_builder.py
+"""
+Canonical parameterized SQL for DataService reads.
+
+get_markdowns_data and get_irr_data take many optional filters. The builders
+here normalize the arguments ('60', 60 and 60.0 are the same department;
+'' means no filter; sort order is upper-cased), validate the sort column
+against an allowlist, and produce SQL whose text depends only on the filter
+*shape* — which filters are set, the sort and whether there is a limit —
+while the values travel as query parameters. That keeps BigQuery's result
+cache effective (same text, same parameters) and lets our caches key on the
+normalized arguments.
+
+Compiled SQL text is cached per (table, shape).
+"""
+import logging
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from irr_rollup import IRR_TABLE
+
+logger = logging.getLogger('adk_chat.query_builder')
+
+# Fully qualified markdown table/view (project.dataset.table)
+MARKDOWNS_TABLE = os.getenv('MARKDOWNS_TABLE')
+
+# Row cap used when limit_rows=True
+DEFAULT_ROW_LIMIT = 1000
+
+MARKDOWN_COLUMNS = [
+    'Store_Nbr', 'Dept_Nbr', 'item_nbr', 'Description', 'MD_Desc', 'CID', 'MUMD_DT',
+    'prev_retail', 'new_retail', 'MD_QTY', 'MUMD_AMT', 'Markdown_Percent',
+    'Calendar_Year', 'Calendar_Month',
+]
+IRR_COLUMNS = [
+    'Store_Nbr', 'City_State', 'Dept_Nbr', 'DEPT_DESC', 'Calendar_Year', 'Calendar_Month',
+    'Purchases', 'Markdowns', 'Sales', 'Book', 'SKU', 'Book_vs_SKU',
+]
+
+# Only these columns may appear in ORDER BY
+MARKDOWN_SORT_COLUMNS = frozenset([
+    'MUMD_AMT', 'MUMD_DT', 'MD_QTY', 'Markdown_Percent', 'prev_retail', 'new_retail',
+    'item_nbr', 'Dept_Nbr', 'Store_Nbr', 'CID', 'MD_Desc',
+])
+SORT_ORDERS = ('ASC', 'DESC')
+
+# Filter name -> (column, BigQuery parameter type), in canonical order
+MARKDOWN_FILTERS = {
+    'store_nbr': ('Store_Nbr', 'INT64'),
+    'dept_nbr': ('Dept_Nbr', 'INT64'),
+    'item_nbr': ('item_nbr', 'INT64'),
+    'cid': ('CID', 'INT64'),
+    'md_desc': ('MD_Desc', 'STRING'),
+}
+IRR_FILTERS = {
+    'store_nbr': ('Store_Nbr', 'INT64'),
+    'dept_nbr': ('Dept_Nbr', 'INT64'),
+}
+
+
+@dataclass(frozen=True)
+class BuiltQuery:
+    """A normalized DataService call and its parameterized SQL."""
+    name: str
+    args: Dict[str, Any]
+    sql: Optional[str] = None  # None when the source table isn't configured
+    params: Tuple[Tuple[str, str, Any], ...] = field(default=())  # (name, type, value)
+
+    @property
+    def cache_key(self) -> Tuple:
+        """Key shared by every call that asks for the same logical query."""
+        return (self.name,) + tuple(sorted(self.args.items()))
+
+    @property
+    def shape(self) -> Tuple:
+        """Filter shape: which filters are set, plus sort and limit."""
+        return (self.name,) + tuple(sorted(name for name, value in self.args.items() if value is not None))
+
+    def job_config(self):
+        """bigquery.QueryJobConfig carrying the query parameters."""
+        from google.cloud import bigquery
+        return bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter(name, param_type, value) for name, param_type, value in self.params
+        ])
+
+
+def _to_int(value) -> Optional[int]:
+    """
+    Normalize an ID filter: None/'' -> None, '60'/60/60.0 -> 60.
+
+    Strings must be plain digits, as app.py requires for item numbers; no
+    float parsing, so '12.5' or '1e3' is rejected rather than truncated.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        if not (value.isascii() and value.isdigit()):
+            raise ValueError(f"Expected a whole number, got {value!r}")
+        return int(value)
+    if isinstance(value, bool):
+        raise ValueError(f"Expected a whole number, got {value!r}")
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"Expected a whole number, got {value!r}")
+        return int(value)
+    return int(value)
+
+
+def _to_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _to_limit(limit_rows) -> Optional[int]:
+    if limit_rows is True:
+        return DEFAULT_ROW_LIMIT
+    if not limit_rows:
+        return None
+    return int(limit_rows)
+
+
+def _where(filters: Dict[str, tuple], present: Tuple[str, ...]) -> str:
+    clauses = [f"{filters[name][0]} = @{name}" for name in present]
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+@lru_cache(maxsize=256)
+def _compile_markdowns(table: str, present: Tuple[str, ...], sort_column: str, sort_order: str,
+                       has_limit: bool) -> str:
+    logger.info(f"Compiling markdowns query plan: filters={present}, sort={sort_column} {sort_order}, "
+                f"limit={has_limit}")
+    sql = (f"SELECT {', '.join(MARKDOWN_COLUMNS)}\n"
+           f"FROM `{table}`\n"
+           f"{_where(MARKDOWN_FILTERS, present)}\n"
+           f"ORDER BY {sort_column} {sort_order}")
+    if has_limit:
+        sql += "\nLIMIT @limit_rows"
+    return sql
+
+
+@lru_cache(maxsize=64)
+def _compile_irr(table: str, present: Tuple[str, ...], current_month_only: bool) -> str:
+    logger.info(f"Compiling IRR query plan: filters={present}, current_month_only={current_month_only}")
+    where = _where(IRR_FILTERS, present)
+    if current_month_only:
+        # Latest month loaded for the same filters, not the calendar month,
+        # so the table still shows data before this month's load lands
+        latest = (f"DATE(Calendar_Year, Calendar_Month, 1) = "
+                  f"(SELECT MAX(DATE(Calendar_Year, Calendar_Month, 1)) FROM `{table}` {where})")
+    else:
+        latest = ("DATE(Calendar_Year, Calendar_Month, 1) >= "
+                  "DATE_SUB(DATE_TRUNC(CURRENT_DATE(), MONTH), INTERVAL 12 MONTH)")
+    where = f"{where} AND {latest}" if where else f"WHERE {latest}"
+    return (f"SELECT {', '.join(IRR_COLUMNS)}\n"
+            f"FROM `{table}`\n"
+            f"{where}\n"
+            f"ORDER BY Calendar_Year, Calendar_Month, Dept_Nbr")
+
+
+def build_markdowns_query(store_nbr=None, dept_nbr=None, item_nbr=None, cid=None, md_desc=None,
+                          sort_column='MUMD_AMT', sort_order='ASC', limit_rows=True) -> BuiltQuery:
+    """
+    Normalize get_markdowns_data arguments and build its SQL.
+
+    Raises:
+        ValueError: for a sort column outside the allowlist, a bad sort order
+            or a non-integer ID filter
+    """
+    sort_column = sort_column or 'MUMD_AMT'
+    if sort_column not in MARKDOWN_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {sort_column}")
+    sort_order = (sort_order or 'ASC').upper()
+    if sort_order not in SORT_ORDERS:
+        raise ValueError(f"Unsupported sort order: {sort_order}")
+
+    args = {
+        'store_nbr': _to_int(store_nbr),
+        'dept_nbr': _to_int(dept_nbr),
+        'item_nbr': _to_int(item_nbr),
+        'cid': _to_int(cid),
+        'md_desc': _to_str(md_desc),
+        'sort_column': sort_column,
+        'sort_order': sort_order,
+        'limit_rows': _to_limit(limit_rows),
+    }
+    if not MARKDOWNS_TABLE:
+        return BuiltQuery('get_markdowns_data', args)
+
+    present = tuple(name for name in MARKDOWN_FILTERS if args[name] is not None)
+    params = tuple((name, MARKDOWN_FILTERS[name][1], args[name]) for name in present)
+    if args['limit_rows'] is not None:
+        params += (('limit_rows', 'INT64', args['limit_rows']),)
+    sql = _compile_markdowns(MARKDOWNS_TABLE, present, sort_column, sort_order, args['limit_rows'] is not None)
+    return BuiltQuery('get_markdowns_data', args, sql, params)
+
+
+def build_irr_query(store_nbr=None, dept_nbr=None, current_month_only=False) -> BuiltQuery:
+    """
+    Normalize get_irr_data arguments and build its SQL.
+
+    Raises:
+        ValueError: for a non-integer store or department
+    """
+    args = {
+        'store_nbr': _to_int(store_nbr),
+        'dept_nbr': _to_int(dept_nbr),
+        'current_month_only': bool(current_month_only),
+    }
+    if not IRR_TABLE:
+        return BuiltQuery('get_irr_data', args)
+
+    present = tuple(name for name in IRR_FILTERS if args[name] is not None)
+    params = tuple((name, IRR_FILTERS[name][1], args[name]) for name in present)
+    sql = _compile_irr(IRR_TABLE, present, args['current_month_only'])
+    return BuiltQuery('get_irr_data', args, sql, params)
+
+
+# DataService method -> builder
+QUERY_BUILDERS = {
+    'get_markdowns_data': build_markdowns_query,
+    'get_irr_data': build_irr_query,
+}
+
+
+def plan_cache_info() -> Dict[str, Any]:
+    """Hit/miss counts of the compiled SQL caches."""
+    return {
+        'get_markdowns_data': _compile_markdowns.cache_info()._asdict(),
+        'get_irr_data': _compile_irr.cache_info()._asdict(),
+    }
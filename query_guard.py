@@ -0,0 +1,185 @@
+# query_guard.py
+"""
+Cost and latency guardrails for DataService queries.
+
+Every built query (see query_builder.py) is dry-run first to get BigQuery's
+bytes-scanned estimate:
+
+- over QUERY_MAX_BYTES the query is rejected with QueryTooExpensiveError
+- over QUERY_SOFT_BYTES a row limit is applied automatically if the caller
+  didn't set one (LIMIT doesn't reduce bytes scanned, but it caps what we
+  transfer and hold in memory for a query already known to be large)
+
+The real job also carries maximum_bytes_billed, so BigQuery itself refuses a
+query whose estimate was wrong. Estimated vs actual bytes and latency are
+recorded per query shape and exposed via stats().
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from bq_arrow import query_to_dataframe
+from clients import registry
+from metrics import metrics
+from query_builder import DEFAULT_ROW_LIMIT, QUERY_BUILDERS, BuiltQuery
+
+logger = logging.getLogger('adk_chat.query_guard')
+
+GIB = 1024 ** 3
+
+# Hard budget: queries estimated above this are rejected
+MAX_BYTES = int(float(os.getenv('QUERY_MAX_BYTES', 50 * GIB)))
+# Soft budget: queries above this get a row limit if they have none
+SOFT_BYTES = int(float(os.getenv('QUERY_SOFT_BYTES', 5 * GIB)))
+
+# Dry-run estimates only change when the tables are reloaded
+ESTIMATE_TTL_SECONDS = 3600
+
+BIGQUERY_QUERIES = metrics.counter('bigquery_queries_total', "Built DataService queries", ['name', 'outcome'])
+BIGQUERY_AUTO_LIMITED = metrics.counter(
+    'bigquery_auto_limited_total', "Queries given a row limit for being over the soft budget", ['name'])
+BIGQUERY_BYTES = metrics.counter('bigquery_bytes_processed_total', "Bytes processed by built queries", ['name'])
+BIGQUERY_SECONDS = metrics.histogram('bigquery_query_seconds', "Duration of built queries", ['name'])
+
+
+class QueryTooExpensiveError(Exception):
+    """Raised when a query's dry-run estimate is over the byte budget."""
+
+    def __init__(self, query: BuiltQuery, estimated_bytes: int, budget_bytes: int):
+        self.query = query
+        self.estimated_bytes = estimated_bytes
+        self.budget_bytes = budget_bytes
+        super().__init__(
+            f"This query would scan {estimated_bytes / GIB:.1f} GiB, over the "
+            f"{budget_bytes / GIB:.1f} GiB limit. Please add a store, department or item filter."
+        )
+
+
+class _ShapeStats:
+    """Running totals for one query shape."""
+
+    def __init__(self):
+        self.queries = 0
+        self.rejected = 0
+        self.auto_limited = 0
+        self.estimated_bytes = 0
+        self.actual_bytes = 0
+        self.cache_hits = 0
+        self.dry_run_seconds = 0.0
+        self.query_seconds = 0.0
+        self.max_query_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        executed = self.queries - self.rejected
+        return {
+            'queries': self.queries,
+            'rejected': self.rejected,
+            'auto_limited': self.auto_limited,
+            'estimated_gib': round(self.estimated_bytes / GIB, 3),
+            'actual_gib': round(self.actual_bytes / GIB, 3),
+            # Actual over estimated; below 1 usually means result-cache hits
+            'actual_vs_estimate': round(self.actual_bytes / self.estimated_bytes, 3) if self.estimated_bytes else None,
+            'cache_hits': self.cache_hits,
+            'avg_dry_run_ms': round(self.dry_run_seconds / self.queries * 1000, 1) if self.queries else None,
+            'avg_query_seconds': round(self.query_seconds / executed, 3) if executed else None,
+            'max_query_seconds': round(self.max_query_seconds, 3),
+        }
+
+
+class QueryGuard:
+    """Dry-runs, budgets and records built DataService queries."""
+
+    def __init__(self, max_bytes: int = MAX_BYTES, soft_bytes: int = SOFT_BYTES):
+        self.max_bytes = max_bytes
+        self.soft_bytes = soft_bytes
+        self._estimates: Dict[tuple, tuple] = {}  # cache_key -> (estimated_at, bytes)
+        self._stats = defaultdict(_ShapeStats)
+        self._lock = threading.Lock()
+
+    def estimate_bytes(self, query: BuiltQuery) -> int:
+        """Bytes the query would scan, from a (cached) dry run."""
+        with self._lock:
+            cached = self._estimates.get(query.cache_key)
+        if cached is not None and time.monotonic() - cached[0] < ESTIMATE_TTL_SECONDS:
+            return cached[1]
+
+        job_config = query.job_config()
+        job_config.dry_run = True
+        job_config.use_query_cache = False
+        job = registry.get('bigquery').query(query.sql, job_config=job_config)
+        estimated = job.total_bytes_processed or 0
+        with self._lock:
+            self._estimates[query.cache_key] = (time.monotonic(), estimated)
+        return estimated
+
+    def _check(self, query: BuiltQuery, stats: _ShapeStats):
+        """Return the query to run (possibly down-scoped) and its estimate."""
+        start_time = time.perf_counter()
+        estimated = self.estimate_bytes(query)
+        elapsed = time.perf_counter() - start_time
+        with self._lock:
+            stats.dry_run_seconds += elapsed
+
+        if estimated > self.max_bytes:
+            with self._lock:
+                stats.rejected += 1
+            BIGQUERY_QUERIES.inc(name=query.name, outcome='rejected')
+            logger.warning(f"Rejected {query.name} {query.shape}: estimated {estimated / GIB:.2f} GiB "
+                           f"> budget {self.max_bytes / GIB:.2f} GiB")
+            raise QueryTooExpensiveError(query, estimated, self.max_bytes)
+
+        if estimated > self.soft_bytes and query.args.get('limit_rows', 0) is None:
+            with self._lock:
+                stats.auto_limited += 1
+            BIGQUERY_AUTO_LIMITED.inc(name=query.name)
+            logger.info(f"Auto-limiting {query.name} to {DEFAULT_ROW_LIMIT} rows: "
+                        f"estimated {estimated / GIB:.2f} GiB")
+            query = QUERY_BUILDERS[query.name](**{**query.args, 'limit_rows': DEFAULT_ROW_LIMIT})
+        return query, estimated
+
+    def run(self, query: BuiltQuery, dtype_plan: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+        """
+        Dry-run, budget-check and run a built query.
+
+        Raises:
+            QueryTooExpensiveError: if the estimate is over the hard budget
+        """
+        with self._lock:
+            stats = self._stats[query.shape]
+            stats.queries += 1
+
+        query, estimated = self._check(query, stats)
+
+        job_config = query.job_config()
+        job_config.maximum_bytes_billed = self.max_bytes
+        job_stats = {}
+        start_time = time.perf_counter()
+        df = query_to_dataframe(query.sql, job_config, dtype_plan=dtype_plan, job_stats=job_stats)
+        elapsed = time.perf_counter() - start_time
+
+        actual = job_stats.get('bytes_processed') or 0
+        with self._lock:
+            stats.estimated_bytes += estimated
+            stats.actual_bytes += actual
+            stats.cache_hits += bool(job_stats.get('cache_hit'))
+            stats.query_seconds += elapsed
+            stats.max_query_seconds = max(stats.max_query_seconds, elapsed)
+        BIGQUERY_QUERIES.inc(name=query.name, outcome='cache_hit' if job_stats.get('cache_hit') else 'ok')
+        BIGQUERY_BYTES.inc(actual, name=query.name)
+        BIGQUERY_SECONDS.observe(elapsed, name=query.name)
+        logger.info(f"{query.name} {query.shape}: estimated {estimated / GIB:.3f} GiB, actual "
+                    f"{actual / GIB:.3f} GiB, cache_hit={job_stats.get('cache_hit')}, {elapsed:.2f}s")
+        return df
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Estimated vs actual bytes and latency per query shape."""
+        with self._lock:
+            return {' '.join(map(str, shape)): stats.as_dict() for shape, stats in self._stats.items()}
+
+
+query_guard = QueryGuard()
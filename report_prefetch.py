@@ -0,0 +1,76 @@
+# report_prefetch.py
+"""
+Background prefetch of recommended Custom Reports.
+
+When the chat recommends a report and has already extracted its parameters
+(store, dept, item), the user almost always opens that report next. We start
+its DataService query in the background so the result is waiting in the
+shared data cache by the time they get there.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from data_cache import CachingDataService, SharedDataCache, caching_data_service, shared_data_cache
+
+logger = logging.getLogger('adk_chat.report_prefetch')
+
+
+class ReportPrefetcher:
+    """Runs deduplicated background prefetches into the shared data cache."""
+
+    def __init__(self, cache: SharedDataCache = shared_data_cache, max_workers: int = 2):
+        self.cache = cache
+        # Small pool: prefetches are opportunistic and must not crowd out
+        # foreground queries
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report-prefetch')
+
+    def prefetch(self, recommendation: Dict[str, Any]) -> bool:
+        """
+        Start prefetching the query behind a report recommendation.
+
+        Args:
+            recommendation: A ReportRecommender recommendation dict
+
+        Returns:
+            True if a prefetch was started, False if there was nothing to do
+            (no query for the report, no parameters, or already cached/loading)
+        """
+        query_spec = recommendation.get('query')
+        params = recommendation.get('extracted_params') or {}
+        if not query_spec:
+            return False
+
+        kwargs = dict(query_spec.get('defaults', {}))
+        kwargs.update({name: params.get(name) for name in query_spec['params']})
+        if not any(kwargs.get(name) is not None for name in query_spec['params']):
+            return False
+
+        method = query_spec['method']
+        try:
+            key = CachingDataService.cache_key(method, kwargs)
+        except ValueError as e:
+            # e.g. a non-numeric CID extracted from the question
+            logger.info(f"Prefetch skipped, invalid parameters for {recommendation['report_name']}: {e}")
+            return False
+        if self.cache.is_cached_or_loading(key):
+            logger.info(f"Prefetch skipped, {recommendation['report_name']} already cached or loading")
+            return False
+
+        logger.info(f"Prefetching {recommendation['report_name']} with {kwargs}")
+        self.executor.submit(self._run, method, kwargs)
+        return True
+
+    def _run(self, method: str, kwargs: Dict[str, Any]):
+        try:
+            # Same wrapper the dashboard uses, so the frame is compacted and
+            # cached under the same key
+            data_service = caching_data_service(self.cache)
+            getattr(data_service, method)(**kwargs)
+            logger.info(f"Prefetch of {method} complete")
+        except Exception as e:
+            # A failed prefetch just means the report loads normally later
+            logger.warning(f"Prefetch of {method} failed: {e}")
+
+
+report_prefetcher = ReportPrefetcher()
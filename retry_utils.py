@@ -0,0 +1,281 @@
+# retry_utils.py
+"""
+Retry/backoff helpers for calls to Vertex AI.
+
+Errors are classified into typed kinds, transient ones are retried with
+jittered exponential backoff, and a per-process circuit breaker stops us from
+hammering Vertex AI while it is failing. Retries are applied around single
+LLM or tool calls, not around the whole agent run.
+"""
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, FrozenSet, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger('adk_chat.retry')
+
+RETRIES = metrics.counter('retries_total', "Retried Vertex AI calls", ['breaker', 'kind'])
+CALL_ERRORS = metrics.counter('call_errors_total', "Vertex AI calls that failed after retries", ['breaker', 'kind'])
+
+
+class ErrorKind(Enum):
+    """Typed classification of errors raised by Vertex AI calls."""
+    QUOTA = "quota"
+    TIMEOUT = "timeout"
+    UNAVAILABLE = "unavailable"
+    SAFETY = "safety"
+    PERMISSION = "permission"
+    NETWORK_POLICY = "network_policy"
+    CIRCUIT_OPEN = "circuit_open"
+    OTHER = "other"
+
+
+# Kinds worth retrying with the same input
+TRANSIENT_KINDS = frozenset({ErrorKind.QUOTA, ErrorKind.TIMEOUT, ErrorKind.UNAVAILABLE})
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited because the breaker is open."""
+
+
+def _exception_chain(exc: BaseException):
+    """The exception and the ones it was raised from, outermost first."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status of a Google API or HTTP client error, if it carries one."""
+    for candidate in (getattr(exc, 'code', None), getattr(exc, 'status_code', None),
+                      getattr(getattr(exc, 'response', None), 'status_code', None)):
+        if isinstance(candidate, int) and not isinstance(candidate, bool):
+            return candidate
+    return None
+
+
+# HTTP status -> kind, for errors that carry a status but aren't Google API types
+_STATUS_KINDS = {
+    429: ErrorKind.QUOTA,
+    408: ErrorKind.TIMEOUT,
+    504: ErrorKind.TIMEOUT,
+    500: ErrorKind.UNAVAILABLE,
+    502: ErrorKind.UNAVAILABLE,
+    503: ErrorKind.UNAVAILABLE,
+    401: ErrorKind.PERMISSION,
+    403: ErrorKind.PERMISSION,
+}
+
+
+def classify_error(exc: BaseException) -> ErrorKind:
+    """
+    Classify an exception raised by a Vertex AI call.
+
+    Google API exception types and HTTP status codes are checked first, on the
+    exception and the ones it was raised from. LangChain and the Vertex SDK
+    wrap some failures (notably safety blocks) in plain exceptions, so the
+    message is used as a fallback, matching exception names and phrases
+    rather than bare numbers.
+    """
+    if isinstance(exc, CircuitOpenError):
+        return ErrorKind.CIRCUIT_OPEN
+
+    message = str(exc)
+    lowered = message.lower()
+
+    # VPC Service Controls violations arrive as PermissionDenied
+    if "vpcservicecontrols" in lowered or "vpc service controls" in lowered:
+        return ErrorKind.NETWORK_POLICY
+
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:
+        google_exceptions = None
+
+    for cause in _exception_chain(exc):
+        kind = _classify_type(cause, google_exceptions)
+        if kind is not None:
+            return kind
+
+    if "SAFETY" in message or "blocked" in lowered or "finish_reason" in lowered:
+        return ErrorKind.SAFETY
+    if "ResourceExhausted" in message or "TooManyRequests" in message or "quota" in lowered:
+        return ErrorKind.QUOTA
+    if "timeout" in lowered or "deadline" in lowered:
+        return ErrorKind.TIMEOUT
+    if "ServiceUnavailable" in message or "service unavailable" in lowered:
+        return ErrorKind.UNAVAILABLE
+    if "PermissionDenied" in message or "permission" in lowered:
+        return ErrorKind.PERMISSION
+
+    return ErrorKind.OTHER
+
+
+def _classify_type(exc: BaseException, google_exceptions) -> Optional[ErrorKind]:
+    if google_exceptions is not None:
+        if isinstance(exc, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+            return ErrorKind.QUOTA
+        if isinstance(exc, (google_exceptions.DeadlineExceeded, google_exceptions.GatewayTimeout)):
+            return ErrorKind.TIMEOUT
+        if isinstance(exc, (google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError,
+                            google_exceptions.BadGateway, google_exceptions.Aborted)):
+            return ErrorKind.UNAVAILABLE
+        if isinstance(exc, (google_exceptions.PermissionDenied, google_exceptions.Forbidden,
+                            google_exceptions.Unauthenticated)):
+            return ErrorKind.PERMISSION
+
+    if isinstance(exc, TimeoutError):
+        return ErrorKind.TIMEOUT
+    if isinstance(exc, ConnectionError):
+        return ErrorKind.UNAVAILABLE
+    return _STATUS_KINDS.get(_status_code(exc))
+
+
+@dataclass
+class RetryPolicy:
+    """Jittered exponential backoff settings."""
+    max_attempts: int = 3
+    base_delay: float = 0.5  # seconds
+    max_delay: float = 8.0  # seconds
+    quota_multiplier: float = 2.0  # back off harder on quota errors
+    retry_on: FrozenSet[ErrorKind] = field(default_factory=lambda: TRANSIENT_KINDS)
+
+    def backoff(self, attempt: int, kind: ErrorKind) -> float:
+        """Full-jitter delay before retry number `attempt` (1-based)."""
+        ceiling = self.base_delay * (2 ** (attempt - 1))
+        if kind is ErrorKind.QUOTA:
+            ceiling *= self.quota_multiplier
+        return random.uniform(0, min(self.max_delay, ceiling))
+
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker.
+
+    Opens after `failure_threshold` consecutive transient failures, rejects
+    calls for `reset_timeout` seconds, then lets a single probe call through
+    (half-open) to decide whether to close again. Other callers are rejected
+    while the probe is in flight. A probe that fails for a non-transient
+    reason (safety block, bad request) says nothing either way, so the next
+    caller becomes the probe.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.probe_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if calls are currently being rejected."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"Circuit '{self.name}' is open; Vertex AI is temporarily unavailable")
+                self.state = self.HALF_OPEN
+                logger.info(f"Circuit '{self.name}' half-open, allowing a probe call")
+            if self.state == self.HALF_OPEN:
+                # A probe that never reported back (e.g. its thread died) stops
+                # blocking after reset_timeout
+                if self.probe_in_flight and now - self.probe_started_at < self.reset_timeout:
+                    raise CircuitOpenError(f"Circuit '{self.name}' is half-open and waiting for its probe call")
+                self.probe_in_flight = True
+                self.probe_started_at = now
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self, kind: ErrorKind):
+        with self._lock:
+            self.probe_in_flight = False
+            # Only service-side trouble trips the breaker; bad prompts and
+            # safety blocks say nothing about Vertex AI's health
+            if kind not in TRANSIENT_KINDS:
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {self.failures} failure(s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+# Shared breakers for the process
+vertex_ai_breaker = CircuitBreaker('vertex_ai')
+vertex_search_breaker = CircuitBreaker('vertex_ai_search')
+metrics.gauge_callback(
+    'circuit_breaker_open', "1 while a circuit breaker is rejecting calls",
+    lambda: {breaker.name: int(breaker.state == CircuitBreaker.OPEN)
+             for breaker in (vertex_ai_breaker, vertex_search_breaker)},
+    ['breaker'],
+)
+
+DEFAULT_POLICY = RetryPolicy()
+
+
+def call_with_retry(func: Callable, *args, policy: Optional[RetryPolicy] = None,
+                    breaker: Optional[CircuitBreaker] = None, operation: str = "call", **kwargs):
+    """
+    Call `func` with retries on transient errors.
+
+    Args:
+        func: The single LLM or tool call to make
+        policy: Backoff settings (defaults to DEFAULT_POLICY)
+        breaker: Optional circuit breaker guarding the call
+        operation: Name used in log messages
+
+    Returns:
+        Whatever `func` returns
+
+    Raises:
+        CircuitOpenError if the breaker is open, otherwise the last error
+    """
+    policy = policy or DEFAULT_POLICY
+    attempt = 0
+
+    while True:
+        attempt += 1
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            kind = classify_error(e)
+            if breaker is not None:
+                breaker.record_failure(kind)
+            breaker_name = breaker.name if breaker is not None else 'none'
+            if kind not in policy.retry_on or attempt >= policy.max_attempts:
+                CALL_ERRORS.inc(breaker=breaker_name, kind=kind.value)
+                raise
+            RETRIES.inc(breaker=breaker_name, kind=kind.value)
+            delay = policy.backoff(attempt, kind)
+            logger.warning(f"{operation} failed with {kind.value} error (attempt {attempt}/{policy.max_attempts}), "
+                           f"retrying in {delay:.2f}s: {e}")
+            time.sleep(delay)
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
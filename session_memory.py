@@ -0,0 +1,232 @@
+# session_memory.py
+"""
+Memory accounting and caps for per-session state.
+
+Every Shiny session keeps its own `session.cache` (Store 1 IRR frame, store
+and department lists), a chat transcript and, once it has chatted, an agent
+with conversation memory. The registry here tracks each session's deep size
+and when it was last active:
+
+- sizes are recomputed when the session writes its cache or finishes a chat
+  turn, so accounting costs nothing on cache hits
+- objects the shared data cache also holds (data_cache.py) are not counted:
+  a session's `store_1_data` is usually the very frame the shared cache
+  returned, which clearing the session cache would not free. They show up
+  once, in data_cache_bytes
+- activity is recorded from the session's root tracing spans (see tracing.py)
+- when the total passes SESSION_MEMORY_BUDGET_MB (default 512), the caches
+  of the least recently active other sessions that hold memory of their own
+  are cleared until the total is back under the budget. A cleared cache is
+  simply refetched, usually from the shared data cache, on the session's
+  next interaction
+- the agent's conversation memory is trimmed to its window. The LangChain
+  window memory only limits what is sent to the model, it keeps every message
+- everything is released when the session ends
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from data_cache import shared_data_cache
+from frame_dtypes import frame_memory_bytes
+from metrics import metrics
+from tracing import Span, tracer
+
+logger = logging.getLogger('adk_chat.session_memory')
+
+SESSION_MEMORY_BUDGET_BYTES = int(float(os.getenv('SESSION_MEMORY_BUDGET_MB', 512)) * 1024 * 1024)
+
+# Caches holding less than this of their own (typically shared frames plus
+# the store and department lists) aren't worth clearing: it frees next to
+# nothing and the session has to refetch
+MIN_EVICTION_BYTES = 64 * 1024
+
+SESSION_CACHE_EVICTIONS = metrics.counter(
+    'session_cache_evictions_total', "Session caches cleared to stay under the memory budget")
+
+
+def deep_sizeof(obj: Any, _seen: Optional[set] = None) -> int:
+    """Approximate deep size in bytes of DataFrames, containers and strings."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        if isinstance(obj, pd.Series):
+            return int(obj.memory_usage(index=True, deep=True))
+        return frame_memory_bytes(obj)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, _seen) + deep_sizeof(value, _seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, _seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        # LangChain messages and similar plain objects
+        size += deep_sizeof(vars(obj), _seen)
+    return size
+
+
+@dataclass
+class SessionState:
+    """What the registry knows about one session."""
+    session_id: str
+    cache: Dict[str, Any]
+    transcript: Callable[[], List[Dict]]
+    cache_bytes: int = 0
+    transcript_bytes: int = 0
+    agent_memory_bytes: int = 0
+    last_active: float = 0.0
+    evictions: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self.cache_bytes + self.transcript_bytes + self.agent_memory_bytes
+
+
+def clear_session_cache(cache: Dict[str, Any]):
+    """Drop cached values (and their timestamps) but keep settings like CACHE_TTL."""
+    for key, value in cache.items():
+        if key != 'CACHE_TTL' and value is not None:
+            cache[key] = None
+
+
+def trim_chat_memory(chat_memory) -> int:
+    """Cut a window memory's message list down to its window; returns messages removed."""
+    messages = getattr(getattr(chat_memory, 'chat_memory', None), 'messages', None)
+    window = getattr(chat_memory, 'k', None)
+    if not messages or not window or len(messages) <= window * 2:
+        return 0
+    removed = len(messages) - window * 2
+    del messages[:removed]
+    return removed
+
+
+class SessionMemoryRegistry:
+    """Per-session sizes, last activity and the global budget."""
+
+    def __init__(self, budget_bytes: int = SESSION_MEMORY_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._sessions: Dict[str, SessionState] = {}
+        self._lock = threading.Lock()
+        # Root spans carry the session ID, so they double as activity pings
+        tracer.root_hooks.append(self)
+
+    def register(self, session_id: str, cache: Dict[str, Any], transcript: Callable[[], List[Dict]]):
+        """
+        Start tracking a session.
+
+        Args:
+            session_id: Shiny session ID
+            cache: The session's `session.cache` dict
+            transcript: Zero-argument callable returning the chat messages
+        """
+        with self._lock:
+            self._sessions[session_id] = SessionState(session_id, cache, transcript, last_active=time.monotonic())
+
+    def unregister(self, session_id: str):
+        """Forget a session and clear its cache."""
+        with self._lock:
+            state = self._sessions.pop(session_id, None)
+        if state is not None:
+            clear_session_cache(state.cache)
+            logger.info(f"Session {session_id} ended, released ~{state.total_bytes / 1024:.0f} KiB")
+
+    def on_root_start(self, root: Span):
+        state = self._sessions.get(root.session_id)
+        if state is not None:
+            state.last_active = time.monotonic()
+
+    def on_root_finish(self, root: Span):
+        pass
+
+    def update(self, session_id: str, chat_memory=None):
+        """
+        Re-measure a session after its cache or transcript changed, then
+        enforce the budget.
+
+        Args:
+            session_id: Shiny session ID
+            chat_memory: The session's agent memory, trimmed to its window
+        """
+        state = self._sessions.get(session_id)
+        if state is None:
+            return
+        if chat_memory is not None:
+            trim_chat_memory(chat_memory)
+            state.agent_memory_bytes = deep_sizeof(getattr(chat_memory, 'chat_memory', chat_memory))
+        # Seeding the seen set with the shared cache's values counts them as zero
+        state.cache_bytes = deep_sizeof(state.cache, shared_data_cache.value_ids())
+        try:
+            state.transcript_bytes = deep_sizeof(state.transcript())
+        except Exception as e:
+            logger.debug(f"Could not measure transcript of session {session_id}: {e}")
+        state.last_active = time.monotonic()
+        self._enforce_budget(keep=session_id)
+
+    def _enforce_budget(self, keep: str):
+        with self._lock:
+            total = sum(s.total_bytes for s in self._sessions.values())
+            if total <= self.budget_bytes:
+                return
+            # Least recently active first; the session being served is never evicted
+            candidates = sorted((s for s in self._sessions.values()
+                                 if s.session_id != keep and s.cache_bytes >= MIN_EVICTION_BYTES),
+                                key=lambda s: s.last_active)
+        freed = 0
+        evicted = 0
+        for state in candidates:
+            if total - freed <= self.budget_bytes:
+                break
+            clear_session_cache(state.cache)
+            freed += state.cache_bytes
+            state.cache_bytes = 0
+            state.evictions += 1
+            evicted += 1
+        SESSION_CACHE_EVICTIONS.inc(evicted)
+        if total - freed > self.budget_bytes:
+            logger.warning(f"Session memory {(total - freed) / 1024 ** 2:.0f} MB still over the "
+                           f"{self.budget_bytes / 1024 ** 2:.0f} MB budget after clearing {evicted} session caches")
+        else:
+            logger.info(f"Cleared {evicted} idle session caches ({freed / 1024 ** 2:.1f} MB) to stay under "
+                        f"the {self.budget_bytes / 1024 ** 2:.0f} MB budget")
+
+    def usage(self) -> List[Dict[str, Any]]:
+        """Per-session sizes, largest first."""
+        now = time.monotonic()
+        with self._lock:
+            states = list(self._sessions.values())
+        return [{
+            'session_id': s.session_id,
+            'cache_bytes': s.cache_bytes,
+            'transcript_bytes': s.transcript_bytes,
+            'agent_memory_bytes': s.agent_memory_bytes,
+            'idle_seconds': round(now - s.last_active, 1),
+            'evictions': s.evictions,
+        } for s in sorted(states, key=lambda s: s.total_bytes, reverse=True)]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def total_bytes(self) -> Dict[str, int]:
+        """Accounted bytes by kind of state."""
+        with self._lock:
+            states = list(self._sessions.values())
+        return {
+            'cache': sum(s.cache_bytes for s in states),
+            'transcript': sum(s.transcript_bytes for s in states),
+            'agent_memory': sum(s.agent_memory_bytes for s in states),
+        }
+
+
+session_memory = SessionMemoryRegistry()
+
+metrics.gauge_callback('sessions_active', "Shiny sessions being tracked", lambda: len(session_memory))
+metrics.gauge_callback('session_memory_bytes', "Accounted per-session memory, by kind of state",
+                       session_memory.total_bytes, ['kind'])
@@ -6,6 +6,8 @@ setup(
     packages=find_packages(),
     install_requires=[
         'flask==3.0.0',
+        'fastapi>=0.100.0',
+        'uvicorn>=0.23.0',
         'google-cloud-aiplatform>=1.36.0',
         'vertexai>=0.0.1',
         'pandas>=2.1.0',
@@ -0,0 +1,149 @@
+"""
+ASGI port of the chat backend in app.py.
+
+Serves the same routes (/, /health, /test, /chat, /chat/stream) with the
+same JSON and SSE responses; both route modules are thin adapters over
+utils/chat_service.py. Model calls are awaited with
+send_message_async instead of blocking a worker thread. One process can
+then hold hundreds of in-flight chat requests, each costing a coroutine
+rather than a thread. Run it with:
+
+    uvicorn asgi_app:app --app-dir src --host 0.0.0.0 --port 8080
+
+CHAT_FAKE_MODEL=1 uses the local fake model, as in app.py.
+benchmarks/chat_load_test.py compares it with the Flask app under load.
+"""
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+
+from utils.chat_service import (
+    CONFIG_PATH, CREDENTIALS_PATH, SSE_HEADERS, ChatService, TurnStream, default_chat_model
+)
+from utils.errors import AppError, VertexAIError, error_body
+from utils.logging_utils import log_exception
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates', 'index.html')
+
+
+def error_response(error: AppError) -> JSONResponse:
+    """The JSON error response utils.errors.handle_error returns in the Flask app."""
+    return JSONResponse(error_body(error), status_code=error.status_code)
+
+
+async def read_json(request: Request):
+    """The decoded JSON body, or None if it isn't valid JSON (as Flask's get_json(silent=True))."""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def create_app(config_path: str = CONFIG_PATH, credentials_path: str = CREDENTIALS_PATH,
+               chat_model=None) -> FastAPI:
+    """
+    Create the ASGI app and initialize the chat service once.
+
+    Args:
+        config_path: Agent configuration YAML
+        credentials_path: Service account key file
+        chat_model: Model to use instead of Vertex AI, e.g. FakeGenerativeModel
+
+    Returns:
+        The configured FastAPI app
+    """
+    api = FastAPI(title="ADK Posit Demo Chat")
+    service = ChatService(config_path, credentials_path, chat_model)
+    service.initialize()
+    api.state.chat_service = service
+
+    @api.exception_handler(AppError)
+    async def handle_app_error(request: Request, e: AppError):
+        return error_response(e)
+
+    @api.exception_handler(RequestValidationError)
+    async def handle_validation_error(request: Request, e: RequestValidationError):
+        """Bad parameters get the app's error body, not FastAPI's {"detail": ...}."""
+        return error_response(AppError("Invalid request", status_code=400, details={'errors': e.errors()}))
+
+    @api.exception_handler(Exception)
+    async def handle_exception(request: Request, e: Exception):
+        """Handle uncaught exceptions."""
+        log_exception(e, {'handler': 'global_error_handler'})
+        return error_response(AppError("An unexpected error occurred", status_code=500))
+
+    @api.get('/')
+    async def home():
+        """Serve the main application page."""
+        return FileResponse(TEMPLATE_PATH, media_type='text/html')
+
+    @api.get('/health')
+    async def health():
+        """Health check endpoint. Reports startup state without re-authenticating."""
+        body, status = service.health()
+        return JSONResponse(body, status_code=status)
+
+    @api.get('/test')
+    async def test():
+        """Test endpoint to verify setup."""
+        body, status = service.test()
+        return JSONResponse(body, status_code=status)
+
+    @api.post('/chat')
+    async def chat(request: Request):
+        """Handle chat interactions. Messages with the same conversation_id share one chat session."""
+        try:
+            conversation, message = service.start_turn(await read_json(request))
+            # Other requests keep running while this turn waits on the model
+            async with conversation.async_lock:
+                response = await conversation.chat.send_message_async(message)
+                conversation.turns += 1
+            return {
+                'status': 'success',
+                'response': response.text,
+                'conversation_id': conversation.id
+            }
+        except AppError as e:
+            return error_response(e)
+        except Exception as e:
+            return error_response(VertexAIError.from_exception(e))
+
+    @api.post('/chat/stream')
+    async def chat_stream(request: Request):
+        """Like /chat, but streams the reply as server-sent events (see TurnStream)."""
+        try:
+            conversation, message = service.start_turn(await read_json(request))
+        except AppError as e:
+            return error_response(e)
+        except Exception as e:
+            return error_response(VertexAIError.from_exception(e))
+
+        async def generate():
+            stream = TurnStream(conversation)
+            yield stream.start()
+            # Held until the stream ends, so a follow-up can't interleave with this turn
+            async with conversation.async_lock:
+                try:
+                    responses = await conversation.chat.send_message_async(message, stream=True)
+                    async for chunk in responses:
+                        event = stream.token(chunk)
+                        if event:
+                            yield event
+                except Exception as e:
+                    yield stream.error(e)
+                    return
+                done = stream.done()
+            yield done
+
+        return StreamingResponse(generate(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+    return api
+
+
+app = create_app(chat_model=default_chat_model())
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='127.0.0.1', port=int(os.getenv('PORT', '8080')))
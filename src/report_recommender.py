@@ -0,0 +1,198 @@
+"""Custom Report recommendations for chat questions."""
+import heapq
+import math
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+# Catalog of Custom Reports. Keyword weights say how strongly a term points
+# at a report; two-word keywords are matched as phrases. Reports with a
+# 'query' can be prefetched through DataService.
+REPORT_CATALOG = [
+    {
+        'report_name': 'Markdown Transactions - Detail',
+        'description': 'Item-level markdown transactions with previous/new retail, quantity and amount',
+        'keywords': {
+            'markdown': 1.0, 'mark down': 1.0, 'md': 0.6, 'mumd': 0.8,
+            'transaction': 0.8, 'detail': 1.0, 'item': 0.8, 'line': 0.4,
+            'price change': 0.8, 'retail': 0.5, 'clearance': 0.7, 'cid': 0.6,
+            'which item': 0.8, 'list': 0.4, 'show me': 0.3, 'report': 0.5,
+        },
+        # DataService query behind the report, used to prefetch it
+        'query': {
+            'method': 'get_markdowns_data',
+            'params': ['store_nbr', 'dept_nbr', 'item_nbr'],
+            # Same defaults the Markdowns tab uses, so prefetched results
+            # share its cache key
+            'defaults': {'cid': None, 'md_desc': None, 'sort_column': 'MUMD_AMT',
+                         'sort_order': 'ASC', 'limit_rows': True},
+        },
+        'use_cases': [
+            'See every markdown taken on an item, with previous and new retail',
+            'Find which items drove a spike in markdown dollars',
+            'Check markdown quantities and amounts for a store, department or CID',
+            'Export markdown transactions for follow-up with the department manager',
+        ],
+    },
+    {
+        'report_name': 'Markdown Transactions - Summary',
+        'description': 'Markdown totals rolled up by store, department and markdown description',
+        'keywords': {
+            'markdown': 1.0, 'mark down': 1.0, 'md': 0.6, 'mumd': 0.8,
+            'summary': 1.2, 'total': 0.9, 'overview': 0.9, 'by department': 0.8,
+            'trend': 0.7, 'rollup': 0.8, 'how much': 0.6, 'breakdown': 0.8, 'report': 0.5,
+        },
+        'use_cases': [
+            'See total markdown dollars by department and markdown description',
+            'Compare markdown activity across departments',
+            'Spot unusual markdown types before drilling into the detail report',
+        ],
+    },
+]
+
+# Parameter extraction patterns, compiled once
+_NUMBER_LABEL = r'\s*(?:#|no\.?|nbr|number|num)?\s*'
+PARAM_PATTERNS = {
+    'store_nbr': re.compile(r'\bstore' + _NUMBER_LABEL + r'(\d{1,5})\b', re.IGNORECASE),
+    'dept_nbr': re.compile(r'\b(?:dept|department)' + _NUMBER_LABEL + r'(\d{1,3})\b', re.IGNORECASE),
+    'item_nbr': re.compile(r'\bitem' + _NUMBER_LABEL + r'(\d{3,12})\b', re.IGNORECASE),
+}
+DATE_PATTERN = re.compile(
+    r'\b(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{2,4}|'
+    r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{4})\b',
+    re.IGNORECASE
+)
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Default number of recommendations returned by recommend()
+DEFAULT_TOP_K = 3
+
+# Distinct catalog keywords a question must share with a report before
+# analyze_query() recommends it (and the chat tool prefetches it). One
+# generic word such as "item" or "detail" is not enough, and filler terms
+# weighted below MIN_HIT_WEIGHT ("show me", "list") don't count as hits
+MIN_KEYWORD_HITS = 2
+MIN_HIT_WEIGHT = 0.5
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with a light plural strip ("markdowns" -> "markdown")."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _terms(tokens: List[str]) -> set:
+    """Unigram and bigram terms for a token list."""
+    terms = set(tokens)
+    terms.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return terms
+
+
+class ReportRecommender:
+    """
+    Recommends Custom Reports for a user question.
+
+    Keywords are precomputed into an inverted index (term -> [(report, weight)])
+    so a query only touches the reports that share a term with it, no matter
+    how large the catalog grows.
+    """
+
+    def __init__(self, reports: Optional[List[Dict[str, Any]]] = None):
+        self.reports = list(reports) if reports is not None else REPORT_CATALOG
+        self.index: Dict[str, List[tuple]] = defaultdict(list)
+
+        for report_id, report in enumerate(self.reports):
+            for keyword, weight in report['keywords'].items():
+                # Normalize keywords the same way queries are tokenized
+                term = ' '.join(tokenize(keyword))
+                self.index[term].append((report_id, weight))
+        self.index = dict(self.index)
+
+    def extract_params(self, query: str) -> Dict[str, Any]:
+        """
+        Extract report parameters (store, dept, item, dates) from a query.
+
+        Returns:
+            Dict with any of store_nbr, dept_nbr, item_nbr, start_date, end_date
+        """
+        params = {}
+        for name, pattern in PARAM_PATTERNS.items():
+            match = pattern.search(query)
+            if match:
+                params[name] = int(match.group(1))
+
+        dates = DATE_PATTERN.findall(query)
+        if dates:
+            params['start_date'] = dates[0]
+            if len(dates) > 1:
+                params['end_date'] = dates[1]
+        return params
+
+    def _match(self, query: str):
+        """Per-report keyword score and number of distinct non-filler keywords matched."""
+        scores = defaultdict(float)
+        hits = defaultdict(int)
+        for term in _terms(tokenize(query)):
+            for report_id, weight in self.index.get(term, ()):
+                scores[report_id] += weight
+                hits[report_id] += weight >= MIN_HIT_WEIGHT
+        return scores, hits
+
+    def score(self, query: str) -> Dict[int, float]:
+        """Score every report sharing at least one term with the query."""
+        return self._match(query)[0]
+
+    def recommend(self, query: str, top_k: int = DEFAULT_TOP_K) -> List[Dict[str, Any]]:
+        """
+        Rank reports for a query.
+
+        Args:
+            query: The user's question
+            top_k: Maximum number of recommendations
+
+        Returns:
+            List of recommendation dicts, best first, each with report_name,
+            confidence, score, keyword_hits, extracted_params, use_cases,
+            description and query (the DataService query spec, if any)
+        """
+        scores, hits = self._match(query)
+        if not scores:
+            return []
+
+        # Ties go to the report listed first in the catalog
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        params = self.extract_params(query)
+
+        recommendations = []
+        for report_id, score in best:
+            report = self.reports[report_id]
+            recommendations.append({
+                'report_name': report['report_name'],
+                # Saturating map of the keyword score into 0..1; a single
+                # strong keyword (weight 1.0) lands just above 0.6
+                'confidence': round(1 - math.exp(-score), 3),
+                'score': score,
+                'keyword_hits': hits[report_id],
+                'extracted_params': params,
+                'use_cases': report['use_cases'],
+                'description': report.get('description', ''),
+                'query': report.get('query'),
+            })
+        return recommendations
+
+    def analyze_query(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Recommend the single best report for a query.
+
+        Returns:
+            The top recommendation (see recommend()), or None if no report
+            matches at least MIN_KEYWORD_HITS distinct keywords
+        """
+        recommendations = self.recommend(query, top_k=1)
+        if not recommendations or recommendations[0]['keyword_hits'] < MIN_KEYWORD_HITS:
+            return None
+        return recommendations[0]
@@ -0,0 +1,236 @@
+"""
+Chat backend shared by the Flask (app.py) and ASGI (asgi_app.py) servers.
+
+The route modules only adapt requests and responses to their framework;
+startup, health reporting, request validation and the server-sent events of
+a streamed reply live here so both servers behave the same.
+"""
+import datetime
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import load_config, get_vertex_config
+from .conversations import Conversation, ConversationStore
+from .errors import AppError, AuthError, VertexAIError
+from .logging_utils import app_logger, auth_logger, vertex_logger
+
+CONFIG_PATH = 'config/agent_config.yaml'
+CREDENTIALS_PATH = 'key.json'
+CHAT_CONTEXT = "You are a helpful assistant that can analyze data and create visualizations."
+
+
+class ChatService:
+    """
+    Configuration, credentials and the chat model, initialized once at startup.
+
+    Chat sessions are kept per conversation in a bounded ConversationStore so
+    follow-up messages keep their context.
+    """
+
+    def __init__(self, config_path: str = CONFIG_PATH, credentials_path: str = CREDENTIALS_PATH,
+                 chat_model=None):
+        self.config_path = config_path
+        self.credentials_path = credentials_path
+        self.config = None
+        self.vertex_config = None
+        # A model passed in (e.g. the local fake) skips credentials and Vertex AI
+        self.chat_model = chat_model
+        self.initialized_at = None
+        self.error = None
+        self.conversations = ConversationStore()
+
+    def initialize(self):
+        """Load config and credentials, initialize Vertex AI and create the model."""
+        try:
+            self.config = load_config(self.config_path)
+            self.vertex_config = get_vertex_config()
+            if self.chat_model is None:
+                self.init_vertex()
+            self.initialized_at = datetime.datetime.utcnow()
+            self.error = None
+        except Exception as e:
+            # Keep serving so /health can report the problem
+            self.error = e
+            app_logger.error(f"Failed to initialize application: {str(e)}", exc_info=True)
+
+    def init_vertex(self):
+        """Authenticate with the service account and create the Vertex AI model."""
+        from google.cloud import aiplatform
+        from google.oauth2 import service_account
+        
+        # Set up credentials
+        try:
+            credentials = service_account.Credentials.from_service_account_file(
+                self.credentials_path,
+                scopes=['https://www.googleapis.com/auth/cloud-platform']
+            )
+        except Exception as e:
+            auth_logger.error("Failed to load service account credentials", exc_info=True)
+            raise AuthError("Failed to authenticate with service account") from e
+        
+        # Initialize Vertex AI
+        vertex_logger.info(f"Initializing Vertex AI with config: {self.vertex_config}")
+        try:
+            aiplatform.init(
+                project=self.vertex_config['project_id'],
+                location=self.vertex_config['location'],
+                credentials=credentials
+            )
+        except Exception as e:
+            vertex_logger.error("Failed to initialize Vertex AI", exc_info=True)
+            raise VertexAIError.from_exception(e)
+        
+        self.init_chat_model()
+
+    def init_chat_model(self):
+        """Initialize the chat model."""
+        from vertexai.generative_models import GenerativeModel
+        
+        try:
+            self.chat_model = GenerativeModel(self.vertex_config['model_name'])
+            vertex_logger.info("Chat model initialized successfully")
+        except Exception as e:
+            vertex_logger.error(f"Failed to initialize chat model: {str(e)}", exc_info=True)
+            raise VertexAIError("Failed to initialize chat model") from e
+
+    @property
+    def ready(self) -> bool:
+        return self.chat_model is not None and self.error is None
+
+    def health(self) -> Tuple[Dict[str, Any], int]:
+        """Body and status of /health. Reports startup state without re-authenticating."""
+        checks = {
+            'config': self.vertex_config is not None,
+            'chat_model': self.chat_model is not None,
+            'conversations': len(self.conversations),
+            'timestamp': datetime.datetime.utcnow().isoformat()
+        }
+        if self.vertex_config is not None:
+            checks['project_id'] = self.vertex_config['project_id']
+            checks['location'] = self.vertex_config['location']
+        if not self.ready:
+            return {
+                'status': 'unhealthy',
+                'error': str(self.error) if self.error else 'not initialized',
+                'checks': checks,
+                'timestamp': checks['timestamp']
+            }, 503
+        return {'status': 'healthy', 'checks': checks}, 200
+
+    def test(self) -> Tuple[Dict[str, Any], int]:
+        """Body and status of /test."""
+        if not self.ready:
+            return {
+                'status': 'error',
+                'message': str(self.error) if self.error else 'Application not initialized'
+            }, 500
+        return {
+            'status': 'success',
+            'message': 'Application initialized successfully',
+            'config': {
+                'project_id': self.vertex_config['project_id'],
+                'location': self.vertex_config['location']
+            }
+        }, 200
+
+    def start_turn(self, data: Any) -> Tuple[Conversation, str]:
+        """
+        Validate a chat request body and look up (or start) its conversation.
+
+        Args:
+            data: The decoded JSON body, or None if it wasn't valid JSON
+
+        Returns:
+            (conversation, message)
+
+        Raises:
+            VertexAIError: if the chat model isn't initialized
+            AppError: (400) for a body that isn't a JSON object or has no message
+        """
+        if not self.ready:
+            app_logger.error("Chat model not initialized")
+            raise VertexAIError("Chat model is not initialized", status_code=503)
+        if not isinstance(data, dict):
+            raise AppError("Request body must be a JSON object", status_code=400)
+
+        message = data.get('message', '')
+        conversation_id = data.get('conversation_id')
+        if not isinstance(message, str) or not isinstance(conversation_id, (str, type(None))):
+            raise AppError("message and conversation_id must be strings", status_code=400)
+        if not message:
+            raise AppError("No message provided", status_code=400)
+
+        conversation, created = self.conversations.get_or_create(conversation_id, self.start_chat)
+        app_logger.info(f"{'Started' if created else 'Continuing'} conversation {conversation.id}")
+        return conversation, message
+
+    def start_chat(self):
+        """Create a chat session for a new conversation."""
+        return self.chat_model.start_chat(
+            history=[],
+            context=CHAT_CONTEXT,
+            generation_config={
+                "temperature": self.vertex_config['temperature'],
+                "top_p": self.vertex_config['top_p'],
+                "top_k": self.vertex_config['top_k']
+            }
+        )
+
+
+def sse_event(event: str, payload: dict) -> str:
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+class TurnStream:
+    """
+    Server-sent events of one streamed reply.
+
+    Events: `start` (conversation_id), `token` (text) for each chunk, then
+    `done` (full response) or `error` (message). The server iterates the
+    model's chunks itself (synchronously or not) while holding the
+    conversation's lock, and yields what these methods return.
+    """
+
+    def __init__(self, conversation: Conversation):
+        self.conversation = conversation
+        self.parts: List[str] = []
+
+    def start(self) -> str:
+        return sse_event('start', {'conversation_id': self.conversation.id})
+
+    def token(self, chunk) -> Optional[str]:
+        """The event for one model chunk, or None for a chunk without text."""
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text (e.g. only safety ratings)
+            return None
+        if not text:
+            return None
+        self.parts.append(text)
+        return sse_event('token', {'text': text})
+
+    def error(self, e: Exception) -> str:
+        vertex_logger.error(f"Streaming chat failed: {str(e)}", exc_info=True)
+        error = e if isinstance(e, AppError) else VertexAIError.from_exception(e)
+        return sse_event('error', {'message': error.message, 'details': error.details})
+
+    def done(self) -> str:
+        """Count the finished turn; call before releasing the conversation's lock."""
+        self.conversation.turns += 1
+        return sse_event('done', {'conversation_id': self.conversation.id, 'response': ''.join(self.parts)})
+
+
+# Response headers for the event stream; no proxy buffering between tokens
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def default_chat_model():
+    """The local fake model when CHAT_FAKE_MODEL is set, otherwise None (Vertex AI)."""
+    if os.getenv('CHAT_FAKE_MODEL', 'false').lower() in ('1', 'true'):
+        from .fake_model import FakeGenerativeModel
+        app_logger.info("Using the local fake chat model (CHAT_FAKE_MODEL)")
+        return FakeGenerativeModel()
+    return None
@@ -0,0 +1,92 @@
+"""Bounded store of per-conversation chat sessions."""
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from .logging_utils import vertex_logger
+
+MAX_CONVERSATIONS = int(os.getenv('CHAT_MAX_CONVERSATIONS', '500'))
+CONVERSATION_TTL_SECONDS = float(os.getenv('CHAT_CONVERSATION_TTL_SECONDS', '3600'))
+
+
+class Conversation:
+    """A chat session plus the locks that serialize its turns."""
+
+    def __init__(self, conversation_id: str, chat: Any):
+        self.id = conversation_id
+        self.chat = chat
+        self.lock = threading.Lock()  # Flask worker threads
+        self._async_lock: Optional[asyncio.Lock] = None
+        self.last_used = time.monotonic()
+        self.turns = 0
+
+    @property
+    def async_lock(self) -> asyncio.Lock:
+        """Lock for the ASGI server, created on first use inside its event loop."""
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        return self._async_lock
+
+
+class ConversationStore:
+    """
+    LRU + TTL store of chat sessions keyed by conversation ID.
+
+    At most `max_conversations` are kept; the least recently used one is
+    dropped when a new conversation would exceed that, and conversations
+    idle for longer than `ttl_seconds` are dropped on access.
+    """
+
+    def __init__(self, max_conversations: int = MAX_CONVERSATIONS,
+                 ttl_seconds: float = CONVERSATION_TTL_SECONDS):
+        self.max_conversations = max_conversations
+        self.ttl_seconds = ttl_seconds
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        # Caller must hold the lock; oldest entries are at the front
+        while self._conversations:
+            conversation = next(iter(self._conversations.values()))
+            if now - conversation.last_used < self.ttl_seconds:
+                break
+            self._conversations.popitem(last=False)
+
+    def get_or_create(self, conversation_id: Optional[str],
+                      start_chat: Callable[[], Any]) -> Tuple[Conversation, bool]:
+        """
+        Get a conversation, or start a new one.
+
+        Args:
+            conversation_id: ID sent by the client; unknown or expired IDs
+                start a new conversation under a fresh ID
+            start_chat: Creates the chat session for a new conversation
+
+        Returns:
+            Tuple of (conversation, created)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            conversation = self._conversations.get(conversation_id) if conversation_id else None
+            if conversation is not None:
+                conversation.last_used = now
+                self._conversations.move_to_end(conversation.id)
+                return conversation, False
+
+        # Creating the chat session doesn't call the API, but keep it outside the lock anyway
+        conversation = Conversation(uuid.uuid4().hex, start_chat())
+        with self._lock:
+            self._conversations[conversation.id] = conversation
+            while len(self._conversations) > self.max_conversations:
+                evicted_id, _ = self._conversations.popitem(last=False)
+                vertex_logger.info(f"Conversation store full, dropped conversation {evicted_id}")
+        return conversation, True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._conversations)
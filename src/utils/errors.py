@@ -1,6 +1,5 @@
 """Error handling utilities for the application."""
 from typing import Dict, Any, Optional
-from flask import jsonify
 
 class AppError(Exception):
     """Base application error class."""
@@ -10,6 +9,14 @@ class AppError(Exception):
         self.status_code = status_code
         self.details = details or {}
 
+def error_body(error: AppError) -> Dict[str, Any]:
+    """JSON body of an error response, the same for the Flask and ASGI apps."""
+    return {
+        'status': 'error',
+        'message': str(error.message),
+        'details': error.details
+    }
+
 def handle_error(error: AppError) -> tuple[Dict[str, Any], int]:
     """
     Convert application error to JSON response.
@@ -20,12 +27,10 @@ def handle_error(error: AppError) -> tuple[Dict[str, Any], int]:
     Returns:
         Tuple of (response_dict, status_code)
     """
-    response = {
-        'status': 'error',
-        'message': str(error.message),
-        'details': error.details
-    }
-    return jsonify(response), error.status_code
+    # Only the Flask app uses this; asgi_app.py wraps error_body() itself
+    from flask import jsonify
+
+    return jsonify(error_body(error)), error.status_code
 
 class VertexAIError(AppError):
     """Vertex AI specific errors."""
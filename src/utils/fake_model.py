@@ -0,0 +1,80 @@
+"""Local stand-in for the Vertex AI GenerativeModel, for tests and benchmarks."""
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Iterator, List
+
+FIRST_TOKEN_SECONDS = float(os.getenv('FAKE_MODEL_FIRST_TOKEN_SECONDS', '0.5'))
+TOKEN_SECONDS = float(os.getenv('FAKE_MODEL_TOKEN_SECONDS', '0.02'))
+RESPONSE_WORDS = int(os.getenv('FAKE_MODEL_RESPONSE_WORDS', '60'))
+
+
+class FakeResponse:
+    """Mimics a GenerationResponse (or one streamed chunk of it)."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeChatSession:
+    """
+    Mimics vertexai ChatSession.send_message and send_message_async, with
+    and without stream=True.
+
+    Replies echo the message and the turn number, so a test can tell whether
+    follow-ups went to the same session. Latency is split into time to first
+    token and time per word.
+    """
+
+    def __init__(self, model: 'FakeGenerativeModel'):
+        self.model = model
+        self.history: List[str] = []
+
+    def _words(self, content: str) -> List[str]:
+        self.history.append(content)
+        reply = f"(turn {len(self.history)}) You said: {content}."
+        filler = ['lorem', 'ipsum', 'dolor', 'sit', 'amet']
+        words = reply.split()
+        words += [filler[i % len(filler)] for i in range(max(0, self.model.response_words - len(words)))]
+        return words
+
+    def _stream(self, words: List[str]) -> Iterator[FakeResponse]:
+        time.sleep(self.model.first_token_seconds)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.model.token_seconds)
+            yield FakeResponse(word if i == 0 else ' ' + word)
+
+    def send_message(self, content: str, stream: bool = False, **kwargs):
+        words = self._words(content)
+        if stream:
+            return self._stream(words)
+        time.sleep(self.model.first_token_seconds + self.model.token_seconds * (len(words) - 1))
+        return FakeResponse(' '.join(words))
+
+    async def _stream_async(self, words: List[str]) -> AsyncIterator[FakeResponse]:
+        await asyncio.sleep(self.model.first_token_seconds)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.model.token_seconds)
+            yield FakeResponse(word if i == 0 else ' ' + word)
+
+    async def send_message_async(self, content: str, stream: bool = False, **kwargs):
+        words = self._words(content)
+        if stream:
+            return self._stream_async(words)
+        await asyncio.sleep(self.model.first_token_seconds + self.model.token_seconds * (len(words) - 1))
+        return FakeResponse(' '.join(words))
+
+
+class FakeGenerativeModel:
+    """Mimics GenerativeModel.start_chat; no credentials or network needed."""
+
+    def __init__(self, first_token_seconds: float = FIRST_TOKEN_SECONDS, token_seconds: float = TOKEN_SECONDS,
+                 response_words: int = RESPONSE_WORDS):
+        self.first_token_seconds = first_token_seconds
+        self.token_seconds = token_seconds
+        self.response_words = response_words
+
+    def start_chat(self, **kwargs) -> FakeChatSession:
+        return FakeChatSession(self)
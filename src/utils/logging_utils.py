@@ -1,12 +1,34 @@
 """Logging configuration and utilities for the application."""
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
+import sys
 import uuid
 from datetime import datetime
 from typing import Optional
 from functools import wraps
-from flask import request, has_request_context, g
+try:
+    from flask import request, has_request_context, g
+except ImportError:
+    # asgi_app.py runs without Flask, so there is never a Flask request
+    request = g = None
+
+    def has_request_context() -> bool:
+        return False
+
+# The repo root's log_pipeline.py (JSON log files, DEBUG sampling, rate
+# limits) is used when it's there; the root is appended so src/ modules
+# still win on name clashes such as app.py
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+try:
+    from log_pipeline import setup_logging
+except ImportError:
+    # src/ deployed on its own: plain text files behind a stdlib queue
+    setup_logging = None
 
 # Create logs directory if it doesn't exist
 logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
@@ -30,20 +52,37 @@ def setup_file_handler(filename: str, level: int = logging.INFO) -> logging.Hand
     handler.setFormatter(DETAILED_FORMATTER)
     return handler
 
-# Create loggers
-app_logger = logging.getLogger('app')
-auth_logger = logging.getLogger('auth')
-vertex_logger = logging.getLogger('vertex')
+# Logger name, file and level; auth and Vertex AI log in more detail
+_LOGGERS = (('app', 'app.log', logging.INFO), ('auth', 'auth.log', logging.DEBUG),
+            ('vertex', 'vertex.log', logging.DEBUG))
 
-# Set up handlers
-app_logger.addHandler(setup_file_handler('app.log'))
-auth_logger.addHandler(setup_file_handler('auth.log'))
-vertex_logger.addHandler(setup_file_handler('vertex.log'))
+if setup_logging is not None:
+    # Same pipeline as the Shiny app: the loggers only enqueue records, and
+    # DEBUG/INFO are sampled and rate limited before they get that far
+    app_logger, auth_logger, vertex_logger = (
+        setup_logging(name, os.path.join(logs_dir, filename), logging.getLevelName(level))
+        for name, filename, level in _LOGGERS
+    )
+else:
+    # The loggers only put records on a queue; a listener thread writes each
+    # one to its logger's file, off the request path
+    _log_queue = queue.Queue(-1)
+    _file_handlers = []
+    for _name, _filename, _level in _LOGGERS:
+        _logger = logging.getLogger(_name)
+        _logger.setLevel(_level)
+        _handler = setup_file_handler(_filename)
+        _handler.addFilter(logging.Filter(_name))
+        _file_handlers.append(_handler)
+        _logger.addHandler(logging.handlers.QueueHandler(_log_queue))
 
-# Set log levels
-app_logger.setLevel(logging.INFO)
-auth_logger.setLevel(logging.DEBUG)  # More detailed logging for auth issues
-vertex_logger.setLevel(logging.DEBUG)  # More detailed logging for Vertex AI issues
+    _log_listener = logging.handlers.QueueListener(_log_queue, *_file_handlers, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+    app_logger = logging.getLogger('app')
+    auth_logger = logging.getLogger('auth')
+    vertex_logger = logging.getLogger('vertex')
 
 class RequestFormatter(logging.Formatter):
     """Custom formatter that includes request ID and context."""
@@ -64,6 +103,10 @@ class RequestFormatter(logging.Formatter):
             
         return super().format(record)
 
+def _request_id() -> str:
+    """ID of the Flask request being handled, if any (the ASGI app has none)."""
+    return getattr(g, 'request_id', 'no-request-id') if has_request_context() else 'no-request-id'
+
 def log_exception(exc: Exception, context: Optional[dict] = None) -> None:
     """
     Log an exception with additional context.
@@ -86,7 +129,7 @@ def log_exception(exc: Exception, context: Optional[dict] = None) -> None:
             "Permission error occurred",
             extra={
                 'context': ctx,
-                'request_id': getattr(g, 'request_id', 'no-request-id')
+                'request_id': _request_id()
             },
             exc_info=True
         )
@@ -95,7 +138,7 @@ def log_exception(exc: Exception, context: Optional[dict] = None) -> None:
             "An error occurred",
             extra={
                 'context': ctx,
-                'request_id': getattr(g, 'request_id', 'no-request-id')
+                'request_id': _request_id()
             },
             exc_info=True
         )
@@ -168,7 +211,7 @@ def log_vertex_operation(operation_name: str):
                         'args': str(args),
                         'kwargs': str(kwargs)
                     },
-                    'request_id': getattr(g, 'request_id', 'no-request-id')
+                    'request_id': _request_id()
                 }
             )
             
@@ -185,7 +228,7 @@ def log_vertex_operation(operation_name: str):
                             'duration': duration,
                             'success': True
                         },
-                        'request_id': getattr(g, 'request_id', 'no-request-id')
+                        'request_id': _request_id()
                     }
                 )
                 
@@ -201,7 +244,7 @@ def log_vertex_operation(operation_name: str):
                             'error': str(e),
                             'error_type': e.__class__.__name__
                         },
-                        'request_id': getattr(g, 'request_id', 'no-request-id')
+                        'request_id': _request_id()
                     },
                     exc_info=True
                 )
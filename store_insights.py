@@ -0,0 +1,292 @@
+# store_insights.py
+"""
+AI-generated store insights: rendering and a process-wide cache.
+
+Store summaries only change when the upstream insights table is rebuilt, so
+the rendered HTML for each store is kept in memory and shared by every
+session. The cache is tied to the table's last-modified time: when it moves,
+every entry is dropped. A background thread watches the table and keeps the
+most-viewed stores warm, so switching stores usually needs no BigQuery round
+trip at all.
+"""
+import html
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from clients import registry
+
+logger = logging.getLogger('adk_chat.store_insights')
+
+# Fully qualified insights table (project.dataset.table). Its last-modified
+# time versions the cache; without it entries simply expire after
+# FALLBACK_TTL_SECONDS.
+INSIGHTS_TABLE = os.getenv('STORE_INSIGHTS_TABLE')
+FALLBACK_TTL_SECONDS = 3600
+
+# How often the background job checks the table and warms stores
+REFRESH_INTERVAL_SECONDS = 120
+# Number of most-viewed stores kept warm
+WARM_STORE_COUNT = 25
+
+
+# Insights bullet format, e.g.
+#
+#   Recommended Actions:
+#     * Department 60:
+#       * Review markdowns for clearance items
+#
+# Each non-blank line is one item: indentation (spaces and tabs), optional
+# bullet marker, content. A bullet marker is a run of bullet characters
+# followed by whitespace, so "**Note** text" and "-5%" keep their leading
+# chars. Tabs in the indentation count to the next multiple of 4. A content
+# ending in ':' is a label; at indent 0 it starts a section.
+#
+# The tokenizer splits the text at line starts, so the regex engine strips
+# indentation and bullet markers and Python only sees (indentation, content)
+# pairs.
+_LINE_START_RE = re.compile(
+    r'\n([ \t]*)'                             # line break, indentation
+    r'(?:[*\-\u2022]+(?:[ \t]+|(?=\n)|\Z)|)'  # bullet marker, if any
+)
+
+
+def _tokenize_insights(text: str) -> Iterator[Tuple[str, str]]:
+    """
+    (indentation, content) for every line.
+
+    Content may keep trailing whitespace, and is '' for blank and
+    bullet-only lines.
+    """
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    tokens = _LINE_START_RE.split(text)
+    # The first line has no line break before it, so it is split on its own
+    tokens[:1] = _LINE_START_RE.split('\n' + tokens[0])[1:]
+    tokens = iter(tokens)
+    return zip(tokens, tokens)
+
+
+def _is_department_label(indent: int, label: str) -> bool:
+    """Labels rendered as department headings (e.g., "Department 60:")."""
+    return indent <= 2 and ('Department' in label or 'Anomalies' in label)
+
+
+def _close_lists(stack: List[Optional[int]], emit: Callable[[str], None]):
+    """Close every open list."""
+    while len(stack) > 1:
+        emit('\n</ul>' if stack.pop() is None else '\n</li></ul>')
+
+
+def render_insights_html(text: str) -> str:
+    """
+    Render insights text to HTML.
+
+    A stack of open lists (one per indent level) decides where each item
+    goes, so items can nest to any depth and every opened tag is closed.
+    Most lines are plain siblings of the line before and skip the stack.
+    All content is HTML-escaped; escaping runs once over the input since it
+    never touches indentation, bullet markers or a trailing ':'.
+
+    Returns:
+        HTML, one element per line
+    """
+    if '&' in text or '<' in text or '>' in text:
+        text = html.escape(text, quote=False)
+
+    # Every emitted piece starts its own line
+    out = []
+    emit = out.append
+    # Indents of the open <ul> levels, innermost last, above a -1 for the
+    # document itself. Each level's last <li> is left open so deeper items
+    # nest inside it. None marks a section list that has no item yet.
+    stack: List[Optional[int]] = [-1]
+    # Indentation of the last item, while a sibling can follow it
+    sibling_indentation = None
+
+    for indentation, content in _tokenize_insights(text):
+        end = content[-1:]
+        # Labels, trailing whitespace and blank lines take the slow path
+        if indentation == sibling_indentation and end not in ' \t:':
+            emit('\n</li>\n<li class="detail-item">')
+            emit(content)
+            continue
+        if end in ' \t':
+            content = content.rstrip(' \t')
+            end = content[-1:]
+        if not end:
+            continue
+        indent = len(indentation.expandtabs(4)) if '\t' in indentation else len(indentation)
+
+        # Level 0 label: section title (e.g., "Recommended Actions:")
+        if end == ':' and not indent:
+            _close_lists(stack, emit)
+            emit(f'\n<h3>{content}</h3>\n<ul class="section-list">')
+            stack.append(None)
+            sibling_indentation = None
+            continue
+
+        top = stack[-1]
+        if top is None:
+            # First item of a section: the section list takes its indent
+            stack[-1] = indent
+        elif indent == top:
+            emit('\n</li>')
+        else:
+            while indent < stack[-1]:
+                stack.pop()
+                emit('\n</li></ul>')
+            if indent == stack[-1]:
+                emit('\n</li>')
+            else:
+                # Deeper than the open lists: nest inside the previous item
+                emit('\n<ul class="detail-list">' if len(stack) > 1 else '\n<ul class="section-list">')
+                stack.append(indent)
+        sibling_indentation = indentation
+
+        # Department labels head a nested list of details; other labels
+        # render like any detail item, as they always have
+        if end == ':' and _is_department_label(indent, content):
+            emit(f'\n<li class="dept-item"><strong>{content}</strong>')
+        else:
+            emit('\n<li class="detail-item">')
+            emit(content)
+
+    _close_lists(stack, emit)
+    if out:
+        # Drop the line break the first piece starts with
+        out[0] = out[0][1:]
+    return ''.join(out)
+
+
+def parse_insights_to_html(text):
+    """Parse markdown-like bullet format to structured HTML"""
+    html_content = render_insights_html(text) if text else ''
+    return html_content or "<p>No insights available.</p>"
+
+
+def _insights_table_version() -> Optional[Any]:
+    """Last-modified time of the insights table, or None if unknown."""
+    if not INSIGHTS_TABLE:
+        return None
+    table = registry.get('bigquery').get_table(INSIGHTS_TABLE)
+    return table.modified
+
+
+class StoreInsightsCache:
+    """Store number -> rendered insights HTML, shared by all sessions."""
+
+    def __init__(self,
+                 version_fn: Callable[[], Optional[Any]] = _insights_table_version,
+                 refresh_interval: float = REFRESH_INTERVAL_SECONDS,
+                 warm_count: int = WARM_STORE_COUNT):
+        self.version_fn = version_fn
+        self.refresh_interval = refresh_interval
+        self.warm_count = warm_count
+        self._entries: Dict[int, tuple] = {}  # store_nbr -> (rendered_at, html)
+        self._views = Counter()
+        self._version = None
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+
+    def _is_fresh(self, rendered_at: float) -> bool:
+        # With a table version, entries live until the version moves
+        if self._version is not None:
+            return True
+        return time.monotonic() - rendered_at < FALLBACK_TTL_SECONDS
+
+    def get_html(self, store_nbr: int, data_service) -> str:
+        """
+        Rendered insights HTML for a store, fetching and rendering on a miss.
+
+        Args:
+            store_nbr: Store number
+            data_service: DataService used on a cache miss
+
+        Returns:
+            Insights HTML (without the outer wrapper div)
+        """
+        with self._lock:
+            self._views[store_nbr] += 1
+            entry = self._entries.get(store_nbr)
+            if entry is not None and self._is_fresh(entry[0]):
+                logger.info(f"Store insights cache hit for store {store_nbr}")
+                return entry[1]
+
+        logger.info(f"Fetching store insights for store {store_nbr}")
+        return self._load(store_nbr, data_service)
+
+    def _load(self, store_nbr: int, data_service) -> str:
+        # A refresh may clear the cache while this fetch is in flight; the
+        # result is still returned, but only cached if the table version it
+        # was fetched under is still current
+        with self._lock:
+            version = self._version
+        summary_text = data_service.get_store_summary(store_nbr)
+        html_content = parse_insights_to_html(summary_text)
+        with self._lock:
+            if self._version == version:
+                self._entries[store_nbr] = (time.monotonic(), html_content)
+            else:
+                logger.info(f"Insights table changed while loading store {store_nbr}, not caching")
+        return html_content
+
+    def refresh(self):
+        """
+        Invalidate on a table rebuild, then warm the most-viewed stores.
+
+        Runs on the background thread; safe to call directly.
+        """
+        try:
+            version = self.version_fn()
+        except Exception as e:
+            # Keep serving what we have; the next cycle tries again
+            logger.warning(f"Could not read insights table version: {e}")
+            return
+
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    logger.info(f"Insights table changed ({self._version} -> {version}), clearing cache")
+                self._entries.clear()
+                self._version = version
+            top_stores = [store for store, _ in self._views.most_common(self.warm_count)]
+            to_warm = [store for store in top_stores
+                       if store not in self._entries or not self._is_fresh(self._entries[store][0])]
+
+        if not to_warm:
+            return
+
+        data_service = registry.get('data_service')
+        start_time = time.perf_counter()
+        for store_nbr in to_warm:
+            try:
+                self._load(store_nbr, data_service)
+            except Exception as e:
+                logger.warning(f"Could not warm insights for store {store_nbr}: {e}")
+        logger.info(f"Warmed insights for {len(to_warm)} stores in {time.perf_counter() - start_time:.2f}s")
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Store insights refresh failed: {e}", exc_info=True)
+            time.sleep(self.refresh_interval)
+
+    def start_background_refresh(self):
+        """Start the refresh thread once per process."""
+        with self._lock:
+            if self._refresh_thread is not None:
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_loop, name='store-insights-refresh', daemon=True)
+            self._refresh_thread.start()
+        logger.info(f"Store insights background refresh started (every {self.refresh_interval}s)")
+
+
+store_insights_cache = StoreInsightsCache()
@@ -0,0 +1,166 @@
+"""
+Tests for the store insights parser.
+
+Besides a few fixed cases, the parser is fuzzed with random indentation,
+bullets, tabs and HTML special characters. Every output must be well-formed
+(all tags balanced) and its text must be exactly the input text minus
+indentation and bullet markers.
+
+Run with:
+    python -m pytest tests/test_store_insights.py
+"""
+import random
+import sys
+from html.parser import HTMLParser
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from store_insights import parse_insights_to_html  # noqa: E402
+
+FUZZ_CASES = 2000
+FUZZ_ALPHABET = 'abc XYZ 09:<>&"\'*-•\t/'
+
+
+def reference_items(text):
+    """(indent, content) per item, straight from the format described in store_insights.py."""
+    items = []
+    for line in text.splitlines():
+        content = line.strip()
+        if not content:
+            continue
+        body = line.lstrip(' \t')
+        indent = len(line[:len(line) - len(body)].expandtabs(4))
+        if content[0] in '*-•':
+            rest = content.lstrip('*-•')
+            if not rest:
+                continue
+            if rest[0] in ' \t':
+                content = rest.lstrip()
+        items.append((indent, content))
+    return items
+
+
+class BalanceChecker(HTMLParser):
+    """Checks tag balance and collects text content."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.open_tags = []
+        self.text = []
+        self.errors = []
+
+    def handle_starttag(self, tag, attrs):
+        self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if not self.open_tags or self.open_tags.pop() != tag:
+            self.errors.append(f"unexpected </{tag}>")
+
+    def handle_data(self, data):
+        self.text.append(data)
+
+
+def check_output(text, output):
+    """Return a list of problems with one parser output (empty if none)."""
+    checker = BalanceChecker()
+    checker.feed(output)
+    checker.close()
+    problems = list(checker.errors)
+    if checker.open_tags:
+        problems.append(f"unclosed tags {checker.open_tags}")
+
+    # Text content must be exactly the item contents
+    expected = ''.join(content for _, content in reference_items(text))
+    actual = ''.join(checker.text).replace('\n', '')
+    if not expected:
+        expected = 'No insights available.'
+    if actual != expected:
+        problems.append(f"text mismatch: {expected[:80]!r} != {actual[:80]!r}")
+    return problems
+
+
+def fuzz_summary(rng):
+    lines = []
+    for _ in range(rng.randint(0, 40)):
+        indent = ' ' * rng.choice([0, 0, 1, 2, 2, 3, 4, 6, 8, 12]) + '\t' * rng.choice([0, 0, 0, 1])
+        bullet = rng.choice(['', '* ', '- ', '• ', '** ', '*'])
+        content = ''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 20)))
+        if rng.random() < 0.3:
+            content += ':'
+        lines.append(indent + bullet + content)
+    return rng.choice(['\n', '\r\n']).join(lines)
+
+
+def test_sections_departments_and_details():
+    text = ("Recommended Actions:\n"
+            "  * Department 60:\n"
+            "    * Review markdowns on **clearance** items\n"
+            "    * Recount <top> 5 & bottom 5\n"
+            "Watch List:\n"
+            "  - Store 12")
+    assert parse_insights_to_html(text) == '\n'.join([
+        '<h3>Recommended Actions:</h3>',
+        '<ul class="section-list">',
+        '<li class="dept-item"><strong>Department 60:</strong>',
+        '<ul class="detail-list">',
+        '<li class="detail-item">Review markdowns on **clearance** items',
+        '</li>',
+        '<li class="detail-item">Recount &lt;top&gt; 5 &amp; bottom 5',
+        '</li></ul>',
+        '</li></ul>',
+        '<h3>Watch List:</h3>',
+        '<ul class="section-list">',
+        '<li class="detail-item">Store 12',
+        '</li></ul>',
+    ])
+
+
+@pytest.mark.parametrize('text', ['', '   \n\t\n', '*\n-\n'])
+def test_empty_summary(text):
+    assert parse_insights_to_html(text) == "<p>No insights available.</p>"
+
+
+def test_bold_markers_stay_literal():
+    assert parse_insights_to_html("**a** and **b") == '<ul class="section-list">\n' \
+        '<li class="detail-item">**a** and **b\n</li></ul>'
+
+
+def test_only_department_labels_are_headings():
+    text = ("Anomalies:\n"
+            "  Department 7:\n"
+            "    Shrink up 4%\n"
+            "  Notes:\n"
+            "    Recount on Monday\n"
+            "    Department 9:")
+    assert parse_insights_to_html(text) == '\n'.join([
+        '<h3>Anomalies:</h3>',
+        '<ul class="section-list">',
+        '<li class="dept-item"><strong>Department 7:</strong>',
+        '<ul class="detail-list">',
+        '<li class="detail-item">Shrink up 4%',
+        '</li></ul>',
+        '</li>',
+        '<li class="detail-item">Notes:',
+        '<ul class="detail-list">',
+        '<li class="detail-item">Recount on Monday',
+        '</li>',
+        '<li class="detail-item">Department 9:',
+        '</li></ul>',
+        '</li></ul>',
+    ])
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_fuzz(seed):
+    rng = random.Random(seed)
+    failures = []
+    for i in range(FUZZ_CASES // 4):
+        text = fuzz_summary(rng)
+        problems = check_output(text, parse_insights_to_html(text))
+        if problems:
+            failures.append((i, text, problems))
+    assert not failures, failures[:3]
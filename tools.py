@@ -1,46 +1,23 @@
 # tools.py
 import os
 import logging
+import time
 from typing import List, Optional
 from langchain.tools import tool
-# We switch from Chroma (Local) to Vertex AI Search (Cloud)
-# NEW / CORRECT - VertexAISearchRetriever is in langchain-google-community
-from langchain_google_community import VertexAISearchRetriever
-from google.cloud import bigquery
-from src.report_recommender import ReportRecommender
+from clients import registry, ClientUnavailableError
+from retry_utils import call_with_retry, vertex_search_breaker
+from report_prefetch import report_prefetcher
+from metrics import metrics
 
 # Setup logging
 logger = logging.getLogger('adk_chat.tools')
 
-# Initialize report recommender
-report_recommender = ReportRecommender()
+RETRIEVER_CALLS = metrics.counter('retriever_calls_total', "Knowledge base searches", ['outcome'])
+RETRIEVER_SECONDS = metrics.histogram('retriever_call_seconds', "Duration of knowledge base searches")
 
-# Configuration - Pull from Env or use defaults
-PROJECT_ID = os.getenv('GCP_PROJECT', 'wmt-us-gg-shrnk-prod')
-LOCATION = "global" 
-# *** REVERT TO DATA STORE ID (The raw ID, not the App ID) ***
-DATA_STORE_ID = "positirr_1764279062880"
-
-# Initialize BigQuery client
-try:
-    client = bigquery.Client()
-except Exception as e:
-    logger.error(f"Error initializing BigQuery client: {str(e)}")
-
-# Initialize Vertex AI Search Retriever (Cloud Knowledge Base)
-try:
-    # We must use 'data_store_id' to satisfy the library validation
-    retriever = VertexAISearchRetriever(
-        project_id=PROJECT_ID,
-        location_id=LOCATION,
-        data_store_id=DATA_STORE_ID,  # <--- Switch back to this
-        max_documents=3,
-        engine_data_type=0 
-    )
-    logger.info(f"Vertex AI Search Retriever initialized for store: {DATA_STORE_ID}")
-except Exception as e:
-    logger.error(f"Error initializing Vertex AI Search: {str(e)}")
-    retriever = None
+# BigQuery, Vertex AI Search and the report recommender are created on first
+# use through the shared client registry (see clients.py), so importing this
+# module has no network or auth side effects.
 
 @tool("retrieve_knowledge")
 def retrieve_knowledge(query: str) -> str:
@@ -57,11 +34,28 @@ def retrieve_knowledge(query: str) -> str:
     try:
         logger.info(f"[TOOL] Searching Cloud Knowledge Base for: {query}")
         
-        if retriever is None:
+        try:
+            retriever = registry.get('search_retriever')
+        except ClientUnavailableError as e:
+            logger.error(f"[TOOL] {e}")
+            RETRIEVER_CALLS.inc(outcome='unavailable')
             return "Knowledge base connection is not available."
         
-        # Invoke the Cloud Search
-        docs = retriever.invoke(query)
+        # Invoke the Cloud Search, retrying only this call on transient errors
+        start_time = time.perf_counter()
+        try:
+            docs = call_with_retry(
+                retriever.invoke,
+                query,
+                breaker=vertex_search_breaker,
+                operation="Knowledge base search"
+            )
+        except Exception:
+            RETRIEVER_CALLS.inc(outcome='error')
+            raise
+        finally:
+            RETRIEVER_SECONDS.observe(time.perf_counter() - start_time)
+        RETRIEVER_CALLS.inc(outcome='ok' if docs else 'empty')
         
         if not docs:
             logger.info("[TOOL] No documents found.")
@@ -98,6 +92,7 @@ def recommend_report(user_query: str) -> str:
     try:
         logger.info(f"[REPORT TOOL] Analyzing query: {user_query}")
         
+        report_recommender = registry.get('report_recommender')
         recommendation = report_recommender.analyze_query(user_query)
         
         if recommendation and recommendation['confidence'] > 0.5:
@@ -108,6 +103,9 @@ def recommend_report(user_query: str) -> str:
             response += "This report is available in the **Custom Reports** tab.\n\n"
             
             if params:
+                # The user usually opens the report next; warm it up now
+                report_prefetcher.prefetch(recommendation)
+                
                 response += "**Detected Parameters:**\n"
                 for k, v in params.items():
                     response += f"- {k.replace('_', ' ').title()}: {v}\n"
@@ -0,0 +1,345 @@
+# tracing.py
+"""
+Lightweight latency tracing for reactive calcs, renderers, exports and chat.
+
+Wrapping a function with @traced(name) (or a block with `with span(name)`)
+records a span with the session ID, the filter values that were active, the
+duration and any error. Spans opened while another span is running become
+its children. When irr_table calls irr_data_current, for example, the data
+fetch shows up as a child of the table render, so a slow dashboard load can
+be broken down step by step.
+
+Finished spans go to an in-memory ring buffer (TRACE_BUFFER_SIZE, default
+2000), which can be read with recent(), trace() and summary(), or over HTTP
+at /admin/profile/traces when the profiler is enabled (profiler.py). When
+TRACE_OTLP_ENDPOINT is set (e.g. http://collector:4318/v1/traces) they are
+also batched to that endpoint as OTLP/JSON from a background thread. Root
+spans slower than TRACE_SLOW_MS are logged with their slowest children.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import secrets
+import statistics
+import threading
+import time
+import urllib.request
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger('adk_chat.tracing')
+
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', 2000))
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 2000))
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT')
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'irr-dashboard')
+
+# Span currently running in this context (thread or asyncio task)
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+@dataclass
+class Span:
+    """One timed step of an interaction."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    session_id: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_ns: int = 0
+    duration_ms: float = 0.0
+    error: Optional[str] = None
+    _start_perf: float = field(default=0.0, repr=False)
+
+    def set(self, key: str, value: Any):
+        """Attach an attribute (row counts, cache hits, ...)."""
+        self.attributes[key] = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'session_id': self.session_id,
+            'attributes': self.attributes,
+            'start_ns': self.start_ns,
+            'duration_ms': round(self.duration_ms, 2),
+            'error': self.error,
+        }
+
+
+class OTLPJSONExporter:
+    """Batches finished spans to an OTLP/HTTP endpoint as JSON."""
+
+    def __init__(self, endpoint: str, batch_size: int = 100, flush_interval: float = 5.0):
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Bounded so a dead collector can't grow memory; spans are dropped instead
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=batch_size * 20)
+        self.dropped = 0
+        threading.Thread(target=self._run, name='otlp-exporter', daemon=True).start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {'key': key, 'value': {'boolValue': value}}
+        if isinstance(value, int):
+            return {'key': key, 'value': {'intValue': str(value)}}
+        if isinstance(value, float):
+            return {'key': key, 'value': {'doubleValue': value}}
+        return {'key': key, 'value': {'stringValue': str(value)}}
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        otlp_spans = []
+        for span in spans:
+            attributes = dict(span.attributes)
+            if span.session_id:
+                attributes['session.id'] = span.session_id
+            otlp_span = {
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 1,  # SPAN_KIND_INTERNAL
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.start_ns + int(span.duration_ms * 1e6)),
+                'attributes': [self._attribute(key, value) for key, value in attributes.items()],
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+            }
+            if span.parent_id:
+                otlp_span['parentSpanId'] = span.parent_id
+            otlp_spans.append(otlp_span)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [self._attribute('service.name', SERVICE_NAME)]},
+            'scopeSpans': [{'scope': {'name': 'adk_chat.tracing'}, 'spans': otlp_spans}],
+        }]}
+
+    def _post(self, spans: List[Span]):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(self._payload(spans)).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans to {self.endpoint}: {e}")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._post(batch)
+
+
+class Tracer:
+    """Collects finished spans into a ring buffer and optional exporter."""
+
+    def __init__(self, buffer_size: int = TRACE_BUFFER_SIZE, slow_ms: float = TRACE_SLOW_MS,
+                 exporter: Optional[OTLPJSONExporter] = None):
+        self.slow_ms = slow_ms
+        self.exporter = exporter
+        self._spans: "deque[Span]" = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        # Objects with on_root_start(span)/on_root_finish(span), e.g. the
+        # allocation profiler while it waits for an interaction to capture
+        self.root_hooks: list = []
+
+    def start(self, name: str, session_id: Optional[str] = None,
+              attributes: Optional[Dict[str, Any]] = None) -> Span:
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            session_id=session_id or (parent.session_id if parent else None),
+            attributes=dict(attributes or {}),
+            start_ns=time.time_ns(),
+            _start_perf=time.perf_counter(),
+        )
+        if parent is None and self.root_hooks:
+            for hook in list(self.root_hooks):
+                hook.on_root_start(span)
+        return span
+
+    def finish(self, span: Span, error: Optional[BaseException] = None):
+        span.duration_ms = (time.perf_counter() - span._start_perf) * 1000
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        with self._lock:
+            self._spans.append(span)
+        if self.exporter is not None:
+            self.exporter.export(span)
+        if span.parent_id is None and self.root_hooks:
+            for hook in list(self.root_hooks):
+                hook.on_root_finish(span)
+        if span.parent_id is None and span.duration_ms >= self.slow_ms:
+            self._log_slow(span)
+
+    def _log_slow(self, root: Span):
+        children = sorted((s for s in self.trace(root.trace_id) if s.parent_id == root.span_id),
+                          key=lambda s: s.duration_ms, reverse=True)
+        breakdown = ', '.join(f"{s.name}={s.duration_ms:.0f}ms" for s in children[:5]) or 'no child spans'
+        logger.warning(f"Slow {root.name} ({root.duration_ms:.0f}ms, session={root.session_id}, "
+                       f"{root.attributes}): {breakdown}")
+
+    def recent(self, limit: int = 100, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent finished spans, newest first."""
+        with self._lock:
+            spans = list(self._spans)
+        if session_id is not None:
+            spans = [s for s in spans if s.session_id == session_id]
+        return [s.as_dict() for s in reversed(spans[-limit:])]
+
+    def trace(self, trace_id: str) -> List[Span]:
+        """All buffered spans of one trace, in finish order."""
+        with self._lock:
+            return [s for s in self._spans if s.trace_id == trace_id]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Count, error count and p50/p95/max duration per span name."""
+        with self._lock:
+            spans = list(self._spans)
+        by_name = defaultdict(list)
+        errors = defaultdict(int)
+        for s in spans:
+            by_name[s.name].append(s.duration_ms)
+            errors[s.name] += s.error is not None
+        result = {}
+        for name, durations in sorted(by_name.items()):
+            durations.sort()
+            result[name] = {
+                'count': len(durations),
+                'errors': errors[name],
+                'p50_ms': round(statistics.median(durations), 1),
+                'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 1),
+                'max_ms': round(durations[-1], 1),
+            }
+        return result
+
+
+tracer = Tracer(exporter=OTLPJSONExporter(TRACE_OTLP_ENDPOINT) if TRACE_OTLP_ENDPOINT else None)
+
+
+def _resolve_attributes(attributes) -> Dict[str, Any]:
+    if attributes is None:
+        return {}
+    if callable(attributes):
+        try:
+            return dict(attributes())
+        except Exception as e:
+            # Tracing must never break the traced code
+            logger.debug(f"Could not collect span attributes: {e}")
+            return {}
+    return dict(attributes)
+
+
+@contextmanager
+def span(name: str, session_id: Optional[str] = None, attributes=None):
+    """
+    Time a block as a span.
+
+    Args:
+        name: Span name, e.g. 'calc.irr_data_current'
+        session_id: Shiny session ID (inherited from the parent span if omitted)
+        attributes: Dict, or a zero-argument callable returning one
+    """
+    current = tracer.start(name, session_id, _resolve_attributes(attributes))
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        tracer.finish(current, e)
+        raise
+    else:
+        tracer.finish(current)
+    finally:
+        _current_span.reset(token)
+
+
+def traced(name: Optional[str] = None, session_id: Optional[str] = None, attributes=None) -> Callable:
+    """
+    Decorator recording a span for every call of the wrapped function.
+
+    Works on plain functions, coroutines and (async) generators, so it can
+    sit under @reactive.Calc, @render.* and @render.download alike. Put it
+    innermost so Shiny still sees the original function name.
+    """
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def async_gen_wrapper(*args, **kwargs):
+                # The context may change between yields, so the span times the
+                # whole generator without becoming the current span
+                current = tracer.start(span_name, session_id, _resolve_attributes(attributes))
+                try:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                except (GeneratorExit, asyncio.CancelledError):
+                    # The consumer stopped early (closed the stream or was cancelled)
+                    tracer.finish(current)
+                    raise
+                except BaseException as e:
+                    tracer.finish(current, e)
+                    raise
+                tracer.finish(current)
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                current = tracer.start(span_name, session_id, _resolve_attributes(attributes))
+                try:
+                    yield from fn(*args, **kwargs)
+                except GeneratorExit:
+                    # The consumer stopped early (closed the generator)
+                    tracer.finish(current)
+                    raise
+                except BaseException as e:
+                    tracer.finish(current, e)
+                    raise
+                tracer.finish(current)
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, session_id, attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, session_id, attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator